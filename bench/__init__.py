@@ -0,0 +1 @@
+"""Offline benchmark harness - local stand-ins for the feeds, sheets, sites and SMTP server the tools use."""
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmarks of the tools against local stand-in servers.
+
+Starts a fake HTTP server (generated RSS feeds, attendance sheet, plain pages)
+and an SMTP sink on 127.0.0.1, then runs each scenario in a fresh interpreter
+so its peak RSS is its own. No network access is needed.
+
+    python3 bench/run_bench.py
+    python3 bench/run_bench.py --scenario feed_mailer_cold --feeds 50 --latency-ms 50
+    python3 bench/run_bench.py --compare data/bench/1a2b3c4.json
+
+Scenarios:
+    feed_mailer_cold   check_and_send_feeds against a fresh database (fetch, parse, dedup, email)
+    feed_mailer_stream feed_mailer_cold with --stream (incremental parsing, chunked staging)
+    feed_mailer_warm   the same feeds again, every one answered 304 Not Modified
+    feed_mailer_backfill  backfill of the same feeds into a fresh database (no email)
+    uptime             check_once against a plain page, one database per run
+    drama_stream       send_report streaming the sheet, no cache
+    drama_cached       send_report answered from the sheet cache (conditional GET)
+    drama_soup         load_and_parse_url + extract_attendance_data, the BeautifulSoup path
+    mailer             messages sent over one MailSession
+
+Results go to data/bench/<commit>.json (or --output): per scenario the
+throughput, latency percentiles in milliseconds and peak RSS in MB, plus the
+commit and parameters, so two files can be compared with --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+_repo_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
+from bench.servers import FakeHTTPServer, SMTPSink
+from uptime_watch.history import percentile
+
+SCENARIOS = ["feed_mailer_cold", "feed_mailer_stream", "feed_mailer_warm", "feed_mailer_backfill", "uptime", "drama_stream", "drama_cached", "drama_soup", "mailer"]
+DEFAULT_OUTPUT_DIR = os.path.join(_repo_root, "data", "bench")
+SENDER = "bench@localhost"
+RECEIVER = "inbox@localhost"
+
+def feed_urls(params):
+    base = os.environ["BENCH_BASE_URL"]
+    return [f"{base}/feed/feed{i}?items={params['items']}&desc={params['desc_bytes']}" for i in range(params["feeds"])]
+
+def sheet_url(params):
+    return f"{os.environ['BENCH_BASE_URL']}/sheet?rows={params['rows']}&today_at={params['rows'] // 2}"
+
+def timed_runs(runs, func):
+    """Call func() `runs` times; returns the list of durations in seconds."""
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+def bench_feed_mailer(params, workdir, warm, stream=False):
+    from feed_mailer.send_new_feeds_email import check_and_send_feeds
+
+    urls = feed_urls(params)
+    db_paths = iter(os.path.join(workdir, f"feeds{i}.db") for i in range(params["runs"] + 1))
+
+    def check(db_path):
+        check_and_send_feeds(db_path, urls, 0, force=True, stream=stream)
+
+    if warm:
+        db_path = next(db_paths)
+        check(db_path)
+        durations = timed_runs(params["runs"], lambda: check(db_path))
+        return durations, len(urls) * params["runs"], "feeds"
+    durations = timed_runs(params["runs"], lambda: check(next(db_paths)))
+    return durations, len(urls) * params["items"] * params["runs"], "entries"
+
+def bench_backfill(params, workdir):
+    from feed_mailer.send_new_feeds_email import setup_database
+    from feed_mailer.backfill import backfill
+
+    urls = feed_urls(params)
+    db_paths = iter(os.path.join(workdir, f"backfill{i}.db") for i in range(params["runs"]))
+
+    def load():
+        conn, _ = setup_database(next(db_paths))
+        try:
+            backfill(conn, urls, rate=0)
+        finally:
+            conn.close()
+
+    durations = timed_runs(params["runs"], load)
+    return durations, len(urls) * params["items"] * params["runs"], "entries"
+
+def bench_uptime(params, workdir):
+    from uptime_watch.check_url_uptime import check_once
+
+    url = f"{os.environ['BENCH_BASE_URL']}/page?bytes={params['page_bytes']}"
+    db_path = os.path.join(workdir, "uptime.db")
+    durations = timed_runs(params["checks"], lambda: check_once(url, db_path))
+    return durations, params["checks"], "checks"
+
+def load_and_parse_url(url):
+    """The report's old path: download the whole sheet, then parse it with BeautifulSoup."""
+    import requests
+    from bs4 import BeautifulSoup
+
+    session = requests.Session()
+    response = session.get(url)
+    # Follow redirects if there is a 302 found response
+    if response.status_code == 302:
+        response = session.get(response.headers['Location'])
+    return BeautifulSoup(response.content, 'html.parser')
+
+def bench_drama(params, workdir, mode):
+    url = sheet_url(params)
+    if mode == "soup":
+        from drama.absence_report import extract_attendance_data
+
+        durations = timed_runs(params["runs"], lambda: extract_attendance_data(load_and_parse_url(url)))
+    else:
+        from drama import absence_report
+
+        absence_report.drama_attendance_gsheet = url
+        absence_report.drama_sheet_cache_dir = os.path.join(workdir, "sheet_cache") if mode == "cached" else ""
+        if mode == "cached":
+            absence_report.send_report()
+        durations = timed_runs(params["runs"], absence_report.send_report)
+    return durations, params["rows"] * params["runs"], "rows"
+
+def bench_mailer(params, workdir):
+    from common.mailer import SMTPConfig, MailSession, build_message
+
+    config = SMTPConfig.from_env("FEEDSEND")
+    body = "<p>" + "x" * params["message_bytes"] + "</p>"
+    with MailSession(config) as session:
+        durations = timed_runs(params["messages"], lambda: session.send(
+            build_message("Benchmark", body, SENDER, RECEIVER, "html")))
+    return durations, params["messages"], "messages"
+
+def run_scenario(name, params):
+    """Run one scenario in this process and return its raw measurements."""
+    workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    try:
+        if name == "feed_mailer_backfill":
+            durations, units, unit = bench_backfill(params, workdir)
+        elif name.startswith("feed_mailer"):
+            durations, units, unit = bench_feed_mailer(params, workdir, warm=name.endswith("warm"),
+                                                       stream=name.endswith("stream"))
+        elif name == "uptime":
+            durations, units, unit = bench_uptime(params, workdir)
+        elif name.startswith("drama"):
+            durations, units, unit = bench_drama(params, workdir, name.split("_", 1)[1])
+        elif name == "mailer":
+            durations, units, unit = bench_mailer(params, workdir)
+        else:
+            raise ValueError(f"Unknown scenario '{name}'")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return {"durations": durations, "units": units, "unit": unit, "peak_rss_mb": round(peak_rss_mb, 1)}
+
+def summarize(raw):
+    durations_ms = sorted(d * 1000 for d in raw["durations"])
+    total = sum(raw["durations"])
+    return {
+        "runs": len(durations_ms),
+        "throughput": round(raw["units"] / total, 2) if total else None,
+        "throughput_unit": f"{raw['unit']}/s",
+        "latency_ms": {
+            "p50": round(percentile(durations_ms, 0.5), 2),
+            "p90": round(percentile(durations_ms, 0.9), 2),
+            "p99": round(percentile(durations_ms, 0.99), 2),
+            "max": round(durations_ms[-1], 2),
+            "mean": round(total * 1000 / len(durations_ms), 2),
+        },
+        "peak_rss_mb": raw["peak_rss_mb"],
+    }
+
+def scenario_env(base_url, smtp_port):
+    """Environment pointing every tool at the local servers, with metrics output off."""
+    env = dict(os.environ)
+    for name in ("TIMINGS_LOG", "METRICS_TEXTFILE", "METRICS_PORT"):
+        env.pop(name, None)
+    env.update({
+        "BENCH_BASE_URL": base_url,
+        "FEEDSEND_SMTP_SERVER": "127.0.0.1",
+        "FEEDSEND_SMTP_PORT": str(smtp_port),
+        "FEEDSEND_SMTP_STARTTLS": "0",
+        "FEEDSEND_SENDER_EMAIL": SENDER,
+        "FEEDSEND_RECEIVER_EMAIL": RECEIVER,
+        "UPTIMEWATCH_SMTP_SERVER": "127.0.0.1",
+        "UPTIMEWATCH_SMTP_PORT": str(smtp_port),
+        "UPTIMEWATCH_SMTP_STARTTLS": "0",
+        "UPTIMEWATCH_SENDER_EMAIL": SENDER,
+        "UPTIMEWATCH_RECEIVER_EMAIL": RECEIVER,
+        "UPTIMEWATCH_CONNECTIVITY_TARGETS": f"{base_url}/page?bytes=100",
+        "UPTIMEWATCH_CONNECTIVITY_STATE": "",
+        "DRAMA_RECEIVER_EMAILS": RECEIVER,
+        "DRAMA_ROLL_LINK": f"{base_url}/page?bytes=100",
+    })
+    for name in ("FEEDSEND_SMTP_USERNAME", "FEEDSEND_SMTP_PASSWORD",
+                 "UPTIMEWATCH_SMTP_USERNAME", "UPTIMEWATCH_SMTP_PASSWORD"):
+        env.pop(name, None)
+    return env
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=_repo_root,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=_repo_root,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_summary(results):
+    print(f"{'scenario':<22} {'throughput':>22} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'rss MB':>8}")
+    for name, result in results["scenarios"].items():
+        if "error" in result:
+            print(f"{name:<22} failed: {result['error']}")
+            continue
+        latency = result["latency_ms"]
+        print(f"{name:<22} {result['throughput']:>12} {result['throughput_unit']:<9} "
+              f"{latency['p50']:>9} {latency['p90']:>9} {latency['p99']:>9} {result['peak_rss_mb']:>8}")
+
+def _change(old, new):
+    if not old or new is None:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+def print_comparison(old, new):
+    print(f"\nCompared with {old.get('commit')} ({old.get('timestamp')}):")
+    if old.get("params") != new.get("params"):
+        print("  warning: the runs used different parameters")
+    print(f"{'scenario':<22} {'throughput':>11} {'p50':>9} {'p90':>9} {'rss':>9}")
+    for name, result in new["scenarios"].items():
+        before = old.get("scenarios", {}).get(name)
+        if not before or "error" in before or "error" in result:
+            continue
+        print(f"{name:<22} {_change(before['throughput'], result['throughput']):>11} "
+              f"{_change(before['latency_ms']['p50'], result['latency_ms']['p50']):>9} "
+              f"{_change(before['latency_ms']['p90'], result['latency_ms']['p90']):>9} "
+              f"{_change(before['peak_rss_mb'], result['peak_rss_mb']):>9}")
+
+def setup_argparser():
+    argparser = argparse.ArgumentParser(description="Benchmark the tools end to end against local fake servers.")
+    argparser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Scenario to run (repeatable; default: all)")
+    argparser.add_argument("--runs", type=int, default=5, help="Timed runs of the feed and sheet scenarios")
+    argparser.add_argument("--feeds", type=int, default=20, help="Feeds per feed_mailer run")
+    argparser.add_argument("--items", type=int, default=50, help="Entries per feed")
+    argparser.add_argument("--desc-bytes", type=int, default=300, help="Description size of each entry")
+    argparser.add_argument("--rows", type=int, default=2000, help="Rows in the attendance sheet")
+    argparser.add_argument("--checks", type=int, default=50, help="uptime checks")
+    argparser.add_argument("--page-bytes", type=int, default=20000, help="Size of the page uptime checks")
+    argparser.add_argument("--messages", type=int, default=200, help="Messages sent by the mailer scenario")
+    argparser.add_argument("--message-bytes", type=int, default=5000, help="Body size of each mailer message")
+    argparser.add_argument("--latency-ms", type=float, default=20, help="Added latency of every HTTP response")
+    argparser.add_argument("--smtp-latency-ms", type=float, default=0, help="Added latency of every accepted message")
+    argparser.add_argument("--output", type=str, default=None, help="Results file (default: data/bench/<commit>.json)")
+    argparser.add_argument("--compare", type=str, default=None, help="Earlier results file to print changes against")
+    argparser.add_argument("--child", type=str, default=None, help=argparse.SUPPRESS)
+    argparser.add_argument("--params", type=str, default=None, help=argparse.SUPPRESS)
+    argparser.add_argument("--result-file", type=str, default=None, help=argparse.SUPPRESS)
+    return argparser
+
+def main():
+    args = setup_argparser().parse_args()
+
+    if args.child:
+        # Inside the per-scenario interpreter
+        raw = run_scenario(args.child, json.loads(args.params))
+        with open(args.result_file, "w") as f:
+            json.dump(raw, f)
+        return
+
+    params = {
+        "runs": args.runs, "feeds": args.feeds, "items": args.items, "desc_bytes": args.desc_bytes,
+        "rows": args.rows, "checks": args.checks, "page_bytes": args.page_bytes,
+        "messages": args.messages, "message_bytes": args.message_bytes,
+        "latency_ms": args.latency_ms, "smtp_latency_ms": args.smtp_latency_ms,
+    }
+    http_server = FakeHTTPServer(latency_ms=args.latency_ms).start()
+    smtp_sink = SMTPSink(latency_ms=args.smtp_latency_ms).start()
+    env = scenario_env(http_server.base_url, smtp_sink.port)
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "scenarios": {},
+    }
+
+    for name in args.scenario or SCENARIOS:
+        print(f"Running {name} ...", file=sys.stderr)
+        requests_before, messages_before = http_server.requests, smtp_sink.messages
+        fd, result_file = tempfile.mkstemp(prefix="bench_", suffix=".json")
+        os.close(fd)
+        try:
+            child = subprocess.run(
+                [sys.executable, os.path.realpath(__file__), "--child", name,
+                 "--params", json.dumps(params), "--result-file", result_file],
+                env=env, capture_output=True, text=True,
+            )
+            if child.returncode != 0:
+                tail = child.stderr.strip().splitlines()[-1:] or [f"exit code {child.returncode}"]
+                print(child.stderr, file=sys.stderr)
+                results["scenarios"][name] = {"error": tail[0]}
+                continue
+            with open(result_file) as f:
+                summary = summarize(json.load(f))
+        finally:
+            os.unlink(result_file)
+        summary["http_requests"] = http_server.requests - requests_before
+        summary["emails"] = smtp_sink.messages - messages_before
+        results["scenarios"][name] = summary
+
+    http_server.shutdown()
+    smtp_sink.shutdown()
+
+    output = args.output or os.path.join(DEFAULT_OUTPUT_DIR, f"{commit or 'results'}.json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print_summary(results)
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Local stand-ins for everything the tools talk to, so benchmarks run offline.
+
+FakeHTTPServer serves, on 127.0.0.1:
+    /feed/<name>?items=50&desc=300&gen=0    generated RSS 2.0, with ETag support
+    /sheet?rows=2000&today_at=1000          a published-sheet page built from drama's fixture
+    /page?bytes=20000                       a plain HTML page of the given size
+Every path accepts latency_ms=..., which delays the response; the server-wide
+default applies otherwise. Responses are deterministic for the same query.
+
+SMTPSink accepts mail (no TLS, no auth) and counts connections, messages and
+bytes; `latency_ms` delays each accepted message.
+"""
+import hashlib
+import socketserver
+import sys
+import threading
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+@lru_cache(maxsize=256)
+def generate_feed(name, items, desc_bytes, generation):
+    """RSS with `items` entries, newest first; a new `generation` replaces the links."""
+    published = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    description = ("lorem ipsum " * (desc_bytes // 12 + 1))[:desc_bytes]
+    parts = [f'<?xml version="1.0" encoding="utf-8"?>\n<rss version="2.0"><channel>'
+             f'<title>{name}</title><link>http://127.0.0.1/{name}</link><description>Benchmark feed</description>']
+    for i in range(items):
+        link = f"http://127.0.0.1/{name}/{generation}/{i}"
+        when = format_datetime(published - timedelta(hours=i))
+        parts.append(f"<item><title>{name} entry {i}</title><link>{link}</link><guid>{link}</guid>"
+                     f"<description>{description}</description><pubDate>{when}</pubDate></item>")
+    parts.append("</channel></rss>")
+    return "".join(parts).encode("utf-8")
+
+@lru_cache(maxsize=16)
+def generate_sheet(rows, today_at):
+    from drama.bench_parse import build_sheet
+    return build_sheet(rows, today_at)
+
+@lru_cache(maxsize=16)
+def generate_page(size):
+    head = b"<!doctype html><html><head><title>Benchmark page</title></head><body><p>Welcome back</p>"
+    tail = b"</body></html>"
+    filler = b"<p>" + b"x" * 96 + b"</p>"
+    return head + filler * max(0, (size - len(head) - len(tail)) // len(filler)) + tail
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        latency_ms = float(query.get("latency_ms", self.server.latency_ms))
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        self.server.requests += 1
+
+        if url.path.startswith("/feed/"):
+            body = generate_feed(url.path[len("/feed/"):], int(query.get("items", 50)),
+                                 int(query.get("desc", 300)), int(query.get("gen", 0)))
+            content_type = "application/rss+xml; charset=utf-8"
+        elif url.path == "/sheet":
+            rows = int(query.get("rows", 2000))
+            body = generate_sheet(rows, int(query.get("today_at", rows // 2)))
+            content_type = "text/html; charset=utf-8"
+        elif url.path == "/page":
+            body = generate_page(int(query.get("bytes", 20000)))
+            content_type = "text/html; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+class FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that stop reading early (streaming parsers, uptime checks) are expected
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def __init__(self, port=0, latency_ms=0):
+        super().__init__(("127.0.0.1", port), _HTTPHandler)
+        self.latency_ms = latency_ms
+        self.requests = 0
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        sink = self.server
+        with sink.lock:
+            sink.connections += 1
+        self.reply("220 bench-sink ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b"EHLO":
+                self.reply("250-bench-sink")
+                self.reply("250 SIZE 52428800")
+            elif command == b"HELO":
+                self.reply("250 bench-sink")
+            elif command == b"DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for data_line in self.rfile:
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    size += len(data_line)
+                if sink.latency_ms:
+                    time.sleep(sink.latency_ms / 1000)
+                with sink.lock:
+                    sink.messages += 1
+                    sink.bytes += size
+                self.reply("250 OK queued")
+            elif command == b"QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                # MAIL, RCPT, RSET and NOOP are all accepted as-is
+                self.reply("250 OK")
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, latency_ms=0):
+        super().__init__(("127.0.0.1", port), _SMTPHandler)
+        self.latency_ms = latency_ms
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        self.bytes = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
@@ -0,0 +1,201 @@
+"""
+Shared Google API client factory for the desktop-automate tools.
+
+OAuth tokens for every tool live in one JSON token store (no pickle), keyed by
+the scopes they were granted. A stored token is reused by any tool whose scopes
+it covers, refreshed when it expires and written back, so the browser consent
+flow only runs when no usable token exists. A token.pickle left by an older
+version of the tools is imported into the store once and renamed, so upgrading
+does not mean signing in again.
+
+Services are built from the discovery documents bundled with
+google-api-python-client, so starting a tool makes no discovery request. APIs
+without a bundled document are fetched once and kept in DISCOVERY_CACHE_DIR.
+Services and credentials are created on first use and memoized per process.
+httplib2 connections are not thread-safe, so threads that share a service pass
+`http=thread_http(credentials)` to `execute()`.
+
+Settings:
+    GOOGLE_CLIENT_SECRETS   OAuth client ID file (default: <repo>/credentials.json)
+    GOOGLE_TOKEN_STORE      token store (default: <repo>/data/google_tokens.json)
+"""
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+
+from common.instrumentation import stage
+
+_repo_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DEFAULT_CLIENT_SECRETS = os.path.join(_repo_root, "credentials.json")
+DEFAULT_TOKEN_STORE = os.path.join(_repo_root, "data", "google_tokens.json")
+DISCOVERY_CACHE_DIR = os.path.join(_repo_root, "data", "discovery_cache")
+# Where the tools kept their token before the shared store: the working directory, usually the repository
+LEGACY_TOKEN_FILES = ["token.pickle", os.path.join(_repo_root, "token.pickle")]
+
+def _scopes_key(scopes):
+    return " ".join(sorted(set(scopes)))
+
+def _atomic_write(path, text, mode=0o600):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.chmod(tmp_path, mode)
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+class TokenStore:
+    """Authorized-user tokens in a JSON file, keyed by their space-separated scopes."""
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("GOOGLE_TOKEN_STORE") or DEFAULT_TOKEN_STORE
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load(self, scopes):
+        """Return stored credentials covering `scopes`, or None."""
+        from google.oauth2.credentials import Credentials
+
+        wanted = set(scopes)
+        for key, info in self._read().items():
+            if wanted <= set(key.split()):
+                return Credentials.from_authorized_user_info(info, key.split())
+        return None
+
+    def save(self, credentials):
+        with self._lock:
+            tokens = self._read()
+            tokens[_scopes_key(credentials.scopes)] = json.loads(credentials.to_json())
+            _atomic_write(self.path, json.dumps(tokens, indent=2))
+
+    def discard(self, scopes):
+        with self._lock:
+            tokens = self._read()
+            wanted = set(scopes)
+            kept = {key: info for key, info in tokens.items() if not wanted <= set(key.split())}
+            if kept != tokens:
+                _atomic_write(self.path, json.dumps(kept, indent=2))
+
+def migrate_legacy_tokens(store, paths=None):
+    """Import any old token.pickle into `store`; returns True if one was imported.
+
+    Each pickle is renamed to token.pickle.migrated afterwards, so it is only unpickled once.
+    """
+    import pickle
+
+    migrated = False
+    for path in dict.fromkeys(os.path.realpath(path) for path in (paths or LEGACY_TOKEN_FILES)):
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, "rb") as f:
+                creds = pickle.load(f)
+            if creds.scopes:
+                store.save(creds)
+                migrated = True
+        except Exception as e:
+            print(f"Could not import the old token {path}: {str(e)}", file=sys.stderr)
+        os.replace(path, path + ".migrated")
+    return migrated
+
+class MissingTokenError(RuntimeError):
+    """No usable stored token, and the consent flow was not allowed to run."""
+
+def get_credentials(scopes, store=None, client_secrets=None, interactive=True):
+    """Valid credentials for `scopes`: stored, refreshed, or from the consent flow."""
+    from google.auth.exceptions import RefreshError
+    from google.auth.transport.requests import Request
+
+    store = store or TokenStore()
+    with stage("google", "token_load"):
+        creds = store.load(scopes)
+        if creds is None and migrate_legacy_tokens(store):
+            creds = store.load(scopes)
+    if creds and not creds.valid and creds.refresh_token:
+        try:
+            with stage("google", "oauth_refresh"):
+                creds.refresh(Request())
+            store.save(creds)
+        except RefreshError:
+            # Revoked or expired refresh token: forget it and log in again
+            store.discard(scopes)
+            creds = None
+    if creds and creds.valid:
+        return creds
+
+    if not interactive:
+        raise MissingTokenError(f"No stored Google token for scopes {_scopes_key(scopes)}")
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
+    client_secrets = client_secrets or os.environ.get("GOOGLE_CLIENT_SECRETS") or DEFAULT_CLIENT_SECRETS
+    flow = InstalledAppFlow.from_client_secrets_file(client_secrets, scopes)
+    with stage("google", "oauth_consent"):
+        creds = flow.run_local_server(port=0)
+    store.save(creds)
+    return creds
+
+class FileDiscoveryCache:
+    """googleapiclient discovery cache backed by files, for APIs with no bundled document."""
+
+    def __init__(self, directory=DISCOVERY_CACHE_DIR):
+        self.directory = directory
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest()[:24] + ".json")
+
+    def get(self, url):
+        try:
+            with open(self._path(url)) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, url, content):
+        _atomic_write(self._path(url), content, mode=0o644)
+
+def build_service(name, version, credentials, **kwargs):
+    """Build a service from the bundled discovery document, falling back to the file cache."""
+    from googleapiclient.discovery import build
+    from googleapiclient.errors import UnknownApiNameOrVersion
+
+    with stage("google", "discovery", api=f"{name}.{version}"):
+        try:
+            return build(name, version, credentials=credentials, static_discovery=True, **kwargs)
+        except UnknownApiNameOrVersion:
+            return build(name, version, credentials=credentials, static_discovery=False,
+                         cache=FileDiscoveryCache(), **kwargs)
+
+# One authorized connection per worker thread
+_thread_local = threading.local()
+
+def thread_http(credentials, timeout=60):
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+
+    http = getattr(_thread_local, "http", None)
+    if http is None:
+        http = _thread_local.http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=timeout))
+    return http
+
+_services = {}
+_services_lock = threading.Lock()
+
+def get_service(name, version, scopes, interactive=True, **kwargs):
+    """Memoized service for this process; credentials are loaded on first use.
+
+    Background processes pass interactive=False so a missing token raises
+    MissingTokenError instead of opening the browser consent flow.
+    """
+    key = (name, version, _scopes_key(scopes), repr(sorted(kwargs.items())))
+    with _services_lock:
+        if key not in _services:
+            _services[key] = build_service(name, version, get_credentials(scopes, interactive=interactive), **kwargs)
+        return _services[key]
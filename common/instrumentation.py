@@ -0,0 +1,199 @@
+"""
+Stage timing and metrics shared by the desktop-automate tools.
+
+Code wraps each stage in `stage(tool, name)` (fetch, parse, dedup, db_write,
+smtp_connect, oauth, ...). Every timed stage:
+
+- is appended as one JSON line to $TIMINGS_LOG, if set:
+      {"ts": 1760000000.1, "tool": "feed_mailer", "stage": "fetch", "seconds": 0.42, "ok": true, "feed": "..."}
+- feeds in-memory Prometheus histograms (desktop_automate_stage_seconds) and
+  error counters. Those are exported by writing $METRICS_TEXTFILE at exit (for
+  node_exporter's textfile collector; `{tool}` in the path is replaced by the
+  tool's name), and/or served on http://127.0.0.1:$METRICS_PORT/metrics while
+  the process runs. Long-lived processes such as uptime_watch's watch mode
+  are where the endpoint is most useful.
+
+`count(tool, name)` bumps a plain counter (cache hits, entries sent, ...).
+`add_profile_argument` and `profiled` give every tool a `--profile FILE`
+option that runs it under cProfile and writes the stats for `python -m pstats`.
+"""
+import atexit
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("instrumentation")
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, math.inf]
+
+_lock = threading.Lock()
+# (tool, stage) -> [bucket counts, sum, count, errors]
+_histograms = {}
+# (tool, name) -> value
+_counters = {}
+_timings_fd = None
+_server = None
+_textfile_tools = set()
+
+def _timings_log():
+    global _timings_fd
+    path = os.environ.get("TIMINGS_LOG")
+    if not path:
+        return None
+    if _timings_fd is None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        _timings_fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    return _timings_fd
+
+def record(tool, name, seconds, ok=True, **labels):
+    """Record one finished stage."""
+    with _lock:
+        histogram = _histograms.get((tool, name))
+        if histogram is None:
+            histogram = _histograms[(tool, name)] = [[0] * len(BUCKETS), 0.0, 0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[0][i] += 1
+                break
+        histogram[1] += seconds
+        histogram[2] += 1
+        histogram[3] += not ok
+        _textfile_tools.add(tool)
+        fd = _timings_log()
+        if fd is not None:
+            line = {"ts": round(time.time(), 3), "tool": tool, "stage": name, "seconds": round(seconds, 6), "ok": ok}
+            line.update(labels)
+            # One write per record keeps lines whole when several processes share the log
+            os.write(fd, (json.dumps(line, default=str) + "\n").encode("utf-8"))
+
+@contextmanager
+def stage(tool, name, **labels):
+    """Time the enclosed block as one stage; failures are recorded with ok=false and re-raised."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        record(tool, name, time.perf_counter() - start, ok=False, **labels)
+        raise
+    record(tool, name, time.perf_counter() - start, **labels)
+
+def count(tool, name, value=1):
+    with _lock:
+        _counters[(tool, name)] = _counters.get((tool, name), 0) + value
+        _textfile_tools.add(tool)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render(tool=None):
+    """Current metrics in the Prometheus text exposition format, optionally for one tool."""
+    with _lock:
+        histograms = {key: (list(h[0]), h[1], h[2], h[3]) for key, h in _histograms.items()}
+        counters = dict(_counters)
+    lines = [
+        "# HELP desktop_automate_stage_seconds Time spent in each stage of a tool.",
+        "# TYPE desktop_automate_stage_seconds histogram",
+    ]
+    for (tool_name, name), (buckets, total, samples, _) in sorted(histograms.items()):
+        if tool and tool_name != tool:
+            continue
+        labels = f'tool="{_escape(tool_name)}",stage="{_escape(name)}"'
+        running = 0
+        for bound, bucket in zip(BUCKETS, buckets):
+            running += bucket
+            le = "+Inf" if math.isinf(bound) else repr(bound)
+            lines.append(f'desktop_automate_stage_seconds_bucket{{{labels},le="{le}"}} {running}')
+        lines.append(f"desktop_automate_stage_seconds_sum{{{labels}}} {total}")
+        lines.append(f"desktop_automate_stage_seconds_count{{{labels}}} {samples}")
+    lines.append("# HELP desktop_automate_stage_errors_total Stages that raised an exception.")
+    lines.append("# TYPE desktop_automate_stage_errors_total counter")
+    for (tool_name, name), (_, _, _, errors) in sorted(histograms.items()):
+        if not tool or tool_name == tool:
+            lines.append(f'desktop_automate_stage_errors_total{{tool="{_escape(tool_name)}",stage="{_escape(name)}"}} {errors}')
+    lines.append("# HELP desktop_automate_events_total Events counted by a tool.")
+    lines.append("# TYPE desktop_automate_events_total counter")
+    for (tool_name, name), value in sorted(counters.items()):
+        if not tool or tool_name == tool:
+            lines.append(f'desktop_automate_events_total{{tool="{_escape(tool_name)}",event="{_escape(name)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+def write_textfile(path=None):
+    """Write the metrics atomically; `{tool}` in the path writes one file per tool."""
+    path = path or os.environ.get("METRICS_TEXTFILE")
+    if not path:
+        return
+    tools = sorted(_textfile_tools) if "{tool}" in path else [None]
+    for tool in tools:
+        target = path.replace("{tool}", tool) if tool else path
+        if os.path.dirname(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(render(tool))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, target)
+
+def serve_metrics(port=None, host="127.0.0.1"):
+    """Serve /metrics from a daemon thread; a no-op unless a port is given or METRICS_PORT is set."""
+    global _server
+    port = port or os.environ.get("METRICS_PORT")
+    if not port or _server is not None:
+        return _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    _server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return _server
+
+def _at_exit():
+    try:
+        write_textfile()
+    except OSError as e:
+        logger.warning(f"Could not write metrics textfile: {e}")
+
+atexit.register(_at_exit)
+
+def add_profile_argument(argparser):
+    argparser.add_argument("--profile", type=str, metavar="FILE", default=None,
+                           help="Run under cProfile and write the stats to FILE (read with python -m pstats)")
+
+@contextmanager
+def profiled(path):
+    """Profile the enclosed block when `path` is set and dump the stats there."""
+    if not path:
+        yield
+        return
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        logger.info(f"Wrote profile to {path}")
@@ -0,0 +1,196 @@
+"""
+Shared SMTP delivery for the desktop-automate tools.
+
+A MailSession keeps one authenticated SMTP connection open and sends any number
+of messages over it, reconnecting transparently if the server drops the
+connection. Sessions are pooled per server/account, so a long-running process
+pays the TLS handshake and login once instead of once per message.
+
+Each tool reads its settings from its own environment prefix, for example
+FEEDSEND_SMTP_SERVER or UPTIMEWATCH_SMTP_SERVER. Setting <PREFIX>_SMTP_STARTTLS=0
+and leaving the username unset lets the tools talk to a local debugging server
+such as `python -m aiosmtpd -n -l localhost:8025`.
+"""
+import atexit
+import logging
+import os
+import smtplib
+import socket
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from common.instrumentation import stage
+
+logger = logging.getLogger("mailer")
+
+# Reconnect instead of reusing a connection that has been idle this long
+IDLE_CHECK_SECONDS = 60
+# Failures that mean the connection is gone. smtplib.SMTPException subclasses OSError,
+# so OSError itself would also resend after refused recipients, auth or data errors
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, socket.timeout)
+
+class SMTPConfig:
+    """Connection and sender settings for one SMTP account."""
+
+    def __init__(self, server, port=587, username=None, password=None, sender=None, starttls=True, timeout=30):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.starttls = starttls
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls, prefix, sender_var=None):
+        """Read <prefix>_SMTP_* and <prefix>_SENDER_EMAIL from the environment."""
+        env = os.environ
+        return cls(
+            server=env.get(f"{prefix}_SMTP_SERVER"),
+            port=int(env.get(f"{prefix}_SMTP_PORT") or 587),
+            username=env.get(f"{prefix}_SMTP_USERNAME"),
+            password=env.get(f"{prefix}_SMTP_PASSWORD"),
+            sender=env.get(sender_var or f"{prefix}_SENDER_EMAIL"),
+            starttls=env.get(f"{prefix}_SMTP_STARTTLS", "1").lower() not in ("0", "false", "no"),
+        )
+
+    def is_complete(self):
+        # Authentication is optional so local test servers work without credentials
+        return bool(self.server and self.sender)
+
+    def key(self):
+        return (self.server, self.port, self.username)
+
+class MailSession:
+    """A reusable, authenticated SMTP connection that reconnects on failure."""
+
+    def __init__(self, config, retries=1):
+        self.config = config
+        self.retries = retries
+        self._smtp = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        config = self.config
+        with stage("mailer", "smtp_connect", server=config.server):
+            smtp = smtplib.SMTP(config.server, config.port, timeout=config.timeout)
+        try:
+            if config.starttls:
+                with stage("mailer", "smtp_starttls", server=config.server):
+                    smtp.starttls()
+            if config.username:
+                with stage("mailer", "smtp_login", server=config.server):
+                    smtp.login(config.username, config.password)
+        except Exception:
+            smtp.close()
+            raise
+        logger.debug(f"Connected to SMTP server {config.server}:{config.port}")
+        self._smtp = smtp
+
+    def _ensure_connected(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > IDLE_CHECK_SECONDS:
+            # Servers drop idle connections; probe cheaply before trusting this one
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self._disconnect()
+            except OSError:  # smtplib.SMTPException included
+                self._disconnect()
+        if self._smtp is None:
+            self._connect()
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                self._smtp.close()
+            self._smtp = None
+
+    def send(self, message, recipients=None):
+        """Send one email.message.Message; recipients default to its To header."""
+        if recipients is None:
+            recipients = [addr.strip() for addr in message["To"].split(",")]
+        sender = message["From"] or self.config.sender
+        with self._lock:
+            for attempt in range(self.retries + 1):
+                try:
+                    self._ensure_connected()
+                    with stage("mailer", "smtp_send", recipients=len(recipients)):
+                        self._smtp.sendmail(sender, recipients, message.as_string())
+                    self._last_used = time.monotonic()
+                    return
+                except CONNECTION_ERRORS as e:
+                    if self._smtp is not None:
+                        self._smtp.close()
+                        self._smtp = None
+                    if attempt >= self.retries:
+                        raise
+                    logger.warning(f"SMTP connection lost ({e}), reconnecting")
+
+    def send_many(self, messages):
+        """Send several messages over this session."""
+        for message in messages:
+            self.send(message)
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Open sessions, keyed by server/port/username, shared for the life of the process
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_session(config):
+    """Return the pooled MailSession for this account, creating it if needed."""
+    with _sessions_lock:
+        session = _sessions.get(config.key())
+        if session is None:
+            session = _sessions[config.key()] = MailSession(config)
+        return session
+
+def close_all():
+    """Close every pooled session."""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+atexit.register(close_all)
+
+def build_message(subject, body, sender, recipients, subtype="plain"):
+    """Build a single-part text or HTML message."""
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    message = MIMEText(body, subtype)
+    message["Subject"] = subject
+    message["From"] = sender
+    message["To"] = ", ".join(recipients)
+    return message
+
+def build_alternative_message(subject, text, html, sender, recipients):
+    """Build a multipart/alternative message with plain-text and HTML versions of the body."""
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    message = MIMEMultipart("alternative")
+    message["Subject"] = subject
+    message["From"] = sender
+    message["To"] = ", ".join(recipients)
+    # Clients show the last part they can render, so HTML goes last
+    message.attach(MIMEText(text, "plain"))
+    message.attach(MIMEText(html, "html"))
+    return message
+
+def send_email(config, subject, body, recipients, subtype="plain"):
+    """Send one message through the pooled session for `config`."""
+    message = build_message(subject, body, config.sender, recipients, subtype)
+    get_session(config).send(message)
@@ -0,0 +1 @@
+"""Drama tools package - helpers shared by absence_report.py."""
@@ -1,28 +1,40 @@
-import smtplib
 import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+import argparse
 import os
+import sys
+
+# Make the repository root importable for the shared helpers
+_repo_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
+from common.mailer import SMTPConfig, build_message, MailSession
+from common.instrumentation import stage, add_profile_argument, profiled
+from drama.sheet_stream import find_rows, UnexpectedFormat, CHUNK_SIZE
+from drama.sheet_cache import fetch_index, lookup
 
 # read from environment variables
 drama_roll_link = os.environ.get("DRAMA_ROLL_LINK")
 drama_attendance_gsheet = os.environ.get("DRAMA_ATTENDANCE_GSHEET")
-drama_receiver_emails = os.environ.get("DRAMA_RECEIVER_EMAILS").split(" ")
+drama_receiver_emails = os.environ.get("DRAMA_RECEIVER_EMAILS", "").split()
+# Where the sheet and its date index are cached; set empty to always stream the live sheet
+drama_sheet_cache_dir = os.environ.get("DRAMA_SHEET_CACHE_DIR", os.path.join(_repo_root, "data", "drama_sheet_cache"))
 
-# Load and parse the given URL
-def load_and_parse_url(url):
-    session = requests.Session()
-    response = session.get(url)
-
-    # Follow redirects if there is a 302 found response
-    if response.status_code == 302:
-        redirect_url = response.headers['Location']
-        response = session.get(redirect_url)
+# Turn the cell texts of one sheet row into an attendance entry
+def attendance_entry(cells):
+    return {
+        'date': cells[0].strip(),
+        'first_hour': cells[3].strip().replace(', ', '\n- '),
+        'whole_time': cells[4].strip().replace(', ', '\n- '),
+        'last_hour': cells[5].strip().replace(', ', '\n- '),
+        'other': cells[6].strip().replace(', ', '\n- ')
+    }
 
-    soup = BeautifulSoup(response.content, 'html.parser')
-    return soup
+def is_today_row(cells, today=None):
+    today = today or datetime.now().strftime('%d %b')
+    return bool(cells) and today in cells[0].strip()
 
 # Extract data from the table and check if today's date is in the table
 def extract_attendance_data(soup):
@@ -35,20 +47,60 @@ def extract_attendance_data(soup):
     
     attendance_data = []
     for row in rows:
-        columns = row.find_all('td')
-        date = columns[0].get_text().strip()
-        # print(date)
-        if today in date:
-            attendance_data.append({
-                'date': date,
-                'first_hour': columns[3].get_text().strip().replace(', ', '\n- '),
-                'whole_time': columns[4].get_text().strip().replace(', ', '\n- '),
-                'last_hour': columns[5].get_text().strip().replace(', ', '\n- '),
-                'other': columns[6].get_text().strip().replace(', ', '\n- ')
-            })
+        cells = [column.get_text() for column in row.find_all('td')]
+        # print(cells[0])
+        if is_today_row(cells, today):
+            attendance_data.append(attendance_entry(cells))
     
     return attendance_data
 
+# Stream the sheet and stop reading once today's rows have gone by
+def load_attendance_data(url):
+    today = datetime.now().strftime('%d %b')
+    session = requests.Session()
+    response = session.get(url, stream=True)
+
+    # Follow redirects if there is a 302 found response
+    if response.status_code == 302:
+        redirect_url = response.headers['Location']
+        response = session.get(redirect_url, stream=True)
+
+    received = []
+    def chunks():
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            received.append(chunk)
+            yield chunk
+
+    stream = chunks()
+    try:
+        # Download and tokenizing overlap while streaming, so they are timed as one stage
+        with stage("drama", "fetch_parse"):
+            rows = find_rows(stream, lambda cells: is_today_row(cells, today),
+                             response.encoding or 'utf-8', min_columns=7)
+        return [attendance_entry(cells) for cells in rows]
+    except UnexpectedFormat as e:
+        # Not the layout we know how to stream; parse the whole page the old way
+        print(f"Streaming parse failed ({e}), falling back to BeautifulSoup")
+        with stage("drama", "fetch"):
+            for _ in stream:
+                pass
+        with stage("drama", "parse", parser="beautifulsoup"):
+            return extract_attendance_data(BeautifulSoup(b"".join(received), 'html.parser'))
+    finally:
+        response.close()
+
+# Conditional fetch against the local cache; today's rows come from the date index
+def load_attendance_data_cached(url, cache_dir):
+    today = datetime.now().strftime('%d %b')
+    try:
+        with stage("drama", "fetch_index"):
+            index, cache_status = fetch_index(requests.Session(), url, cache_dir)
+    except UnexpectedFormat as e:
+        print(f"Could not index the sheet ({e}), loading it without the cache")
+        return load_attendance_data(url)
+    print(f"Sheet cache: {cache_status}")
+    return [attendance_entry(cells) for cells in lookup(index, today)]
+
 # Format email body
 def format_email_content(attendance_data):
     today = datetime.now().strftime('%d %b %Y')
@@ -76,10 +128,19 @@ def format_email_content(attendance_data):
     return content
 
 # Main function to load the URL, parse the data, and generate email content
-def main():
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description="Email today's excused absences from the attendance sheet.")
+    add_profile_argument(argparser)
+    args = argparser.parse_args(argv)
+    with profiled(args.profile):
+        send_report()
+
+def send_report():
     url = drama_attendance_gsheet
-    soup = load_and_parse_url(url)
-    attendance_data = extract_attendance_data(soup)
+    if drama_sheet_cache_dir:
+        attendance_data = load_attendance_data_cached(url, drama_sheet_cache_dir)
+    else:
+        attendance_data = load_attendance_data(url)
     if not attendance_data:
         print("No rehearsal today.")
         return
@@ -87,29 +148,17 @@ def main():
     email_body = format_email_content(attendance_data)
 
     # Email configuration
-    sender_email = os.environ.get("FEEDSEND_SENDER_EMAIL")
+    smtp_config = SMTPConfig.from_env("FEEDSEND")
     receiver_emails = drama_receiver_emails
     today = datetime.now().strftime('%d %b %Y')
     subject = f"Excused Absences Report for {today}"
 
-    smtp_server = os.environ.get("FEEDSEND_SMTP_SERVER")
-    smtp_port = int(os.environ.get("FEEDSEND_SMTP_PORT"))
-    smtp_username = os.environ.get("FEEDSEND_SMTP_USERNAME")
-    smtp_password = os.environ.get("FEEDSEND_SMTP_PASSWORD")
-
-    # Create the email message
-    for receiver_email in receiver_emails:
-        message = MIMEText(email_body, "plain")
-        message["Subject"] = subject
-        message["From"] = sender_email
-        message["To"] = receiver_email
-
-        # Send the email
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_username, smtp_password)
-            server.sendmail(sender_email, receiver_email, message.as_string())
-        print(f"Sent email for {today} to {receiver_email}")
+    # One SMTP login for all recipients; each still gets their own message
+    with MailSession(smtp_config) as session:
+        for receiver_email in receiver_emails:
+            message = build_message(subject, email_body, smtp_config.sender, receiver_email)
+            session.send(message)
+            print(f"Sent email for {today} to {receiver_email}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
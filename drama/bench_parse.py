@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark the streaming attendance-sheet parser against the BeautifulSoup path.
+
+Builds a large sheet from the rows of fixtures/attendance_sheet.html, puts
+today's date at a few positions, and times both extractors on the same bytes.
+
+    python3 drama/bench_parse.py --rows 5000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+_repo_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
+from bs4 import BeautifulSoup
+
+from drama.absence_report import extract_attendance_data, attendance_entry, is_today_row
+from drama.sheet_stream import find_rows, CHUNK_SIZE
+
+FIXTURE = os.path.join(os.path.dirname(os.path.realpath(__file__)), "fixtures", "attendance_sheet.html")
+ROW_RE = re.compile(r'<tr style="height: 20px"><th id="0R\d+".*?</tr>', re.S)
+DATE_CELL_RE = re.compile(r'(<td class="s2" dir="ltr">)\w{3}, \d{2} \w{3}(</td>)')
+
+def build_sheet(rows, today_position):
+    """Return sheet HTML with `rows` data rows and today's date at `today_position`."""
+    with open(FIXTURE) as f:
+        fixture = f.read()
+    templates = [row for row in ROW_RE.findall(fixture) if DATE_CELL_RE.search(row)]
+    head = fixture[:fixture.index(templates[0])]
+    tail = fixture[fixture.index(templates[-1]) + len(templates[-1]):]
+
+    today = datetime.now()
+    today_key = today.strftime('%d %b')
+    day = today - timedelta(days=rows)
+    body = []
+    for i in range(rows):
+        if i == today_position:
+            date = today
+        else:
+            day += timedelta(days=1)
+            # Keep today's day and month unique so both parsers agree on the answer
+            if day.strftime('%d %b') == today_key:
+                day += timedelta(days=1)
+            date = day
+        row = DATE_CELL_RE.sub(lambda m: m.group(1) + date.strftime('%a, %d %b') + m.group(2),
+                               templates[i % len(templates)])
+        body.append(row)
+    return (head + "\n".join(body) + tail).encode("utf-8")
+
+def chunked(data):
+    for i in range(0, len(data), CHUNK_SIZE):
+        yield data[i:i + CHUNK_SIZE]
+
+def run_soup(data):
+    return extract_attendance_data(BeautifulSoup(data, 'html.parser'))
+
+def run_stream(data):
+    today = datetime.now().strftime('%d %b')
+    rows = find_rows(chunked(data), lambda cells: is_today_row(cells, today), min_columns=7)
+    return [attendance_entry(cells) for cells in rows]
+
+def timed(func, data, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def main():
+    argparser = argparse.ArgumentParser(description="Benchmark attendance sheet parsing.")
+    argparser.add_argument("--rows", type=int, default=5000, help="Data rows in the generated sheet")
+    argparser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is reported)")
+    argparser.add_argument("--save", type=str, default=None, help="Also write the generated sheet to this path")
+    args = argparser.parse_args()
+
+    print(f"Sheet with {args.rows} rows:")
+    for fraction in (0.1, 0.5, 0.9):
+        data = build_sheet(args.rows, int(args.rows * fraction))
+        if args.save and fraction == 0.9:
+            with open(args.save, "wb") as f:
+                f.write(data)
+        soup_result, soup_time = timed(run_soup, data, args.repeat)
+        stream_result, stream_time = timed(run_stream, data, args.repeat)
+        assert soup_result == stream_result, "Streaming and BeautifulSoup results differ"
+        print(f"  today at {fraction:>4.0%} ({len(data) / 1e6:.1f} MB): "
+              f"BeautifulSoup {soup_time * 1000:8.1f} ms, streaming {stream_time * 1000:8.1f} ms "
+              f"({soup_time / stream_time:.1f}x)")
+
+if __name__ == "__main__":
+    main()
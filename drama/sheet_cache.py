@@ -0,0 +1,148 @@
+"""
+On-disk cache of the published attendance sheet.
+
+The sheet changes rarely, so each fetch is made conditional on the ETag and
+Last-Modified of the cached copy. Next to the body we keep a date -> rows index
+built the last time the content changed. On a 304, or a body whose hash matches
+the cached one, today's rows come straight from the index and no HTML is parsed.
+
+Cache layout, per sheet URL (files are named by a hash of the URL):
+    <cache_dir>/<key>.html   the last body we parsed
+    <cache_dir>/<key>.json   validators, content hash and the date index
+"""
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime
+
+from drama.sheet_stream import stream_rows, CHUNK_SIZE
+
+# Bump when the index format changes; old indexes are rebuilt from the cached body
+INDEX_VERSION = 1
+MIN_COLUMNS = 7
+
+CACHE_HIT_NOT_MODIFIED = "not-modified"
+CACHE_HIT_UNCHANGED = "unchanged"
+CACHE_MISS = "miss"
+
+def build_date_index(body, encoding="utf-8"):
+    """Map each date cell's text to the cell lists of the rows that carry it."""
+    index = {}
+    chunks = (body[i:i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE))
+    for cells in stream_rows(chunks, encoding):
+        if not cells or not cells[0].strip():
+            continue
+        # Pad short rows so lookups can always read the attendance columns
+        cells = cells + [""] * (MIN_COLUMNS - len(cells))
+        index.setdefault(cells[0].strip(), []).append(cells)
+    return index
+
+def _atomic_write(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class SheetCache:
+    """The cached body, validators and date index for one sheet URL."""
+
+    def __init__(self, cache_dir, url):
+        self.url = url
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:24]
+        self.body_path = os.path.join(cache_dir, f"{key}.html")
+        self.meta_path = os.path.join(cache_dir, f"{key}.json")
+        self.meta = self._load_meta()
+
+    def _load_meta(self):
+        try:
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("url") == self.url else None
+
+    def _read_body(self):
+        try:
+            with open(self.body_path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def conditional_headers(self):
+        headers = {}
+        if self.meta:
+            if self.meta.get("etag"):
+                headers["If-None-Match"] = self.meta["etag"]
+            if self.meta.get("last_modified"):
+                headers["If-Modified-Since"] = self.meta["last_modified"]
+        return headers
+
+    def index(self):
+        """The cached date index, rebuilt from the cached body if its format is stale."""
+        if self.meta is None:
+            return None
+        if self.meta.get("index_version") != INDEX_VERSION:
+            body = self._read_body()
+            if body is None:
+                return None
+            self.meta["index"] = build_date_index(body, self.meta.get("encoding") or "utf-8")
+            self.meta["index_version"] = INDEX_VERSION
+            self._save_meta()
+        return self.meta["index"]
+
+    def matches(self, body):
+        return self.meta is not None and self.meta.get("content_hash") == hashlib.sha256(body).hexdigest()
+
+    def store(self, body, encoding, etag=None, last_modified=None):
+        """Replace the cache with a new body and its freshly built index."""
+        index = build_date_index(body, encoding)
+        os.makedirs(os.path.dirname(self.body_path), exist_ok=True)
+        _atomic_write(self.body_path, body)
+        self.meta = {
+            "url": self.url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "encoding": encoding,
+            "content_hash": hashlib.sha256(body).hexdigest(),
+            "fetched_at": datetime.now().isoformat(),
+            "index_version": INDEX_VERSION,
+            "index": index,
+        }
+        self._save_meta()
+        return index
+
+    def refresh_validators(self, etag=None, last_modified=None):
+        if etag:
+            self.meta["etag"] = etag
+        if last_modified:
+            self.meta["last_modified"] = last_modified
+        self.meta["fetched_at"] = datetime.now().isoformat()
+        self._save_meta()
+
+    def _save_meta(self):
+        os.makedirs(os.path.dirname(self.meta_path), exist_ok=True)
+        _atomic_write(self.meta_path, json.dumps(self.meta).encode("utf-8"))
+
+def fetch_index(session, url, cache_dir):
+    """Return (date index, cache status) for the sheet, fetching only what changed."""
+    cache = SheetCache(cache_dir, url)
+    index = cache.index()
+    headers = cache.conditional_headers() if index is not None else {}
+
+    response = session.get(url, headers=headers)
+    if response.status_code == 304 and index is not None:
+        cache.refresh_validators(response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return index, CACHE_HIT_NOT_MODIFIED
+    response.raise_for_status()
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if index is not None and cache.matches(response.content):
+        cache.refresh_validators(etag, last_modified)
+        return index, CACHE_HIT_UNCHANGED
+    return cache.store(response.content, response.encoding or "utf-8", etag, last_modified), CACHE_MISS
+
+def lookup(index, today):
+    """All rows whose date cell contains `today`, in sheet order."""
+    return [cells for date, rows in index.items() if today in date for cells in rows]
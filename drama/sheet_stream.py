@@ -0,0 +1,100 @@
+"""
+Streaming extraction of rows from a published Google Sheet.
+
+The published sheet is one large `<table class="waffle">`. Instead of building
+a full DOM, an incremental HTML tokenizer is fed the response as it downloads.
+It turns each `<tr>` into a list of cell texts and stops as soon as the rows we
+want have gone by. Callers fall back to BeautifulSoup when the stream doesn't
+look like a published sheet.
+"""
+import codecs
+from html.parser import HTMLParser
+
+# Rows before the data: the column-letter header and the sheet's two title rows
+HEADER_ROWS = 3
+CHUNK_SIZE = 64 * 1024
+
+class UnexpectedFormat(Exception):
+    """The document does not contain the table layout we know how to stream."""
+
+class WaffleRowParser(HTMLParser):
+    """Collects the text of each `<td>` per `<tr>` in the first waffle table."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self.seen_table = False
+        self._table_depth = 0
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            if self._table_depth:
+                self._table_depth += 1
+            elif not self.seen_table and "waffle" in (dict(attrs).get("class") or "").split():
+                self.seen_table = True
+                self._table_depth = 1
+        elif self._table_depth == 1:
+            if tag == "tr":
+                self._row = []
+            elif tag == "td" and self._row is not None:
+                self._cell = []
+
+    def handle_endtag(self, tag):
+        if tag == "table" and self._table_depth:
+            self._table_depth -= 1
+        elif self._table_depth == 1:
+            if tag == "td" and self._cell is not None:
+                self._row.append("".join(self._cell))
+                self._cell = None
+            elif tag == "tr" and self._row is not None:
+                self.rows.append(self._row)
+                self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+    @property
+    def table_closed(self):
+        return self.seen_table and not self._table_depth
+
+def stream_rows(chunks, encoding="utf-8", skip=HEADER_ROWS):
+    """Yield the cell texts of each data row as soon as it has been read."""
+    parser = WaffleRowParser()
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    index = 0
+    for chunk in chunks:
+        parser.feed(decoder.decode(chunk))
+        for row in parser.rows:
+            if index >= skip:
+                yield row
+            index += 1
+        parser.rows.clear()
+        if parser.table_closed:
+            return
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    if not parser.seen_table:
+        raise UnexpectedFormat("No waffle table found in the document")
+    for row in parser.rows:
+        if index >= skip:
+            yield row
+        index += 1
+
+def find_rows(chunks, matches, encoding="utf-8", min_columns=0):
+    """Return the consecutive run of rows for which `matches(row)` is true.
+
+    Reading stops at the first non-matching row after a match, so only the
+    part of the sheet up to the wanted rows is downloaded and tokenized.
+    """
+    found = []
+    for row in stream_rows(chunks, encoding):
+        if matches(row):
+            if len(row) < min_columns:
+                raise UnexpectedFormat(f"Row has {len(row)} cells, expected at least {min_columns}")
+            found.append(row)
+        elif found:
+            break
+    return found
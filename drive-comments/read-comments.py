@@ -1,30 +1,53 @@
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import os
 import re
 import sys
 
-# Path to the OAuth 2.0 Client ID JSON file
-CLIENT_SECRETS_FILE = '../credentials.json'  # Update this with the correct path
+_repo_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
+from common.google_client import get_credentials, thread_http, build_service as build_google_service
+from common.instrumentation import stage
 
 # Scopes required for the Drive API
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 
-def get_credentials():
-    # Perform the OAuth 2.0 authorization flow
-    flow = InstalledAppFlow.from_client_secrets_file(
-        CLIENT_SECRETS_FILE, SCOPES)
-    credentials = flow.run_local_server(port=0)
-    return credentials
+# Only the attributes we print, to keep each page of results small
+COMMENT_FIELDS = "nextPageToken,comments(id,content,author(displayName),createdTime,resolved)"
+PAGE_SIZE = 100
+
+# Comments per file are cached here and reused while the file's modifiedTime is unchanged
+DEFAULT_CACHE_PATH = os.path.join(_repo_root, "data", "drive_comments_cache.json")
+
+def build_service(credentials):
+    # DRIVE_API_ENDPOINT points the client at another server, e.g. a local fake for testing
+    endpoint = os.environ.get("DRIVE_API_ENDPOINT")
+    client_options = {"api_endpoint": endpoint} if endpoint else None
+    return build_google_service('drive', 'v3', credentials, client_options=client_options)
+
+def fetch_all_comments(service, file_id, http=None):
+    """Fetch every page of comments on a file."""
+    comments = []
+    page_token = None
+    while True:
+        with stage("drive_comments", "fetch"):
+            results = service.comments().list(
+                fileId=file_id,
+                fields=COMMENT_FIELDS,
+                pageSize=PAGE_SIZE,
+                pageToken=page_token
+            ).execute(http=http)
+        comments.extend(results.get('comments', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return comments
 
 def list_comments(file_id, service):
     """List comments on a Google Drive file."""
-    results = service.comments().list(
-        fileId=file_id,
-        fields="comments"
-    ).execute()
-    comments = results.get('comments', [])
-    for comment in comments:
+    for comment in fetch_all_comments(service, file_id):
         print(f'Comment: {comment["content"]}, Author: {comment["author"]["displayName"]}')
 
 def extract_id_from_url(url):
@@ -35,12 +58,94 @@ def extract_id_from_url(url):
     else:
         return url
 
+def load_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(path, cache):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, path)
+
+def fetch_file(service, credentials, file_id, cached=None, refresh=False):
+    """Return (entry, from_cache) for one file; refetches comments only if the file changed."""
+    http = thread_http(credentials)
+    metadata = service.files().get(fileId=file_id, fields="name,modifiedTime").execute(http=http)
+    if cached and not refresh and cached.get("modifiedTime") == metadata.get("modifiedTime"):
+        return cached, True
+    return {
+        "name": metadata.get("name"),
+        "modifiedTime": metadata.get("modifiedTime"),
+        "comments": fetch_all_comments(service, file_id, http),
+    }, False
+
+def export_comments(service, credentials, file_ids, cache, workers=8, refresh=False):
+    """Fetch the comments of many files concurrently; returns {file_id: entry or Exception}."""
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(file_ids)))) as pool:
+        futures = {
+            file_id: pool.submit(fetch_file, service, credentials, file_id, cache.get(file_id), refresh)
+            for file_id in file_ids
+        }
+        for file_id, future in futures.items():
+            try:
+                entry, from_cache = future.result()
+            except Exception as e:
+                results[file_id] = e
+                continue
+            cache[file_id] = entry
+            results[file_id] = entry
+            if from_cache:
+                print(f"(cached: {file_id} unchanged since {entry['modifiedTime']})", file=sys.stderr)
+    return results
+
+def print_comments(file_id, entry, show_header):
+    if show_header:
+        print(f"== {entry['name']} ({file_id}): {len(entry['comments'])} comment(s)")
+    for comment in entry["comments"]:
+        print(f'Comment: {comment["content"]}, Author: {comment["author"]["displayName"]}')
+
+def read_ids_file(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+def setup_argparser():
+    argparser = argparse.ArgumentParser(description="Print the comments on one or more Google Drive files.")
+    argparser.add_argument("files", nargs="*", help="Drive file IDs or URLs")
+    argparser.add_argument("--files-file", type=str, help="File listing Drive file IDs or URLs, one per line", default=None)
+    argparser.add_argument("--workers", type=int, help="Files fetched concurrently", default=8)
+    argparser.add_argument("--cache", type=str, help="Path of the comment cache (empty to disable)", default=DEFAULT_CACHE_PATH)
+    argparser.add_argument("--refresh", action="store_true", help="Refetch comments even for unchanged files")
+    return argparser
+
 if __name__ == '__main__':
-    # Authenticate and construct service
-    credentials = get_credentials()
-    service = build('drive', 'v3', credentials=credentials)
-
-    # Get the file ID or URL from the command line
-    input = sys.argv[1]
-    file_id = extract_id_from_url(input)
-    list_comments(file_id, service)
\ No newline at end of file
+    argparser = setup_argparser()
+    args = argparser.parse_args()
+    inputs = list(args.files) + (read_ids_file(args.files_file) if args.files_file else [])
+    if not inputs:
+        argparser.error("give at least one file ID/URL or --files-file")
+    file_ids = list(dict.fromkeys(extract_id_from_url(value) for value in inputs))
+
+    # Reuse the stored token and construct service once for the whole batch
+    credentials = get_credentials(SCOPES)
+    service = build_service(credentials)
+
+    cache = load_cache(args.cache) if args.cache else {}
+    results = export_comments(service, credentials, file_ids, cache, args.workers, args.refresh)
+    if args.cache:
+        save_cache(args.cache, cache)
+
+    failed = False
+    for file_id in file_ids:
+        result = results[file_id]
+        if isinstance(result, Exception):
+            print(f"Error reading comments for {file_id}: {result}", file=sys.stderr)
+            failed = True
+        else:
+            print_comments(file_id, result, show_header=len(file_ids) > 1)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1 @@
+"""RSS Feed Mailer package - helpers shared by send_new_feeds_email.py."""
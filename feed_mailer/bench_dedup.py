@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark entry de-duplication and insertion against a large synthetic database.
+
+Compares the original per-entry SELECT/INSERT loop with the set-based lookup,
+executemany insert and Bloom filter paths in feed_mailer.dedup.
+
+    python3 feed_mailer/bench_dedup.py --rows 1000000 --batch 500
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+_repo_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
+from feed_mailer.dedup import find_known_urls, insert_entries, KnownUrlFilter, INSERT_ENTRY_SQL
+from feed_mailer.schema import apply_pragmas, migrate
+
+FEED_URL = "https://example.com/feed.xml"
+
+def build_database(db_path, rows):
+    """Create rss_entries with `rows` synthetic entries."""
+    conn = sqlite3.connect(db_path)
+    apply_pragmas(conn)
+    migrate(conn)
+    now = datetime.now().isoformat()
+    epoch = int(time.time()) - rows
+    batch = 50000
+    for start in range(0, rows, batch):
+        conn.executemany(
+            INSERT_ENTRY_SQL,
+            ((f"https://example.com/post/{i}", f"Post {i}", "x" * 200, now, now, now, epoch + i, FEED_URL)
+             for i in range(start, min(start + batch, rows)))
+        )
+    conn.commit()
+    return conn
+
+def make_batch(rows, size):
+    """Half the batch is already in the database, half is new."""
+    known = [f"https://example.com/post/{i}" for i in range(rows - size // 2, rows)]
+    new = [f"https://example.com/new/{i}" for i in range(size - len(known))]
+    return known + new
+
+def entry_rows(urls):
+    now = datetime.now().isoformat()
+    epoch = int(time.time())
+    return [(url, "t", "d", now, now, now, epoch, FEED_URL) for url in urls]
+
+def timed(label, func, results):
+    start = time.perf_counter()
+    value = func()
+    elapsed = time.perf_counter() - start
+    results.append((label, elapsed))
+    return value
+
+def per_entry_lookup(cursor, urls):
+    new = []
+    for url in urls:
+        cursor.execute("SELECT url FROM rss_entries WHERE url = ?", (url,))
+        if not cursor.fetchone():
+            new.append(url)
+    return new
+
+def per_entry_insert(conn, rows):
+    cursor = conn.cursor()
+    for row in rows:
+        cursor.execute(INSERT_ENTRY_SQL, row)
+    conn.rollback()
+
+def bulk_insert(conn, rows):
+    insert_entries(conn.cursor(), rows)
+    conn.rollback()
+
+def main():
+    argparser = argparse.ArgumentParser(description="Benchmark feed_mailer entry de-duplication.")
+    argparser.add_argument("--rows", type=int, default=1000000, help="Rows in the synthetic database")
+    argparser.add_argument("--batch", type=int, default=500, help="Entries per simulated feed batch")
+    argparser.add_argument("--db-path", type=str, default=None, help="Reuse or create the database at this path")
+    args = argparser.parse_args()
+
+    db_path = args.db_path or os.path.join(tempfile.mkdtemp(prefix="feed_bench_"), "bench.db")
+    results = []
+
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        apply_pragmas(conn)
+        migrate(conn)
+    else:
+        print(f"Building {args.rows} rows in {db_path} ...")
+        conn = timed("build database", lambda: build_database(db_path, args.rows), results)
+    cursor = conn.cursor()
+
+    urls = make_batch(args.rows, args.batch)
+    rows = entry_rows(u for u in urls if "/new/" in u)
+
+    timed("lookup: per-entry SELECT", lambda: per_entry_lookup(cursor, urls), results)
+    known = timed("lookup: chunked IN", lambda: find_known_urls(cursor, urls), results)
+    known_filter = timed("bloom: build from table", lambda: KnownUrlFilter(cursor), results)
+    known_bloom = timed("lookup: bloom + chunked IN", lambda: find_known_urls(cursor, urls, known_filter=known_filter), results)
+    assert known == known_bloom, "Bloom filter path disagreed with the database"
+
+    timed("insert: per-row execute", lambda: per_entry_insert(conn, rows), results)
+    timed("insert: executemany", lambda: bulk_insert(conn, rows), results)
+    conn.close()
+
+    print(f"Batch of {len(urls)} entries ({len(known)} known) against {args.rows} rows:")
+    for label, elapsed in results:
+        print(f"  {label:<28} {elapsed * 1000:10.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Set-based de-duplication of feed entries against the rss_entries table.
+
+Instead of one SELECT per entry, candidate URLs are checked in chunked
+`IN (...)` queries and new rows are written with a single executemany. An
+optional Bloom filter of known URLs lets entries that are definitely new skip
+the database entirely; it is built once per process and then only topped up
+with rows added since it was last refreshed.
+"""
+import hashlib
+import math
+from datetime import datetime
+
+from feed_mailer.schema import DELIVERY_SENT, DELIVERY_PENDING
+
+# Stay well under SQLite's host-parameter limit (999 on older builds)
+DEFAULT_CHUNK_SIZE = 500
+
+INSERT_ENTRY_SQL = """INSERT INTO rss_entries
+   (url, title, description, publication_date, entry_date, inserted_at, inserted_epoch, feed_url)
+   VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""
+
+# Backfill rows carry their delivery state and never replace rows already there
+BACKFILL_ENTRY_SQL = """INSERT OR IGNORE INTO rss_entries
+   (url, title, description, publication_date, entry_date, inserted_at, inserted_epoch, feed_url, delivery)
+   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+def entry_row(entry, feed_url, inserted_at, inserted_epoch):
+    """The INSERT_ENTRY_SQL parameters for a feedparser (or streamed) entry."""
+    published_parsed = getattr(entry, "published_parsed", None)
+    return (
+        entry.link,
+        entry.title,
+        getattr(entry, "summary", ""),
+        datetime(*published_parsed[:6]).isoformat() if published_parsed else None,
+        inserted_at,
+        inserted_at,
+        inserted_epoch,
+        feed_url
+    )
+
+class BloomFilter:
+    """A fixed-size Bloom filter over strings; false positives possible, false negatives not."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1000)
+        self.num_bits = int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # Double hashing: derive k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+class KnownUrlFilter:
+    """Bloom filter of the URLs in rss_entries, refreshed incrementally by rowid."""
+
+    def __init__(self, cursor, headroom=2.0):
+        cursor.execute("SELECT COUNT(*) FROM rss_entries")
+        rows = cursor.fetchone()[0]
+        self.bloom = BloomFilter(int(rows * headroom) + 10000)
+        self.max_rowid = 0
+        self.refresh(cursor)
+
+    def refresh(self, cursor):
+        """Add rows inserted (by this or any other process) since the last refresh."""
+        cursor.execute("SELECT rowid, url FROM rss_entries WHERE rowid > ? ORDER BY rowid", (self.max_rowid,))
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            for rowid, url in rows:
+                self.bloom.add(url)
+            self.max_rowid = rows[-1][0]
+
+    def might_contain(self, url):
+        return url in self.bloom
+
+    def add(self, url):
+        self.bloom.add(url)
+
+# One filter per database path, kept for the life of the process
+_filters = {}
+
+def get_known_url_filter(db_path, cursor):
+    """Return the process-wide KnownUrlFilter for db_path, bringing it up to date."""
+    known = _filters.get(db_path)
+    if known is None:
+        known = _filters[db_path] = KnownUrlFilter(cursor)
+    else:
+        known.refresh(cursor)
+    return known
+
+def find_known_urls(cursor, urls, chunk_size=DEFAULT_CHUNK_SIZE, known_filter=None):
+    """Return the subset of `urls` already present in rss_entries."""
+    candidates = list(dict.fromkeys(urls))
+    if known_filter is not None:
+        # Anything the filter has never seen is definitely new
+        candidates = [url for url in candidates if known_filter.might_contain(url)]
+
+    known = set()
+    for i in range(0, len(candidates), chunk_size):
+        chunk = candidates[i:i + chunk_size]
+        placeholders = ",".join("?" * len(chunk))
+        cursor.execute(f"SELECT url FROM rss_entries WHERE url IN ({placeholders})", chunk)
+        known.update(row[0] for row in cursor.fetchall())
+    return known
+
+def load_pending(cursor, feed_urls, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Backfilled rows of these feeds still waiting to be emailed, newest first per feed.
+
+    Yields (url, title, description, publication_date, feed_url) tuples.
+    """
+    feed_urls = list(feed_urls)
+    for i in range(0, len(feed_urls), chunk_size):
+        chunk = feed_urls[i:i + chunk_size]
+        placeholders = ",".join("?" * len(chunk))
+        cursor.execute(
+            f"""SELECT url, title, description, publication_date, feed_url FROM rss_entries
+                WHERE delivery = {DELIVERY_PENDING} AND feed_url IN ({placeholders})
+                ORDER BY feed_url, publication_date DESC""",
+            chunk
+        )
+        while True:
+            rows = cursor.fetchmany(DEFAULT_CHUNK_SIZE)
+            if not rows:
+                break
+            yield from rows
+
+def mark_sent(cursor, urls, inserted_at, inserted_epoch):
+    """Record backfilled rows as emailed now; the caller owns the transaction."""
+    cursor.executemany(
+        f"UPDATE rss_entries SET delivery = {DELIVERY_SENT}, inserted_at = ?, inserted_epoch = ? WHERE url = ?",
+        ((inserted_at, inserted_epoch, url) for url in urls)
+    )
+
+def mark_pending(cursor, urls):
+    """Leave rows for the next check to send again; the caller owns the transaction."""
+    cursor.executemany(f"UPDATE rss_entries SET delivery = {DELIVERY_PENDING} WHERE url = ?", ((url,) for url in urls))
+
+def load_deliveries(cursor, urls, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Map each of `urls` that reached only some subscribers to the addresses that have it."""
+    urls = list(urls)
+    delivered = {}
+    for i in range(0, len(urls), chunk_size):
+        chunk = urls[i:i + chunk_size]
+        placeholders = ",".join("?" * len(chunk))
+        cursor.execute(f"SELECT url, recipient FROM entry_deliveries WHERE url IN ({placeholders})", chunk)
+        for url, recipient in cursor.fetchall():
+            delivered.setdefault(url, set()).add(recipient)
+    return delivered
+
+def record_deliveries(cursor, pairs, delivered_at):
+    """Remember (url, recipient) pairs of entries that are still pending for someone else."""
+    cursor.executemany(
+        "INSERT OR IGNORE INTO entry_deliveries (url, recipient, delivered_at) VALUES (?, ?, ?)",
+        ((url, recipient, delivered_at) for url, recipient in pairs)
+    )
+
+def clear_deliveries(cursor, urls):
+    cursor.executemany("DELETE FROM entry_deliveries WHERE url = ?", ((url,) for url in urls))
+
+def insert_entries(cursor, rows, known_filter=None):
+    """Bulk insert entry rows; the caller owns the transaction."""
+    cursor.executemany(INSERT_ENTRY_SQL, rows)
+    if known_filter is not None:
+        for row in rows:
+            known_filter.add(row[0])
@@ -0,0 +1,165 @@
+"""
+Digest rendering for the RSS Feed Mailer.
+
+Each new entry is rendered exactly once, to an HTML and a plain-text fragment,
+from templates that are parsed when the renderer is created. A subscriber's
+digest is then just the join of the fragments of the feeds they follow, so a
+run costs one render per entry however many subscribers share a feed.
+
+Templates use plain `{field}` placeholders, without format specs or
+conversions: link, title, summary, date and feed. In the HTML template every
+value except summary (already HTML) is escaped. They can be replaced with
+files named by FEEDSEND_HTML_TEMPLATE and FEEDSEND_TEXT_TEMPLATE. Dates are shown in FEEDSEND_TIMEZONE (an IANA name such
+as Europe/Berlin), or the machine's local timezone.
+"""
+import html
+import os
+import re
+import string
+from datetime import datetime, timezone
+
+from dateutil import parser as date_parser
+
+HTML_ENTRY = "<h2><a href='{link}'>{title}</a></h2><p>{summary}</p><p>Publication Date: {date}</p><hr>"
+TEXT_ENTRY = "{title}\n{link}\n\n{summary}\n\nPublication Date: {date}\n\n----\n\n"
+DATE_FORMAT = "%b %d at %I%p %Z"
+FIELDS = {"link", "title", "summary", "date", "feed"}
+# Fields the HTML template inserts as-is
+RAW_HTML_FIELDS = {"summary"}
+
+TAG_RE = re.compile(r"<[^>]+>")
+BLANK_RE = re.compile(r"[ \t]*\n\s*\n\s*")
+
+class Template:
+    """A `{field}` template split into literals and fields once, so rendering is a single join."""
+
+    def __init__(self, source, escape=None, raw_fields=()):
+        self.parts = []
+        for literal, field, spec, conversion in string.Formatter().parse(source):
+            if field is not None and field not in FIELDS:
+                raise ValueError(f"Unknown template field '{{{field}}}'; expected one of {', '.join(sorted(FIELDS))}")
+            if spec or conversion:
+                # Values are pre-formatted strings (the date uses DATE_FORMAT), so a spec would be dropped
+                raise ValueError(f"Template field '{{{field}}}' cannot take a format spec or conversion; "
+                                 f"use a plain '{{{field}}}'")
+            self.parts.append((literal, field, escape if field not in raw_fields else None))
+
+    def render(self, values):
+        out = []
+        for literal, field, escape in self.parts:
+            out.append(literal)
+            if field is not None:
+                out.append(escape(values[field]) if escape else values[field])
+        return "".join(out)
+
+def html_to_text(fragment):
+    """Readable plain text from an HTML summary."""
+    return BLANK_RE.sub("\n\n", html.unescape(TAG_RE.sub("", fragment))).strip()
+
+def resolve_timezone(name=None):
+    name = name or os.environ.get("FEEDSEND_TIMEZONE")
+    if name:
+        from zoneinfo import ZoneInfo
+
+        return ZoneInfo(name)
+    return datetime.now().astimezone().tzinfo
+
+def _read_template(variable, default):
+    path = os.environ.get(variable)
+    if not path:
+        return default
+    with open(path) as f:
+        return f.read()
+
+class RenderedEntry:
+    """One new entry, rendered once and shared by every digest it goes into."""
+
+    __slots__ = ("url", "feed_url", "html", "text")
+
+    def __init__(self, url, feed_url, html, text):
+        self.url = url
+        self.feed_url = feed_url
+        self.html = html
+        self.text = text
+
+class DigestRenderer:
+    """Renders entries to fragments and joins fragments into digest bodies."""
+
+    def __init__(self, html_template=HTML_ENTRY, text_template=TEXT_ENTRY, tz=None):
+        self.html_template = Template(html_template, lambda value: html.escape(value, quote=True), RAW_HTML_FIELDS)
+        self.text_template = Template(text_template)
+        # Resolved once per run instead of once per entry
+        self.tz = tz or resolve_timezone()
+
+    @classmethod
+    def from_env(cls):
+        return cls(_read_template("FEEDSEND_HTML_TEMPLATE", HTML_ENTRY),
+                   _read_template("FEEDSEND_TEXT_TEMPLATE", TEXT_ENTRY))
+
+    def format_date(self, entry):
+        published_parsed = getattr(entry, "published_parsed", None)
+        if published_parsed:
+            # feedparser (and the streaming parser) normalize to a UTC struct_time
+            published = datetime(*published_parsed[:6], tzinfo=timezone.utc)
+        elif getattr(entry, "published", None):
+            try:
+                published = date_parser.parse(entry.published)
+            except (ValueError, OverflowError):
+                return entry.published
+        else:
+            return "unknown"
+        return published.astimezone(self.tz).strftime(DATE_FORMAT)
+
+    def render_entry(self, entry, feed_url):
+        summary = getattr(entry, "summary", "") or ""
+        values = {
+            "link": entry.link,
+            "title": entry.title or "",
+            "summary": summary,
+            "date": self.format_date(entry),
+            "feed": feed_url,
+        }
+        text_values = dict(values, summary=html_to_text(summary))
+        return RenderedEntry(entry.link, feed_url, self.html_template.render(values),
+                             self.text_template.render(text_values))
+
+    @staticmethod
+    def join(entries):
+        """(html, text) bodies of a digest made of already rendered entries."""
+        return "".join(entry.html for entry in entries), "".join(entry.text for entry in entries)
+
+def split_digests(entries, max_bytes=None):
+    """Group rendered entries into digests whose HTML stays under max_bytes.
+
+    An entry larger than the cap still goes out, alone in its digest.
+    """
+    if not max_bytes:
+        return [entries]
+    digests, current, size = [], [], 0
+    for entry in entries:
+        length = len(entry.html.encode("utf-8"))
+        if current and size + length > max_bytes:
+            digests.append(current)
+            current, size = [], 0
+        current.append(entry)
+        size += length
+    if current:
+        digests.append(current)
+    return digests
+
+def parse_addresses(value):
+    """Email addresses from a comma- and/or space-separated string."""
+    return [address for address in re.split(r"[\s,]+", value or "") if address]
+
+def group_by_subscriber(feed_urls, subscribers=None, default_recipients=()):
+    """Map each address to the feeds it receives, in feed order.
+
+    `subscribers` maps a feed URL to its own addresses; feeds without an entry
+    go to `default_recipients`.
+    """
+    subscribers = subscribers or {}
+    recipients = {}
+    for feed_url in feed_urls:
+        for address in subscribers.get(feed_url) or default_recipients:
+            recipients.setdefault(address, []).append(feed_url)
+    return recipients
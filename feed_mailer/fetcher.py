@@ -0,0 +1,244 @@
+"""
+Concurrent feed fetching for the RSS Feed Mailer.
+
+Feeds are downloaded through a bounded thread pool so that a run covering many
+feeds takes roughly as long as the slowest feed instead of the sum of all of
+them. A per-host limit keeps us from hammering a single server when several
+feeds live on the same site.
+
+Each feed's ETag, Last-Modified and body hash are kept in the feed_state table
+so requests can be conditional: a 304 or an unchanged body skips parsing.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import logging
+
+import feedparser
+import requests
+
+from common.instrumentation import stage
+
+logger = logging.getLogger("feed_mailer")
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_PER_HOST = 2
+DEFAULT_TIMEOUT = 30
+USER_AGENT = "desktop-automate-feed-mailer/1.0 (+feedparser)"
+
+# Values of FetchResult.cache
+CACHE_MISS = "miss"
+CACHE_NOT_MODIFIED = "not-modified"
+CACHE_UNCHANGED = "unchanged"
+
+class FeedState:
+    """Validators remembered from the last successful fetch of a feed."""
+
+    def __init__(self, feed_url, etag=None, last_modified=None, content_hash=None, last_fetched=None):
+        self.feed_url = feed_url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_hash = content_hash
+        self.last_fetched = last_fetched
+
+class FetchResult:
+    """Outcome of fetching and parsing a single feed."""
+
+    def __init__(self, feed_url, feed=None, status=None, error=None, elapsed=0.0, cache=CACHE_MISS, state=None,
+                 streamed=None):
+        self.feed_url = feed_url
+        self.feed = feed
+        # Entries handed on as they were parsed (see feed_mailer/stream.py), instead of kept in `feed`
+        self.streamed = streamed
+        self.status = status
+        self.error = error
+        self.elapsed = elapsed
+        self.cache = cache
+        # Validators to persist once this result has been fully processed
+        self.state = state
+
+    @property
+    def ok(self):
+        return self.error is None and (self.feed is not None or self.streamed is not None or self.cache != CACHE_MISS)
+
+    @property
+    def cache_hit(self):
+        return self.cache != CACHE_MISS
+
+    @property
+    def entries(self):
+        return self.feed.entries if self.feed is not None else []
+
+class HostLimiter:
+    """Hand out one semaphore per host so each server sees at most `per_host` requests."""
+
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def for_url(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self._semaphores[host]
+
+class RateLimiter:
+    """Token bucket shared by every worker: on average at most `rate` requests per second."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# requests.Session is not guaranteed thread-safe, so each worker keeps its own
+_thread_local = threading.local()
+
+def _get_session():
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers["User-Agent"] = USER_AGENT
+        _thread_local.session = session
+    return session
+
+def conditional_headers(state):
+    """Request headers that let the server answer 304 for an unchanged feed."""
+    headers = {}
+    if state is not None:
+        if state.etag:
+            headers["If-None-Match"] = state.etag
+        if state.last_modified:
+            headers["If-Modified-Since"] = state.last_modified
+    return headers
+
+def fetch_feed(feed_url, timeout=DEFAULT_TIMEOUT, limiter=None, state=None):
+    """Download and parse one feed, never raising; errors are reported on the result.
+
+    When a previous FeedState is given the request is made conditional, and a 304
+    or a body identical to the last one is returned as a cache hit without parsing.
+    """
+    start = time.monotonic()
+    semaphore = limiter.for_url(feed_url) if limiter else None
+    headers = conditional_headers(state)
+    try:
+        if semaphore:
+            semaphore.acquire()
+        try:
+            with stage("feed_mailer", "fetch", feed=feed_url):
+                response = _get_session().get(feed_url, timeout=timeout, headers=headers)
+        finally:
+            if semaphore:
+                semaphore.release()
+        fetched_at = datetime.now().isoformat()
+
+        if response.status_code == 304 and state is not None:
+            new_state = FeedState(feed_url, state.etag, state.last_modified, state.content_hash, fetched_at)
+            return FetchResult(feed_url, status=304, elapsed=time.monotonic() - start,
+                               cache=CACHE_NOT_MODIFIED, state=new_state)
+
+        if response.status_code != 200:
+            return FetchResult(feed_url, status=response.status_code,
+                               error=f"HTTP status {response.status_code}",
+                               elapsed=time.monotonic() - start)
+
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        new_state = FeedState(feed_url, response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                              content_hash, fetched_at)
+
+        # Servers that ignore conditional headers still let us skip the parse
+        if state is not None and state.content_hash == content_hash:
+            return FetchResult(feed_url, status=response.status_code, elapsed=time.monotonic() - start,
+                               cache=CACHE_UNCHANGED, state=new_state)
+
+        with stage("feed_mailer", "parse", feed=feed_url, bytes=len(response.content)):
+            feed = feedparser.parse(response.content, response_headers=dict(response.headers))
+        if feed.bozo and not feed.entries:
+            return FetchResult(feed_url, status=response.status_code,
+                               error=f"Unparseable feed: {feed.get('bozo_exception')}",
+                               elapsed=time.monotonic() - start)
+        return FetchResult(feed_url, feed=feed, status=response.status_code,
+                           elapsed=time.monotonic() - start, state=new_state)
+    except Exception as e:  # Any network or parse failure only affects this feed
+        return FetchResult(feed_url, error=str(e), elapsed=time.monotonic() - start)
+
+def fetch_feeds(feed_urls, max_workers=DEFAULT_MAX_WORKERS, per_host=DEFAULT_PER_HOST, timeout=DEFAULT_TIMEOUT, states=None):
+    """Fetch many feeds concurrently and return their results in input order.
+
+    `states` maps feed URL to the FeedState from the previous run, if any.
+    """
+    states = states or {}
+    limiter = HostLimiter(per_host)
+    workers = max(1, min(max_workers, len(feed_urls)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="feed-fetch") as pool:
+        futures = [pool.submit(fetch_feed, url, timeout, limiter, states.get(url)) for url in feed_urls]
+        results = [future.result() for future in futures]
+
+    for result in results:
+        if result.cache_hit:
+            logger.debug(f"Cache hit ({result.cache}) for {result.feed_url} in {result.elapsed:.2f}s")
+        elif result.ok:
+            logger.debug(f"Cache miss, fetched {result.feed_url} ({len(result.entries)} entries) in {result.elapsed:.2f}s")
+        else:
+            logger.error(f"Error fetching feed {result.feed_url}: {result.error}")
+    return results
+
+def load_feed_states(cursor, feed_urls):
+    """Load the stored FeedState for each of the given feeds that has one."""
+    states = {}
+    for feed_url in feed_urls:
+        cursor.execute(
+            "SELECT etag, last_modified, content_hash, last_fetched FROM feed_state WHERE feed_url = ?",
+            (feed_url,)
+        )
+        row = cursor.fetchone()
+        if row:
+            states[feed_url] = FeedState(feed_url, *row)
+    return states
+
+def save_feed_states(cursor, results):
+    """Persist validators from successful fetches; the caller commits."""
+    cursor.executemany(
+        """REPLACE INTO feed_state (feed_url, etag, last_modified, content_hash, last_fetched)
+           VALUES (?, ?, ?, ?, ?)""",
+        [(r.state.feed_url, r.state.etag, r.state.last_modified, r.state.content_hash, r.state.last_fetched)
+         for r in results if r.ok and r.state is not None]
+    )
+
+def _feeds_file_lines(path):
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line.split()
+
+def read_feeds_file(path):
+    """Read feed URLs from a file, one per line; blank lines and # comments are ignored."""
+    return [fields[0] for fields in _feeds_file_lines(path)]
+
+def read_feed_subscribers(path):
+    """Map each feed URL in the file to the addresses listed after it, if any."""
+    subscribers = {}
+    for fields in _feeds_file_lines(path):
+        if len(fields) > 1:
+            addresses = (field.strip(",") for field in fields[1:])
+            subscribers.setdefault(fields[0], []).extend(address for address in addresses if address)
+    return subscribers
@@ -0,0 +1,175 @@
+"""
+Versioned schema for the feed mailer database.
+
+The schema version is kept in SQLite's `PRAGMA user_version`. Each entry in
+MIGRATIONS moves the database up one version and runs inside its own
+transaction, so an interrupted upgrade is simply retried on the next start.
+"""
+import logging
+
+logger = logging.getLogger("feed_mailer")
+
+def _initial_schema(cursor):
+    # Version 1 is the layout older releases created, so existing databases adopt it as-is
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS rss_entries (
+        url TEXT PRIMARY KEY,
+        title TEXT,
+        description TEXT,
+        publication_date TEXT,
+        entry_date TEXT,
+        inserted_at TEXT
+    );
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS feed_state (
+        feed_url TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        content_hash TEXT,
+        last_fetched TEXT
+    );
+    ''')
+
+def _indexed_insert_time(cursor):
+    # Integer epoch so "latest" and "recent N" are index lookups instead of
+    # sorting on datetime(inserted_at); inserted_at is naive local time
+    cursor.execute("ALTER TABLE rss_entries ADD COLUMN inserted_epoch INTEGER")
+    cursor.execute("ALTER TABLE rss_entries ADD COLUMN feed_url TEXT")
+    cursor.execute('''
+    UPDATE rss_entries
+    SET inserted_epoch = CAST(strftime('%s', inserted_at, 'utc') AS INTEGER)
+    WHERE inserted_at IS NOT NULL
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rss_entries_inserted_epoch ON rss_entries (inserted_epoch)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rss_entries_feed_url ON rss_entries (feed_url, inserted_epoch)")
+
+# Values of rss_entries.delivery
+DELIVERY_SENT = 1      # emailed by `check`
+DELIVERY_PENDING = 0   # loaded by `backfill --deliver`; the next `check` emails it
+DELIVERY_SEEDED = 2    # loaded by `backfill`; never emailed
+
+def _delivery_state(cursor):
+    # Backfilled rows must not count as a send for the daily check, hence the
+    # (delivery, inserted_epoch) index: "last send" stays a single index seek
+    cursor.execute(f"ALTER TABLE rss_entries ADD COLUMN delivery INTEGER NOT NULL DEFAULT {DELIVERY_SENT}")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rss_entries_delivery ON rss_entries (delivery, inserted_epoch)")
+
+def _full_text_search(cursor):
+    # The FTS index refers to entries by integer key. With `url TEXT PRIMARY KEY` that key
+    # would be the implicit rowid, which VACUUM may renumber; rebuild the table with an
+    # explicit `id INTEGER PRIMARY KEY` (keeping the current rowids) so the key is stable
+    cursor.execute('''
+    CREATE TABLE rss_entries_new (
+        id INTEGER PRIMARY KEY,
+        url TEXT UNIQUE,
+        title TEXT,
+        description TEXT,
+        publication_date TEXT,
+        entry_date TEXT,
+        inserted_at TEXT,
+        inserted_epoch INTEGER,
+        feed_url TEXT,
+        delivery INTEGER NOT NULL DEFAULT 1
+    );
+    ''')
+    cursor.execute('''
+    INSERT INTO rss_entries_new
+        (id, url, title, description, publication_date, entry_date, inserted_at, inserted_epoch, feed_url, delivery)
+    SELECT rowid, url, title, description, publication_date, entry_date, inserted_at, inserted_epoch, feed_url, delivery
+    FROM rss_entries
+    ''')
+    cursor.execute("DROP TABLE rss_entries")
+    cursor.execute("ALTER TABLE rss_entries_new RENAME TO rss_entries")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rss_entries_inserted_epoch ON rss_entries (inserted_epoch)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rss_entries_feed_url ON rss_entries (feed_url, inserted_epoch)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rss_entries_delivery ON rss_entries (delivery, inserted_epoch)")
+
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS rss_entries_fts USING fts5 (
+        title, description, content='rss_entries', content_rowid='id'
+    );
+    ''')
+    # External-content FTS: mirror every change to the indexed columns into the index
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS rss_entries_fts_insert AFTER INSERT ON rss_entries BEGIN
+        INSERT INTO rss_entries_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+    END;
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS rss_entries_fts_delete AFTER DELETE ON rss_entries BEGIN
+        INSERT INTO rss_entries_fts (rss_entries_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END;
+    ''')
+    # Delivery bookkeeping updates other columns and must not touch the index
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS rss_entries_fts_update AFTER UPDATE OF title, description ON rss_entries BEGIN
+        INSERT INTO rss_entries_fts (rss_entries_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO rss_entries_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+    END;
+    ''')
+    # Index the history that is already there
+    cursor.execute("INSERT INTO rss_entries_fts (rss_entries_fts) VALUES ('rebuild')")
+    # Search pages are ordered newest publication first, optionally within one feed
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rss_entries_publication_date ON rss_entries (publication_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rss_entries_feed_publication ON rss_entries (feed_url, publication_date)")
+
+def _subscriber_deliveries(cursor):
+    # Subscribers that already received an entry some other subscriber is still
+    # missing; the entry stays pending and its rows go once everyone has it
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS entry_deliveries (
+        url TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        delivered_at TEXT,
+        PRIMARY KEY (url, recipient)
+    ) WITHOUT ROWID;
+    ''')
+
+# Append new migrations to the end; never edit or reorder released ones
+MIGRATIONS = [
+    _initial_schema,
+    _indexed_insert_time,
+    _delivery_state,
+    _full_text_search,
+    _subscriber_deliveries,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA busy_timeout = 5000",
+]
+
+def apply_pragmas(conn):
+    """Per-connection tuning: WAL lets readers run alongside the writer."""
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Bring the database up to SCHEMA_VERSION, one transaction per migration."""
+    version = get_schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than this script supports ({SCHEMA_VERSION})")
+
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        logger.debug(f"Migrating feed database to schema version {number}: {migration.__name__}")
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            migration(cursor)
+            # PRAGMA does not accept bound parameters
+            cursor.execute(f"PRAGMA user_version = {number}")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
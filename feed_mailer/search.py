@@ -0,0 +1,138 @@
+"""
+Search and export over the feed database.
+
+Entries come back newest publication first (entries without a date last) and
+are streamed from the cursor with fetchmany, never materialized. Pages are
+keyset-paginated: a page ends with a cursor naming its last row, and the next
+page seeks past that row in the publication-date index instead of skipping an
+OFFSET, so a page deep into years of history costs the same as the first.
+
+Text queries go through the rss_entries_fts index over titles and
+descriptions, in SQLite FTS5 syntax: words, "exact phrases", prefix*, AND / OR
+/ NOT, and column filters such as title:python.
+"""
+import csv
+import json
+import time
+from datetime import datetime, timezone
+
+from feed_mailer.digest import html_to_text
+
+FETCH_SIZE = 500
+SEARCH_FIELDS = ["url", "title", "publication_date", "feed_url", "inserted_at"]
+EXPORT_FIELDS = ["url", "title", "description", "publication_date", "feed_url", "inserted_at"]
+
+def parse_date(value):
+    """A YYYY-MM-DD or ISO 8601 date in the stored form: naive UTC, ISO formatted."""
+    date = datetime.fromisoformat(value)
+    if date.tzinfo:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return date.isoformat()
+
+def make_cursor(entry):
+    """Cursor naming the last entry of a page, passed back as `after` for the next one."""
+    return f"{entry['publication_date'] or ''}|{entry['id']}"
+
+def parse_cursor(token):
+    """(publication date or None, id) of the last row of the previous page."""
+    publication_date, _, id = token.rpartition("|")
+    return publication_date or None, int(id)
+
+def query_entries(conn, search=None, feeds=None, since=None, until=None, after=None, limit=None,
+                  fields=SEARCH_FIELDS, snippets=False):
+    """Yield matching entries as dicts, newest publication first, starting after the `after` cursor."""
+    clauses, args = [], []
+    join = ""
+    columns = ["rss_entries.id"] + [f"rss_entries.{field}" for field in fields]
+    if search:
+        join = "JOIN rss_entries_fts ON rss_entries_fts.rowid = rss_entries.id"
+        clauses.append("rss_entries_fts MATCH ?")
+        args.append(search)
+        if snippets:
+            columns.append("snippet(rss_entries_fts, -1, '[', ']', '...', 12) AS snippet")
+    if feeds:
+        clauses.append(f"rss_entries.feed_url IN ({', '.join('?' for _ in feeds)})")
+        args.extend(feeds)
+    if since:
+        clauses.append("rss_entries.publication_date >= ?")
+        args.append(since)
+    if until:
+        clauses.append("rss_entries.publication_date < ?")
+        args.append(until)
+
+    # Dated rows by (publication_date, id), then undated rows by id; each phase is one
+    # ordered index range, and a cursor seeks into it with a row-value comparison
+    after_date, after_id = after if after else (None, None)
+    phases = []
+    if after is None or after_date is not None:
+        key = ["(rss_entries.publication_date, rss_entries.id) < (?, ?)"] if after else []
+        phases.append((["rss_entries.publication_date IS NOT NULL"] + key, list(after or ()),
+                       "rss_entries.publication_date DESC, rss_entries.id DESC"))
+    if not (since or until):
+        key = ["rss_entries.id < ?"] if after and after_date is None else []
+        phases.append((["rss_entries.publication_date IS NULL"] + key, [after_id] if key else [],
+                       "rss_entries.id DESC"))
+
+    remaining = limit
+    for phase_clauses, phase_args, order in phases:
+        where = " AND ".join(clauses + phase_clauses)
+        cursor = conn.execute(
+            f"SELECT {', '.join(columns)} FROM rss_entries {join} WHERE {where} ORDER BY {order} LIMIT ?",
+            args + phase_args + [remaining if remaining is not None else -1]
+        )
+        names = [description[0] for description in cursor.description]
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(names, row))
+            if remaining is not None:
+                remaining -= len(rows)
+        if remaining == 0:
+            return
+
+class QueryTimer:
+    """Time to first row and total time of a streamed query."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.count = 0
+        self.first_row = None
+        self.start = None
+        self.elapsed = 0.0
+
+    def __iter__(self):
+        self.start = time.perf_counter()
+        for row in self.rows:
+            if self.first_row is None:
+                self.first_row = time.perf_counter() - self.start
+            self.count += 1
+            yield row
+        self.elapsed = time.perf_counter() - self.start
+
+    def summary(self):
+        first = f", first row after {self.first_row * 1000:.1f} ms" if self.first_row is not None else ""
+        return f"{self.count} row(s) in {self.elapsed * 1000:.1f} ms{first}"
+
+def write_rows(rows, out, output_format, fields):
+    """Stream entries to `out` as csv, jsonl or a readable listing; returns the last entry written."""
+    last = None
+    if output_format == "csv":
+        writer = csv.writer(out)
+        writer.writerow(fields)
+        for row in rows:
+            writer.writerow([row[field] for field in fields])
+            last = row
+    elif output_format == "jsonl":
+        for row in rows:
+            out.write(json.dumps({field: row[field] for field in fields}, ensure_ascii=False) + "\n")
+            last = row
+    else:
+        for row in rows:
+            out.write(f"{row['title']} ({row['publication_date'] or 'no date'})\n   {row['url']}\n")
+            if row.get("snippet"):
+                out.write(f"   {' '.join(html_to_text(row['snippet']).split())}\n")
+            out.write("\n")
+            last = row
+    return last
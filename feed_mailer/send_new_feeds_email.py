@@ -2,24 +2,45 @@
 """
 RSS Feed Mailer - A tool for monitoring RSS feeds and sending new entries via email.
 
-This script checks an RSS feed for new entries and emails them to a specified address.
-It stores the entries in a SQLite database to track what has already been sent.
+This script checks one or more RSS feeds for new entries and emails them to a specified
+address. Feeds are fetched concurrently, and the entries are stored in a SQLite database
+to track what has already been sent.
 
 Configuration is via command-line arguments and environment variables.
 """
-import feedparser
 import sqlite3
 import os
 from datetime import datetime
 import sys
-import smtplib
-from email.mime.text import MIMEText
-from dateutil import parser
 from datetime import timezone, timedelta
 import csv
 import argparse
 import logging
 
+# Make the repository root importable so the feed_mailer package resolves when run as a script
+_repo_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
+from feed_mailer.fetcher import (
+    fetch_feeds, read_feeds_file, read_feed_subscribers, load_feed_states, save_feed_states,
+    CACHE_NOT_MODIFIED, CACHE_UNCHANGED, DEFAULT_MAX_WORKERS, DEFAULT_PER_HOST, DEFAULT_TIMEOUT,
+)
+from feed_mailer.dedup import (
+    find_known_urls, insert_entries, get_known_url_filter, entry_row, load_pending, mark_sent, mark_pending,
+    load_deliveries, record_deliveries, clear_deliveries,
+)
+from feed_mailer.stream import stream_feeds, FeedEntry, DEFAULT_CHUNK_SIZE
+from feed_mailer.backfill import backfill, DEFAULT_RATE, DEFAULT_WORKERS as DEFAULT_BACKFILL_WORKERS, DEFAULT_BATCH_SIZE
+from feed_mailer.schema import apply_pragmas, migrate, DELIVERY_SENT
+from feed_mailer.digest import DigestRenderer, split_digests, group_by_subscriber, parse_addresses
+from feed_mailer.search import (
+    query_entries, write_rows, parse_cursor, make_cursor, parse_date, QueryTimer,
+    FETCH_SIZE, SEARCH_FIELDS, EXPORT_FIELDS,
+)
+from common.mailer import SMTPConfig, build_alternative_message, get_session
+from common.instrumentation import stage, count, add_profile_argument, profiled
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -34,17 +55,40 @@ def setup_argparser():
         epilog="Environment variables FEEDSEND_* can be used for email configuration."
     )
     
+    add_profile_argument(argparser)
+    
     # Create a subparser for different commands
     subparsers = argparser.add_subparsers(dest="command", help="Command to execute")
     
     # Check command for checking and sending new feeds
     check_parser = subparsers.add_parser("check", help="Check for new feed entries and email them")
     check_parser.add_argument("--hour", type=int, help="Hour of the day to check and send new feeds (0-23)", default=int(os.environ.get("FEEDSEND_HOUR", "9")))
-    check_parser.add_argument("--feed", type=str, help="URL of the RSS feed to check", required=True)
+    check_parser.add_argument("--feed", type=str, action="append", default=[], help="URL of an RSS feed to check (repeat for several feeds)")
+    check_parser.add_argument("--feeds-file", type=str, help="File listing feed URLs, one per line, each optionally followed by its subscribers' addresses", default=None)
+    check_parser.add_argument("--workers", type=int, help="Maximum number of feeds fetched at once", default=DEFAULT_MAX_WORKERS)
+    check_parser.add_argument("--per-host", type=int, help="Maximum concurrent requests to a single host", default=DEFAULT_PER_HOST)
+    check_parser.add_argument("--timeout", type=float, help="Per-feed fetch timeout in seconds", default=DEFAULT_TIMEOUT)
     check_parser.add_argument("--force", action="store_true", help="Force sending even if time conditions aren't met")
+    check_parser.add_argument("--bloom", action="store_true", help="Keep an in-process Bloom filter of known URLs to skip database lookups for new entries")
+    check_parser.add_argument("--stream", action="store_true", help="Parse feeds incrementally and process entries in chunks, for very large feeds")
+    check_parser.add_argument("--chunk-size", type=int, help="Entries de-duplicated and staged at a time", default=DEFAULT_CHUNK_SIZE)
+    check_parser.add_argument("--max-digest-bytes", type=int, help="Split the digest into several emails of at most this many bytes of HTML (0: one email)", default=int(os.environ.get("FEEDSEND_MAX_DIGEST_BYTES", "0")))
+    check_parser.add_argument("--no-cache", action="store_true", help="Ignore stored ETag/Last-Modified state and refetch every feed")
     check_parser.add_argument("--db-path", type=str, help="Path to the SQLite database", default=None)
     check_parser.add_argument("--verbose", "-v", action="store_true", help="Show verbose output")
     
+    # Backfill command for loading feed history without emailing it
+    backfill_parser = subparsers.add_parser("backfill", help="Load every entry of many feeds into the database without emailing")
+    backfill_parser.add_argument("--feed", type=str, action="append", default=[], help="URL of an RSS feed to load (repeat for several feeds)")
+    backfill_parser.add_argument("--feeds-file", type=str, help="File listing feed URLs, one per line", default=None)
+    backfill_parser.add_argument("--deliver", action="store_true", help="Leave the entries pending so the next check emails them (default: never email them)")
+    backfill_parser.add_argument("--rate", type=float, help="Maximum requests per second across all workers (0: unlimited)", default=DEFAULT_RATE)
+    backfill_parser.add_argument("--workers", type=int, help="Maximum number of feeds fetched at once", default=DEFAULT_BACKFILL_WORKERS)
+    backfill_parser.add_argument("--per-host", type=int, help="Maximum concurrent requests to a single host", default=DEFAULT_PER_HOST)
+    backfill_parser.add_argument("--timeout", type=float, help="Per-feed fetch timeout in seconds", default=DEFAULT_TIMEOUT)
+    backfill_parser.add_argument("--batch-size", type=int, help="Rows written per transaction", default=DEFAULT_BATCH_SIZE)
+    backfill_parser.add_argument("--db-path", type=str, help="Path to the SQLite database", default=None)
+    
     # SQL command for querying the database
     sql_parser = subparsers.add_parser("sql", help="Open an SQL prompt to query the feed database")
     sql_parser.add_argument("--db-path", type=str, help="Path to the SQLite database", default=None)
@@ -54,8 +98,31 @@ def setup_argparser():
     list_parser.add_argument("--limit", type=int, help="Number of entries to show", default=10)
     list_parser.add_argument("--db-path", type=str, help="Path to the SQLite database", default=None)
     
+    # Search command for paging through matching entries
+    search_parser = subparsers.add_parser("search", help="Full-text search the feed database, newest entries first, a page at a time")
+    search_parser.add_argument("query", type=str, nargs="?", help="FTS5 query over titles and descriptions, e.g. 'rust AND async' or '\"exact phrase\"' (omit to match every entry)", default=None)
+    add_filter_arguments(search_parser)
+    search_parser.add_argument("--limit", type=int, help="Entries per page", default=20)
+    search_parser.add_argument("--after", type=str, help="Continue after this cursor, printed at the end of the previous page", default=None)
+    search_parser.add_argument("--format", choices=["table", "csv", "jsonl"], help="Output format", default="table")
+    search_parser.add_argument("--db-path", type=str, help="Path to the SQLite database", default=None)
+    
+    # Export command for dumping matching entries
+    export_parser = subparsers.add_parser("export", help="Stream matching entries from the feed database as CSV or JSON lines")
+    export_parser.add_argument("--search", type=str, help="Only export entries matching this FTS5 query", default=None)
+    add_filter_arguments(export_parser)
+    export_parser.add_argument("--format", choices=["csv", "jsonl"], help="Output format", default="csv")
+    export_parser.add_argument("--output", "-o", type=str, help="File to write (default: standard output)", default=None)
+    export_parser.add_argument("--db-path", type=str, help="Path to the SQLite database", default=None)
+    
     return argparser
 
+def add_filter_arguments(parser):
+    """Feed and publication date filters shared by search and export."""
+    parser.add_argument("--feed", type=str, action="append", default=[], help="Only entries from this feed URL (repeat for several feeds)")
+    parser.add_argument("--since", type=parse_date, help="Only entries published on or after this date (YYYY-MM-DD or ISO 8601, UTC)", default=None)
+    parser.add_argument("--until", type=parse_date, help="Only entries published before this date (YYYY-MM-DD or ISO 8601, UTC)", default=None)
+
 def get_db_path(cli_path=None):
     """Determine the database path based on CLI argument or default location."""
     if cli_path:
@@ -76,21 +143,12 @@ def setup_database(db_path):
     
     # Connect to the SQLite database (creates it if it doesn't exist)
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    apply_pragmas(conn)
     
-    # Create table if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS rss_entries (
-        url TEXT PRIMARY KEY,
-        title TEXT,
-        description TEXT,
-        publication_date TEXT,
-        entry_date TEXT,
-        inserted_at TEXT
-    );
-    ''')
+    # Create or upgrade tables to the current schema version
+    migrate(conn)
     
-    return conn, cursor
+    return conn, conn.cursor()
 
 def run_sql_prompt(db_path):
     """Run an interactive SQL prompt for the database."""
@@ -106,13 +164,16 @@ def run_sql_prompt(db_path):
                 break
                 
             cursor.execute(query)
-            rows = cursor.fetchall()
             
             if cursor.description:  # Check if the query returned any columns
+                # Stream the result in batches instead of loading it all at once
+                rows = cursor.fetchmany(FETCH_SIZE)
                 if rows:
                     output = csv.writer(sys.stdout)
                     output.writerow([desc[0] for desc in cursor.description])  # write headers
-                    output.writerows(rows)
+                    while rows:
+                        output.writerows(rows)
+                        rows = cursor.fetchmany(FETCH_SIZE)
                 else:
                     print("Query returned no rows.")
             else:
@@ -136,7 +197,7 @@ def list_recent_entries(db_path, limit):
         cursor.execute("""
             SELECT title, publication_date, url 
             FROM rss_entries 
-            ORDER BY datetime(inserted_at) DESC 
+            ORDER BY inserted_epoch DESC 
             LIMIT ?
         """, (limit,))
         
@@ -153,8 +214,127 @@ def list_recent_entries(db_path, limit):
     finally:
         conn.close()
 
-def check_and_send_feeds(db_path, feed_url, hour_to_send, force=False, verbose=False):
-    """Check for new feed entries and email them."""
+def search_entries(db_path, query, feeds, since, until, limit, after, output_format):
+    """Print one page of matching entries and the cursor for the next page."""
+    conn, _ = setup_database(db_path)
+    
+    try:
+        rows = QueryTimer(query_entries(conn, search=query, feeds=feeds, since=since, until=until,
+                                        after=parse_cursor(after) if after else None, limit=limit,
+                                        snippets=bool(query)))
+        with stage("feed_mailer", "search"):
+            last = write_rows(rows, sys.stdout, output_format, SEARCH_FIELDS)
+        
+        if rows.count == 0 and output_format == "table":
+            print("No matching entries.")
+        # A full page may have more behind it
+        if last is not None and rows.count == limit:
+            print(f"Next page: --after '{make_cursor(last)}'", file=sys.stderr)
+        print(rows.summary(), file=sys.stderr)
+    except sqlite3.OperationalError as e:
+        # Malformed FTS5 queries surface here
+        logger.error(f"Search failed: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+def export_entries(db_path, query, feeds, since, until, output_format, output_path=None):
+    """Stream every matching entry to a file or standard output."""
+    conn, _ = setup_database(db_path)
+    out = open(output_path, "w", newline="", encoding="utf-8") if output_path else sys.stdout
+    
+    try:
+        rows = QueryTimer(query_entries(conn, search=query, feeds=feeds, since=since, until=until,
+                                        fields=EXPORT_FIELDS))
+        with stage("feed_mailer", "export"):
+            write_rows(rows, out, output_format, EXPORT_FIELDS)
+        count("feed_mailer", "exported_entries", rows.count)
+        logger.info(f"Exported {rows.summary()}")
+    except sqlite3.OperationalError as e:
+        logger.error(f"Export failed: {e}")
+        sys.exit(1)
+    finally:
+        if output_path:
+            out.close()
+        conn.close()
+
+class NewEntries:
+    """The new entries of one run, de-duplicated a chunk at a time.
+
+    Each chunk costs one batched lookup; its new entries are inserted right away,
+    uncommitted, and only their rendered fragments are kept for the digests.
+    """
+
+    def __init__(self, cursor, renderer, known_filter=None):
+        self.cursor = cursor
+        self.renderer = renderer
+        self.known_filter = known_filter
+        self.seen = set()
+        # feed URL -> [RenderedEntry] in feed order, usually newest first
+        self.by_feed = {}
+        self.count = 0
+        # Backfilled rows sent in this run; they are already in the table
+        self.pending_urls = set()
+        inserted = datetime.now()
+        self.inserted_at = inserted.isoformat()
+        self.inserted_epoch = int(inserted.timestamp())
+
+    def add(self, feed_url, entries):
+        # Skip items syndicated by more than one feed; the first feed to deliver one keeps it
+        fresh = []
+        for entry in entries:
+            if entry.link not in self.seen:
+                self.seen.add(entry.link)
+                fresh.append(entry)
+        if not fresh:
+            return
+        with stage("feed_mailer", "dedup", candidates=len(fresh)):
+            known_urls = find_known_urls(self.cursor, [entry.link for entry in fresh], known_filter=self.known_filter)
+
+        rows = []
+        staged = self.by_feed.setdefault(feed_url, [])
+        for entry in fresh:
+            if entry.link in known_urls:
+                continue
+            rows.append(entry_row(entry, feed_url, self.inserted_at, self.inserted_epoch))
+            staged.append(self.renderer.render_entry(entry, feed_url))
+        with stage("feed_mailer", "db_write", rows=len(rows)):
+            insert_entries(self.cursor, rows, self.known_filter)
+        self.count += len(rows)
+
+    def add_pending(self, feed_urls):
+        """Queue rows that `backfill` loaded for these feeds without sending them."""
+        for url, title, description, publication_date, feed_url in load_pending(self.cursor, feed_urls):
+            if url in self.seen:
+                continue
+            self.seen.add(url)
+            published_parsed = datetime.fromisoformat(publication_date).timetuple() if publication_date else None
+            entry = FeedEntry(url, title or "", description or "", publication_date, published_parsed)
+            self.by_feed.setdefault(feed_url, []).append(self.renderer.render_entry(entry, feed_url))
+            self.pending_urls.add(url)
+        self.count += len(self.pending_urls)
+
+    def in_send_order(self, feed_urls):
+        """Rendered entries feed by feed, oldest entry first."""
+        for feed_url in feed_urls:
+            yield from reversed(self.by_feed.get(feed_url, []))
+
+def check_and_send_feeds(db_path, feed_urls, hour_to_send, force=False, verbose=False,
+                         max_workers=DEFAULT_MAX_WORKERS, per_host=DEFAULT_PER_HOST, timeout=DEFAULT_TIMEOUT,
+                         use_cache=True, use_bloom=False, stream=False, chunk_size=DEFAULT_CHUNK_SIZE,
+                         max_digest_bytes=None, subscribers=None):
+    """Check the given feeds for new entries and email each subscriber a digest.
+
+    `subscribers` maps a feed URL to the addresses that receive it; other feeds
+    go to FEEDSEND_RECEIVER_EMAIL. With `stream`, feeds are parsed incrementally
+    and handled `chunk_size` entries at a time instead of being held whole.
+    With `max_digest_bytes`, a large digest is split over several emails. An
+    entry is marked sent once every subscriber has it; until then it stays
+    pending and later runs send it only to the subscribers still missing it.
+    """
+    if isinstance(feed_urls, str):
+        feed_urls = [feed_urls]
+
     conn, cursor = setup_database(db_path)
     
     if verbose:
@@ -167,126 +347,140 @@ def check_and_send_feeds(db_path, feed_url, hour_to_send, force=False, verbose=F
         
         # Check timing conditions unless forced
         if not force:
-            # Get the last inserted_at time from the database
-            cursor.execute("SELECT inserted_at FROM rss_entries ORDER BY datetime(inserted_at) DESC LIMIT 1")
+            # Get the last send time from the database (an index lookup on delivery, inserted_epoch)
+            cursor.execute(f"SELECT MAX(inserted_epoch) FROM rss_entries WHERE delivery = {DELIVERY_SENT}")
             last_inserted = cursor.fetchone()
             
-            if last_inserted:
-                last_inserted_time = datetime.fromisoformat(last_inserted[0])
+            if last_inserted and last_inserted[0] is not None:
+                last_inserted_time = datetime.fromtimestamp(last_inserted[0])
                 logger.debug(f"Last inserted_at time: {last_inserted_time}")
                 
                 if not (now.hour >= hour_to_send and (now - last_inserted_time) >= timedelta(hours=24)):
                     logger.info("Not time to check new feeds. Use --force to override.")
                     return
         
-        # Parse the RSS feed
-        logger.info(f"Checking feed: {feed_url}")
-        feed = feedparser.parse(feed_url)
-        
-        if hasattr(feed, 'status') and feed.status != 200:
-            logger.error(f"Error fetching feed. Status code: {feed.status}")
-            if hasattr(feed, 'bozo_exception'):
-                logger.error(f"Exception: {feed.bozo_exception}")
-            return
-        
-        # List to store new entries
-        new_entries = []
-        entries_to_insert = []
+        # Fetch all feeds concurrently; total time is bounded by the slowest feed
+        logger.info(f"Checking {len(feed_urls)} feed(s)")
+        # Conditional requests let unchanged feeds skip download and parsing entirely
+        states = load_feed_states(cursor, feed_urls) if use_cache else {}
+        known_filter = get_known_url_filter(db_path, cursor) if use_bloom else None
+        new_entries = NewEntries(cursor, DigestRenderer.from_env(), known_filter)
+        if stream:
+            # Chunks are de-duplicated and staged here as the workers parse them
+            results = stream_feeds(feed_urls, new_entries.add, max_workers=max_workers, per_host=per_host,
+                                   timeout=timeout, states=states, chunk_size=chunk_size)
+        else:
+            results = fetch_feeds(feed_urls, max_workers=max_workers, per_host=per_host, timeout=timeout, states=states)
+            for result in results:
+                for i in range(0, len(result.entries), chunk_size):
+                    new_entries.add(result.feed_url, result.entries[i:i + chunk_size])
+        new_entries.add_pending(feed_urls)
         
-        # Process entries in reverse order to start with the oldest
-        for entry in reversed(feed.entries):
-            # Check if the entry is already in the database
-            cursor.execute("SELECT url FROM rss_entries WHERE url = ?", (entry.link,))
-            if not cursor.fetchone():
-                # Store the entry data to be inserted later
-                entries_to_insert.append((
-                    entry.link, 
-                    entry.title, 
-                    entry.summary, 
-                    datetime(*entry.published_parsed[:6]).isoformat(), 
-                    datetime.now().isoformat(), 
-                    datetime.now().isoformat()
-                ))
-                # Add the new entry to the list
-                new_entries.append(entry)
+        failed = sum(1 for result in results if not result.ok)
+        not_modified = sum(1 for result in results if result.cache == CACHE_NOT_MODIFIED)
+        unchanged = sum(1 for result in results if result.cache == CACHE_UNCHANGED)
+        misses = len(results) - failed - not_modified - unchanged
+        logger.info(f"Fetched {len(results) - failed} of {len(results)} feed(s), {new_entries.count} new entries")
+        logger.info(f"Feed cache: {not_modified + unchanged} hit(s) ({not_modified} not modified, "
+                    f"{unchanged} unchanged body), {misses} miss(es)")
+        count("feed_mailer", "feed_cache_hits", not_modified + unchanged)
+        count("feed_mailer", "feed_cache_misses", misses)
+        count("feed_mailer", "feed_errors", failed)
         
-        # Send email if there are new entries
-        if new_entries:
-            email_success = send_entries_email(new_entries)
-            
-            # Only commit changes to database if email was sent successfully
-            if email_success:
-                # Insert all entries into the database
-                for entry_data in entries_to_insert:
-                    cursor.execute(
-                        """INSERT INTO rss_entries 
-                           (url, title, description, publication_date, entry_date, inserted_at) 
-                           VALUES (?, ?, ?, ?, ?, ?)""",
-                        entry_data
-                    )
-                # Commit changes to database
-                conn.commit()
-                logger.info(f"Committed {len(new_entries)} new entries to database")
-            else:
-                logger.warning("Email sending failed, not committing entries to database")
-        else:
+        if not new_entries.count:
+            save_feed_states(cursor, results)
+            conn.commit()
             logger.info("No new feed entries found.")
+            return
+
+        # One digest per subscriber, assembled from fragments rendered once per entry
+        recipients = group_by_subscriber(feed_urls, subscribers, parse_addresses(os.environ.get("FEEDSEND_RECEIVER_EMAIL")))
+        ordered = list(new_entries.in_send_order(feed_urls))
+        # Pending entries an earlier run got to only some subscribers go to the rest
+        delivered = load_deliveries(cursor, new_entries.pending_urls)
+        sent, missing = 0, set()
+        for address, address_feeds in recipients.items():
+            address_feeds = set(address_feeds)
+            entries = [entry for entry in ordered
+                       if entry.feed_url in address_feeds and address not in delivered.get(entry.url, ())]
+            digests = split_digests(entries, max_digest_bytes)
+            for number, digest in enumerate(digests, 1):
+                if not digest:
+                    continue
+                part = (number, len(digests)) if len(digests) > 1 else None
+                if not send_digest_email(digest, address, part):
+                    missing.update(entry.url for later in digests[number - 1:] for entry in later)
+                    break
+                sent += 1
+                for entry in digest:
+                    delivered.setdefault(entry.url, set()).add(address)
+        if not recipients:
+            logger.error("No recipients. Set FEEDSEND_RECEIVER_EMAIL or list subscribers in the feeds file.")
+        # Entries of feeds nobody receives were never emailed; keep them pending until someone does
+        routed = {feed_url for address_feeds in recipients.values() for feed_url in address_feeds}
+        unrouted = {entry.url for entry in ordered if entry.feed_url not in routed}
+        
+        # Nothing sent is only fine when every subscriber already had everything
+        if not sent and (missing or not recipients):
+            conn.rollback()
+            logger.warning("Email sending failed, not committing entries to database")
+            return
+        done = {entry.url for entry in ordered} - missing - unrouted
+        with stage("feed_mailer", "db_commit"):
+            mark_sent(cursor, new_entries.pending_urls & done, new_entries.inserted_at, new_entries.inserted_epoch)
+            clear_deliveries(cursor, done & delivered.keys())
+            if missing:
+                # Entries some subscriber did not get stay pending; the next run sends
+                # them only to the subscribers that are still missing them
+                mark_pending(cursor, missing - new_entries.pending_urls)
+                record_deliveries(cursor, ((url, address) for url in missing for address in delivered.get(url, ())),
+                                  new_entries.inserted_at)
+                logger.warning(f"{len(missing)} entries were not delivered to every subscriber; "
+                               f"they will be retried next run for the subscribers missing them")
+            if unrouted:
+                mark_pending(cursor, unrouted - new_entries.pending_urls)
+                logger.warning(f"{len(unrouted)} entries belong to feeds without recipients; "
+                               f"they stay pending until the feed has a subscriber")
+            save_feed_states(cursor, results)
+            conn.commit()
+        count("feed_mailer", "entries_sent", len(done))
+        count("feed_mailer", "digests_sent", sent)
+        logger.info(f"Sent {sent} digest(s) to {len(recipients)} subscriber(s); committed {len(done)} new entries to database")
         
     finally:
         conn.close()
 
-def send_entries_email(entries):
-    """Send an email with the new feed entries."""
+def send_digest_email(entries, receiver_email, part=None):
+    """Send one digest of rendered entries; `part` is (number, total) when a digest is split."""
     # Email configuration from environment variables
-    sender_email = os.environ.get("FEEDSEND_SENDER_EMAIL")
-    receiver_email = os.environ.get("FEEDSEND_RECEIVER_EMAIL")
+    smtp_config = SMTPConfig.from_env("FEEDSEND")
     subject = os.environ.get("FEEDSEND_EMAIL_SUBJECT", "New RSS feed entries")
-    
-    smtp_server = os.environ.get("FEEDSEND_SMTP_SERVER")
-    smtp_port = int(os.environ.get("FEEDSEND_SMTP_PORT", "587"))
-    smtp_username = os.environ.get("FEEDSEND_SMTP_USERNAME")
-    smtp_password = os.environ.get("FEEDSEND_SMTP_PASSWORD")
+    if part:
+        subject = f"{subject} ({part[0]}/{part[1]})"
     
     # Check if email configuration is complete
-    if not all([sender_email, receiver_email, smtp_server, smtp_username, smtp_password]):
+    if not (smtp_config.is_complete() and receiver_email):
         logger.error("Email configuration incomplete. Please set all FEEDSEND_* environment variables.")
         logger.info(f"Found {len(entries)} new entries, but email was not sent due to missing configuration.")
         return False
     
-    # Compile new entries into an email
-    email_body = ""
-    for entry in entries:
-        email_body += f"<h2><a href='{entry.link}'>{entry.title}</a></h2>"
-        email_body += f"<p>{entry.summary}</p>"
-        publication_date = parser.parse(entry.published)
-        # Convert publication date to local time
-        local_timezone = datetime.now().astimezone().tzinfo
-        formatted_date = publication_date.astimezone(local_timezone).strftime("%b %d at %I%p %Z")
-        email_body += f"<p>Publication Date: {formatted_date}</p>"
-        email_body += "<hr>"
+    # HTML with a plain-text alternative, each a single join of pre-rendered fragments
+    html_body, text_body = DigestRenderer.join(entries)
+    message = build_alternative_message(subject, text_body, html_body, smtp_config.sender, receiver_email)
     
-    # Create the email message
-    message = MIMEText(email_body, "html")
-    message["Subject"] = subject
-    message["From"] = sender_email
-    message["To"] = receiver_email
-    
-    # Send the email
+    # Send the email over the shared, reusable SMTP session
     try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_username, smtp_password)
-            server.sendmail(sender_email, receiver_email, message.as_string())
-        logger.info(f"Sent email with {len(entries)} new feed entries")
+        get_session(smtp_config).send(message)
+        logger.info(f"Sent email with {len(entries)} new feed entries to {receiver_email}")
         return True
     except Exception as e:
-        logger.error(f"Failed to send email: {str(e)}")
+        logger.error(f"Failed to send email to {receiver_email}: {str(e)}")
         return False
 
-def main():
+def main(argv=None):
     """Main entry point for the script."""
     argparser = setup_argparser()
-    args = argparser.parse_args()
+    args = argparser.parse_args(argv)
     
     # Determine database path
     db_path = get_db_path(getattr(args, "db_path", None))
@@ -295,8 +489,49 @@ def main():
         run_sql_prompt(db_path)
     elif args.command == "list":
         list_recent_entries(db_path, args.limit)
+    elif args.command == "search":
+        with profiled(args.profile):
+            search_entries(db_path, args.query, args.feed, args.since, args.until, args.limit, args.after, args.format)
+    elif args.command == "export":
+        with profiled(args.profile):
+            export_entries(db_path, args.search, args.feed, args.since, args.until, args.format, args.output)
     elif args.command == "check":
-        check_and_send_feeds(db_path, args.feed, args.hour, args.force, args.verbose)
+        feed_urls = list(args.feed)
+        subscribers = None
+        if args.feeds_file:
+            feed_urls.extend(read_feeds_file(args.feeds_file))
+            subscribers = read_feed_subscribers(args.feeds_file)
+        if not feed_urls:
+            argparser.error("check requires at least one --feed or a --feeds-file")
+        # Preserve order while dropping feeds listed more than once
+        feed_urls = list(dict.fromkeys(feed_urls))
+        with profiled(args.profile), stage("feed_mailer", "check", feeds=len(feed_urls)):
+            check_and_send_feeds(db_path, feed_urls, args.hour, args.force, args.verbose,
+                                 max_workers=args.workers, per_host=args.per_host, timeout=args.timeout,
+                                 use_cache=not args.no_cache, use_bloom=args.bloom, stream=args.stream,
+                                 chunk_size=args.chunk_size, max_digest_bytes=args.max_digest_bytes,
+                                 subscribers=subscribers)
+    elif args.command == "backfill":
+        feed_urls = list(args.feed)
+        if args.feeds_file:
+            feed_urls.extend(read_feeds_file(args.feeds_file))
+        if not feed_urls:
+            argparser.error("backfill requires at least one --feed or a --feeds-file")
+        feed_urls = list(dict.fromkeys(feed_urls))
+        conn, _ = setup_database(db_path)
+        try:
+            with profiled(args.profile), stage("feed_mailer", "backfill", feeds=len(feed_urls)):
+                results, seen, inserted, elapsed = backfill(
+                    conn, feed_urls, deliver=args.deliver, rate=args.rate, max_workers=args.workers,
+                    per_host=args.per_host, timeout=args.timeout, batch_size=args.batch_size)
+        finally:
+            conn.close()
+        failed = sum(1 for result in results if not result.ok)
+        logger.info(f"Loaded {inserted} new of {seen} entries from {len(results) - failed} of {len(results)} feed(s) "
+                    f"in {elapsed:.2f}s ({inserted / elapsed if elapsed else 0:.0f} rows/s, "
+                    f"{seen / elapsed if elapsed else 0:.0f} entries/s)")
+        if inserted and args.deliver:
+            logger.info("The new entries are pending; the next check emails them")
     else:
         # If no command is provided, show help
         argparser.print_help()
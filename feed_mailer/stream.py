@@ -0,0 +1,292 @@
+"""
+Streaming feed processing for very large feeds.
+
+Instead of downloading a feed and building the whole feedparser result, the
+body is parsed incrementally with an XML pull parser while it downloads. Each
+<item> (RSS) or <entry> (Atom) becomes a small FeedEntry and is dropped from the
+parse tree as soon as it is read, and entries are handed on in chunks through
+a bounded queue, so memory stays flat however many items a feed has.
+
+Bodies that are not well-formed RSS or Atom fall back to feedparser. Summaries
+go through feedparser's HTML sanitizer, as they do on the regular path, because
+the digest inserts them into its HTML unescaped.
+"""
+import hashlib
+import logging
+import queue
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import feedparser
+from dateutil import parser as date_parser
+from feedparser.sanitizer import _sanitize_html
+
+from common.instrumentation import stage
+from feed_mailer.fetcher import (
+    FetchResult, FeedState, HostLimiter, conditional_headers, _get_session,
+    CACHE_MISS, CACHE_NOT_MODIFIED, CACHE_UNCHANGED, DEFAULT_MAX_WORKERS, DEFAULT_PER_HOST, DEFAULT_TIMEOUT,
+)
+
+logger = logging.getLogger("feed_mailer")
+
+# Entries handed to the consumer at a time
+DEFAULT_CHUNK_SIZE = 500
+READ_SIZE = 64 * 1024
+# Bodies are spooled so a malformed feed can still be re-read by feedparser; past this they go to disk
+SPOOL_MAX_BYTES = 1024 * 1024
+
+ROOT_TAGS = {"rss", "feed", "RDF"}
+ENTRY_TAGS = {"item", "entry"}
+XHTML_NS = "http://www.w3.org/1999/xhtml"
+PUBLISHED_TAGS = ("pubDate", "published", "issued", "date")
+UPDATED_TAGS = ("updated", "modified")
+
+class UnsupportedFeed(Exception):
+    pass
+
+class FeedEntry:
+    """The fields of an entry the mailer uses, named as feedparser names them."""
+
+    __slots__ = ("link", "title", "summary", "published", "published_parsed")
+
+    def __init__(self, link, title="", summary="", published=None, published_parsed=None):
+        self.link = link
+        self.title = title
+        self.summary = summary
+        self.published = published
+        self.published_parsed = published_parsed
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+def _inner_xml(elem):
+    # Atom type="xhtml" content arrives as child elements rather than text
+    parts = [elem.text or ""]
+    for child in elem:
+        try:
+            parts.append(ET.tostring(child, encoding="unicode", default_namespace=XHTML_NS))
+        except ValueError:
+            # Elements outside the XHTML namespace keep their prefixes
+            parts.append(ET.tostring(child, encoding="unicode"))
+    return "".join(parts)
+
+def parse_date(value):
+    """A feed date (RFC 822 or ISO 8601) as a UTC struct_time, or None."""
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            try:
+                parsed = date_parser.parse(value)
+            except (ValueError, OverflowError):
+                return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).timetuple()
+
+def sanitize_html(fragment):
+    """Strip scripts, event handlers and unsafe URLs the way feedparser does for parsed feeds."""
+    return _sanitize_html(fragment, "utf-8", "text/html") if fragment else ""
+
+def entry_from_element(elem):
+    fields = {}
+    link = None
+    for child in elem:
+        name = _local(child.tag)
+        if name == "link":
+            # RSS puts the URL in the text, Atom in href (rel="alternate" or no rel)
+            href = child.get("href")
+            if href and child.get("rel", "alternate") == "alternate":
+                link = link or href
+            elif child.text and child.text.strip():
+                link = link or child.text.strip()
+        elif name == "guid" and child.get("isPermaLink", "true") == "true" and child.text:
+            fields.setdefault("guid", child.text.strip())
+        elif name not in fields:
+            fields[name] = _inner_xml(child) if len(child) else (child.text or "")
+    link = link or fields.get("guid")
+    if not link:
+        return None
+
+    summary = next((fields[name] for name in ("description", "summary", "content", "encoded") if name in fields), "")
+    published = next((fields[name].strip() for name in PUBLISHED_TAGS + UPDATED_TAGS if fields.get(name)), None)
+    return FeedEntry(link, fields.get("title", "").strip(), sanitize_html(summary), published,
+                     parse_date(published) if published else None)
+
+class EntryParser:
+    """Incremental RSS/Atom parser: feed it bytes, get back the entries completed so far."""
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._stack = []
+
+    def feed(self, data):
+        self._parser.feed(data)
+        return self._drain()
+
+    def close(self):
+        self._parser.close()
+        return self._drain()
+
+    def _drain(self):
+        entries = []
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                if not self._stack and _local(elem.tag) not in ROOT_TAGS:
+                    raise UnsupportedFeed(f"Root element <{_local(elem.tag)}> is not RSS or Atom")
+                self._stack.append(elem)
+                continue
+            self._stack.pop()
+            if _local(elem.tag) in ENTRY_TAGS:
+                entry = entry_from_element(elem)
+                if entry is not None:
+                    entries.append(entry)
+                # Drop the finished entry from the tree so it can be freed
+                if self._stack:
+                    self._stack[-1].remove(elem)
+        return entries
+
+class Cancelled(Exception):
+    pass
+
+def stream_feed(feed_url, emit, timeout=DEFAULT_TIMEOUT, limiter=None, state=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                rate_limiter=None):
+    """Download and parse one feed incrementally, calling emit(entries) for each chunk.
+
+    Returns a FetchResult without a parsed feed; errors are reported on it, never raised.
+    """
+    start = time.monotonic()
+    semaphore = limiter.for_url(feed_url) if limiter else None
+    emitted = 0
+    try:
+        if semaphore:
+            semaphore.acquire()
+        try:
+            if rate_limiter:
+                rate_limiter.acquire()
+            # The download and the parse overlap, so they are timed as one stage
+            with stage("feed_mailer", "fetch_parse", feed=feed_url, mode="stream"):
+                response = _get_session().get(feed_url, timeout=timeout, headers=conditional_headers(state),
+                                              stream=True)
+                with response:
+                    fetched_at = datetime.now().isoformat()
+                    if response.status_code == 304 and state is not None:
+                        new_state = FeedState(feed_url, state.etag, state.last_modified, state.content_hash, fetched_at)
+                        return FetchResult(feed_url, status=304, elapsed=time.monotonic() - start,
+                                           cache=CACHE_NOT_MODIFIED, state=new_state)
+                    if response.status_code != 200:
+                        return FetchResult(feed_url, status=response.status_code,
+                                           error=f"HTTP status {response.status_code}",
+                                           elapsed=time.monotonic() - start)
+
+                    digest = hashlib.sha256()
+                    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+                        parser = EntryParser()
+                        batch = []
+                        body = response.iter_content(chunk_size=READ_SIZE)
+                        try:
+                            for data in body:
+                                digest.update(data)
+                                spool.write(data)
+                                batch.extend(parser.feed(data))
+                                if len(batch) >= chunk_size:
+                                    emit(batch)
+                                    emitted += len(batch)
+                                    batch = []
+                            batch.extend(parser.close())
+                        except (ET.ParseError, UnsupportedFeed) as e:
+                            # Sloppy XML (undefined entities, HTML in the wrong place, ...): let feedparser
+                            # have the whole body; entries already emitted are de-duplicated downstream
+                            logger.debug(f"Streaming parse of {feed_url} failed ({e}), falling back to feedparser")
+                            for data in body:
+                                digest.update(data)
+                                spool.write(data)
+                            spool.seek(0)
+                            feed = feedparser.parse(spool.read(), response_headers=dict(response.headers))
+                            if feed.bozo and not feed.entries:
+                                return FetchResult(feed_url, status=response.status_code,
+                                                   error=f"Unparseable feed: {feed.get('bozo_exception')}",
+                                                   elapsed=time.monotonic() - start)
+                            batch = [entry for entry in feed.entries if entry.get("link")]
+                        for i in range(0, len(batch), chunk_size):
+                            emit(batch[i:i + chunk_size])
+                        emitted += len(batch)
+        finally:
+            if semaphore:
+                semaphore.release()
+
+        content_hash = digest.hexdigest()
+        new_state = FeedState(feed_url, response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                              content_hash, fetched_at)
+        # The entries of an unchanged body were already sent, so de-duplication drops them all
+        unchanged = state is not None and state.content_hash == content_hash
+        return FetchResult(feed_url, status=response.status_code, elapsed=time.monotonic() - start,
+                           cache=CACHE_UNCHANGED if unchanged else CACHE_MISS, state=new_state, streamed=emitted)
+    except Cancelled:
+        raise
+    except Exception as e:  # Any network or parse failure only affects this feed
+        return FetchResult(feed_url, error=str(e), elapsed=time.monotonic() - start, streamed=emitted)
+
+def stream_feeds(feed_urls, consume, max_workers=DEFAULT_MAX_WORKERS, per_host=DEFAULT_PER_HOST,
+                 timeout=DEFAULT_TIMEOUT, states=None, chunk_size=DEFAULT_CHUNK_SIZE, rate_limiter=None):
+    """Stream many feeds concurrently, calling consume(feed_url, entries) in this thread for each chunk.
+
+    Workers block while the queue is full, so at most a few chunks per worker
+    are in memory at once. A shared RateLimiter caps requests across all
+    workers. Returns the FetchResults in input order.
+    """
+    states = states or {}
+    limiter = HostLimiter(per_host)
+    workers = max(1, min(max_workers, len(feed_urls)))
+    chunks = queue.Queue(maxsize=workers * 2)
+    cancelled = threading.Event()
+
+    def put(item):
+        while not cancelled.is_set():
+            try:
+                chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise Cancelled()
+
+    def work(index, url):
+        try:
+            result = stream_feed(url, lambda entries: put((url, entries)), timeout, limiter,
+                                 states.get(url), chunk_size, rate_limiter)
+        except Cancelled:
+            return
+        put((index, result))
+
+    results = [None] * len(feed_urls)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="feed-stream") as pool:
+        for index, url in enumerate(feed_urls):
+            pool.submit(work, index, url)
+        try:
+            pending = len(feed_urls)
+            while pending:
+                key, value = chunks.get()
+                if isinstance(key, int):
+                    results[key] = value
+                    pending -= 1
+                else:
+                    consume(key, value)
+        except BaseException:
+            cancelled.set()
+            raise
+
+    for result in results:
+        if result.cache_hit:
+            logger.debug(f"Cache hit ({result.cache}) for {result.feed_url} in {result.elapsed:.2f}s")
+        elif result.ok:
+            logger.debug(f"Streamed {result.feed_url} ({result.streamed} entries) in {result.elapsed:.2f}s")
+        else:
+            logger.error(f"Error fetching feed {result.feed_url}: {result.error}")
+    return results
@@ -0,0 +1 @@
+"""In-process job runner - runs the repository's tools on cron schedules in one warm process."""
@@ -0,0 +1,83 @@
+"""
+Per-job output capture in the `[timestamp] script | line` log format.
+
+Jobs that run in threads share sys.stdout and sys.stderr, so both are replaced
+by a ThreadRouter that hands each write to the prefixing writer of the job
+running on the current thread. Output from threads that no job has claimed
+(including pools the tools start themselves) is logged under the runner's name.
+"""
+import io
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+class LogFile:
+    """An append-only log shared by every writer; each line is one write call."""
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # O_APPEND keeps lines from the runner and its child processes whole
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def write_line(self, name, line):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        os.write(self.fd, f"[{stamp}] {name} | {line}\n".encode("utf-8", "replace"))
+
+    def close(self):
+        os.close(self.fd)
+
+class PrefixWriter(io.TextIOBase):
+    """File-like object that logs each complete line under one job name."""
+
+    def __init__(self, log, name):
+        self.log = log
+        self.name = name
+        self._partial = ""
+        self._lock = threading.Lock()
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        with self._lock:
+            *lines, self._partial = (self._partial + text).split("\n")
+            for line in lines:
+                self.log.write_line(self.name, line.rstrip("\r"))
+        return len(text)
+
+    def close(self):
+        with self._lock:
+            if self._partial:
+                self.log.write_line(self.name, self._partial)
+                self._partial = ""
+
+_current = threading.local()
+
+class ThreadRouter(io.TextIOBase):
+    """Stand-in for sys.stdout/sys.stderr that writes to the current thread's job."""
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        return (getattr(_current, "writer", None) or self.fallback).write(text)
+
+    def flush(self):
+        pass
+
+@contextmanager
+def capture(writer):
+    """Send this thread's stdout/stderr to `writer` while the block runs."""
+    previous = getattr(_current, "writer", None)
+    _current.writer = writer
+    try:
+        yield writer
+    finally:
+        _current.writer = previous
+        writer.close()
@@ -0,0 +1,81 @@
+"""
+Cron-style schedules: `minute hour day-of-month month day-of-week`.
+
+Each field accepts `*`, numbers, ranges (`1-5`), steps (`*/15`, `0-30/10`) and
+comma-separated lists. Day of week runs 0-6 from Sunday, and 7 is also Sunday.
+As in cron, when both day fields are restricted a day matches if either one
+does. The shortcuts @hourly, @daily, @weekly and @monthly are accepted too.
+"""
+from datetime import timedelta
+
+SHORTCUTS = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+
+# (lowest, highest) accepted value per field
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+def parse_field(text, lowest, highest):
+    values = set()
+    for part in text.split(","):
+        spec, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if spec == "*":
+            start, end = lowest, highest
+        elif "-" in spec:
+            start, end = (int(value) for value in spec.split("-", 1))
+        else:
+            start = int(spec)
+            end = highest if step > 1 else start
+        if not (lowest <= start <= end <= highest) or step < 1:
+            raise ValueError(f"Cron field '{text}' is outside {lowest}-{highest}")
+        values.update(range(start, end + 1, step))
+    return values
+
+class CronSchedule:
+    """A parsed five-field cron expression."""
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = SHORTCUTS.get(expression, expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression '{expression}' needs five fields")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            parse_field(field, *bounds) for field, bounds in zip(fields, FIELD_RANGES)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, when):
+        if when.month not in self.months:
+            return False
+        day_ok = when.day in self.days
+        # Python counts Monday as 0; cron counts Sunday as 0
+        weekday_ok = (when.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def matches(self, when):
+        return when.minute in self.minutes and when.hour in self.hours and self._day_matches(when)
+
+    def next_after(self, when):
+        """The first matching minute strictly after `when`."""
+        candidate = when.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Skip whole days and hours that cannot match; five years covers 29 February
+        limit = candidate + timedelta(days=5 * 366)
+        while candidate < limit:
+            if not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression '{self.expression}' never matches")
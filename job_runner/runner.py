@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Job Runner - run the repository's tools on cron schedules inside one warm process.
+
+Instead of cron starting a fresh interpreter for every job (and every job
+re-importing feedparser, requests, BeautifulSoup, ...), the runner imports each
+tool once and calls its main function on schedule. Output goes to the same log,
+in the same `[timestamp] script | line` format, as cron_run_w_log.sh.
+
+Jobs are listed one per line in a jobs file: a cron schedule, optional
+key=value options, the tool and its arguments.
+
+    # schedule      options                     tool                                  arguments
+    0 9 * * *       mode=process timeout=600    feed_mailer/send_new_feeds_email.py   check --feed https://example.com/feed.xml
+    */5 * * * *                                 uptime_watch/check_url_uptime.py      https://example.com
+    0 8 * * 1-5     mode=process                drama/absence_report.py
+
+The tool is a script path relative to the repository root or a `module:function`.
+Options:
+    name=...        name used in the log (default: the script's file name)
+    timeout=SECS    kill the job after this long; needs mode=process, since a
+                    thread cannot be killed
+    mode=thread     run in the runner's thread pool (default)
+    mode=process    run in a child forked from a pre-warmed server process
+
+A job is never started while its previous run is still going; that run is
+skipped and logged instead.
+"""
+import argparse
+import importlib
+import inspect
+import multiprocessing
+import os
+import shlex
+import signal
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Make the repository root importable when run as a script
+_repo_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
+from job_runner.capture import LogFile, PrefixWriter, ThreadRouter, capture
+from job_runner.cron import CronSchedule
+from common.instrumentation import record as record_stage, serve_metrics
+
+RUNNER_NAME = "job_runner"
+DEFAULT_WORKERS = 4
+DEFAULT_LOG = os.environ.get("LOG") or os.path.join(os.path.expanduser("~"), "cron.log")
+
+def resolve_target(target):
+    """Return (module name, function name, default job name) for a script path or module:function."""
+    if ":" in target:
+        module, function = target.split(":", 1)
+        return module, function, module.rsplit(".", 1)[-1]
+    path = os.path.realpath(os.path.join(_repo_root, target))
+    relative = os.path.relpath(path, _repo_root)
+    if not relative.endswith(".py") or relative.startswith(".."):
+        raise ValueError(f"Job target '{target}' is not a script inside the repository or a module:function")
+    return relative[:-3].replace(os.sep, "."), "main", os.path.basename(target)
+
+def load_function(module, function):
+    return getattr(importlib.import_module(module), function)
+
+def call_job(func, argv):
+    # Tools with a main(argv=None) get the job's arguments; argument-less mains are called bare
+    if inspect.signature(func).parameters:
+        return func(argv)
+    if argv:
+        raise TypeError(f"{func.__module__}.{func.__name__}() takes no arguments")
+    return func()
+
+def exit_code(exc):
+    code = exc.code
+    return code if isinstance(code, int) else (0 if code is None else 1)
+
+class Job:
+    """One scheduled invocation of a tool."""
+
+    def __init__(self, schedule, target, argv=(), name=None, timeout=None, mode="thread"):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown job mode '{mode}'")
+        if timeout is not None and mode != "process":
+            raise ValueError(f"timeout= needs mode=process; a thread job cannot be killed ({target})")
+        self.schedule = schedule if isinstance(schedule, CronSchedule) else CronSchedule(schedule)
+        self.target = target
+        self.module, self.function, default_name = resolve_target(target)
+        self.argv = list(argv)
+        self.name = name or default_name
+        self.timeout = timeout
+        self.mode = mode
+
+    @classmethod
+    def parse(cls, line):
+        """Parse `<schedule> [key=value ...] <tool> [args ...]`."""
+        parts = shlex.split(line)
+        if parts[0].startswith("@"):
+            schedule, rest = parts[0], parts[1:]
+        else:
+            schedule, rest = " ".join(parts[:5]), parts[5:]
+        options = {}
+        while rest and "=" in rest[0] and rest[0].split("=", 1)[0] in ("name", "timeout", "mode"):
+            key, value = rest.pop(0).split("=", 1)
+            options[key] = value
+        if not rest:
+            raise ValueError(f"Job line has no tool: {line}")
+        return cls(schedule, rest[0], rest[1:],
+                   name=options.get("name"),
+                   timeout=float(options["timeout"]) if "timeout" in options else None,
+                   mode=options.get("mode", "thread"))
+
+def read_jobs(path):
+    jobs = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                jobs.append(Job.parse(line))
+    return jobs
+
+def _child_main(module, function, argv, name, log_path):
+    """Entry point of a process-mode job: route fds 1 and 2 into the log, then run the tool."""
+    read_fd, write_fd = os.pipe()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(write_fd, 1)
+    os.dup2(write_fd, 2)
+    os.close(write_fd)
+    log = LogFile(log_path)
+    writer = PrefixWriter(log, name)
+
+    def pump():
+        with os.fdopen(read_fd, "r", errors="replace") as pipe:
+            for text in pipe:
+                writer.write(text)
+        writer.close()
+
+    pumper = threading.Thread(target=pump)
+    pumper.start()
+    code = 0
+    try:
+        call_job(load_function(module, function), argv)
+    except SystemExit as e:
+        code = exit_code(e)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # Closing the last write ends the pump
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+        pumper.join()
+    os._exit(code)
+
+class Runner:
+    """Starts due jobs in a pool, one run per job at a time."""
+
+    def __init__(self, jobs, log, workers=DEFAULT_WORKERS):
+        self.jobs = jobs
+        self.log = log
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.running = {}
+        self._lock = threading.Lock()
+        self._process_context = None
+        process_modules = sorted({job.module for job in jobs if job.mode == "process"})
+        if process_modules:
+            # The fork server imports the tools once; each job is forked from it warm
+            self._process_context = multiprocessing.get_context("forkserver")
+            self._process_context.set_forkserver_preload(["job_runner.runner"] + process_modules)
+
+    def note(self, message):
+        self.log.write_line(RUNNER_NAME, message)
+
+    def start(self, index):
+        job = self.jobs[index]
+        with self._lock:
+            if index in self.running:
+                started = self.running[index]
+                self.note(f"Skipping {job.name}: previous run still going after {time.time() - started:.0f}s")
+                return None
+            self.running[index] = time.time()
+        return self.pool.submit(self._run, index)
+
+    def _run(self, index):
+        job = self.jobs[index]
+        started = time.time()
+        try:
+            if job.mode == "process":
+                code = self._run_process(job)
+            else:
+                code = self._run_thread(job)
+        finally:
+            with self._lock:
+                self.running.pop(index, None)
+        record_stage(RUNNER_NAME, job.name, time.time() - started, ok=code == 0, exit_code=code)
+        self.note(f"{job.name} finished with exit code {code} in {time.time() - started:.1f}s")
+        return code
+
+    def _run_thread(self, job):
+        with capture(PrefixWriter(self.log, job.name)):
+            try:
+                call_job(load_function(job.module, job.function), job.argv)
+                return 0
+            except SystemExit as e:
+                return exit_code(e)
+            except Exception:
+                traceback.print_exc()
+                return 1
+
+    def _run_process(self, job):
+        process = self._process_context.Process(
+            target=_child_main, args=(job.module, job.function, job.argv, job.name, self.log.path),
+            name=f"job-{job.name}"
+        )
+        process.start()
+        process.join(job.timeout)
+        if process.is_alive():
+            self.note(f"{job.name} exceeded its {job.timeout:g}s timeout; terminating")
+            process.terminate()
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        return process.exitcode
+
+    def run(self, stop_event):
+        """Start each job when its schedule next comes due, until stop_event is set."""
+        self.note(f"Started with {len(self.jobs)} job(s)")
+        now = datetime.now()
+        due = [job.schedule.next_after(now) for job in self.jobs]
+        while due and not stop_event.is_set():
+            # Wake at least once a minute so a clock change is noticed
+            if stop_event.wait(min(60, max(0, (min(due) - datetime.now()).total_seconds()))):
+                break
+            now = datetime.now()
+            for index, job in enumerate(self.jobs):
+                if due[index] > now:
+                    continue
+                # If the process was suspended past a run, skip it rather than replaying it late
+                if now - due[index] < timedelta(minutes=1):
+                    self.start(index)
+                else:
+                    self.note(f"Missed {job.name} at {due[index]:%Y-%m-%d %H:%M}; the runner was suspended")
+                due[index] = job.schedule.next_after(now)
+        self.shutdown()
+
+    def run_once(self, names=None):
+        """Run the named jobs (all if None) now and wait for them; returns the worst exit code."""
+        futures = [self.start(index) for index, job in enumerate(self.jobs) if names is None or job.name in names]
+        codes = [future.result() for future in futures if future is not None]
+        self.shutdown()
+        return max([code or 0 for code in codes] + [0])
+
+    def shutdown(self):
+        self.note("Waiting for running jobs to finish")
+        self.pool.shutdown(wait=True)
+
+def setup_argparser():
+    argparser = argparse.ArgumentParser(description="Run the repository's tools on cron schedules in one process.")
+    argparser.add_argument("jobs_file", help="File listing one job per line")
+    argparser.add_argument("--workers", type=int, help="Jobs that may run at the same time", default=DEFAULT_WORKERS)
+    argparser.add_argument("--log", type=str, help="Log file (default: $LOG or ~/cron.log)", default=DEFAULT_LOG)
+    argparser.add_argument("--run-now", action="append", metavar="NAME", help="Run this job once now and exit (repeatable)")
+    argparser.add_argument("--all-now", action="store_true", help="Run every job once now and exit")
+    return argparser
+
+def main(argv=None):
+    args = setup_argparser().parse_args(argv)
+    log = LogFile(args.log)
+
+    # Route output before any tool is imported, so handlers set up at import time go through the router
+    sys.stdout = ThreadRouter(PrefixWriter(log, RUNNER_NAME))
+    sys.stderr = ThreadRouter(PrefixWriter(log, RUNNER_NAME))
+
+    jobs = read_jobs(args.jobs_file)
+    # Pay every import once, up front
+    for job in jobs:
+        load_function(job.module, job.function)
+    runner = Runner(jobs, log, args.workers)
+
+    if args.run_now or args.all_now:
+        sys.exit(runner.run_once(None if args.all_now else set(args.run_now)))
+
+    stop_event = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop_event.set())
+    # Job durations and every tool's stage timings on METRICS_PORT, if set
+    serve_metrics()
+    runner.run(stop_event)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Resident Google Tasks agent - helpers shared by new_task_from_clipboard."""
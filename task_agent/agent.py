@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Task agent - a resident process that creates Google Tasks on behalf of fast clients.
+
+The agent keeps an authenticated Tasks service warm and listens on a Unix
+socket for one-line JSON requests:
+
+    {"op": "add", "body": {"title": ..., "notes": ...}, "tasklist": "@default"}
+    {"op": "status"}    queue counts and the last delivery error
+    {"op": "flush"}     try to deliver pending tasks now
+    {"op": "requeue"}   put tasks the API rejected back in the queue
+    {"op": "ping"}
+
+An "add" is acknowledged as soon as it is committed to the durable queue. A
+background thread delivers due tasks in batched API calls and retries failures
+with backoff, so clients never wait on the Google API.
+
+The agent runs detached, so it never opens the browser consent flow: without a
+stored token it keeps tasks queued and reports the error. Sign in once with
+`agent.py --authorize`.
+
+Settings: TASKAGENT_SOCKET and TASKAGENT_DB (defaults under data/).
+"""
+import argparse
+import fcntl
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+
+# Make the repository root importable when run as a script
+_repo_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
+from task_agent.client import socket_path, db_path, request
+from task_agent.queue import TaskQueue, backoff
+from common.instrumentation import stage, count, serve_metrics
+from common.google_client import MissingTokenError
+
+SCOPES = ['https://www.googleapis.com/auth/tasks']
+
+BATCH_SIZE = 50
+# Pending rows written by clients while the agent was down are picked up at least this often
+POLL_INTERVAL = 30
+# After a wake-up, wait this long so a burst of captures goes out as one batch
+LINGER = 0.2
+# Client errors that can succeed on retry: auth refresh, quota and rate limits, timeouts
+RETRYABLE_STATUSES = {401, 403, 408, 429}
+
+def is_permanent(error):
+    """True for an API rejection that would be repeated unchanged, i.e. any other 4xx."""
+    status = getattr(getattr(error, "resp", None), "status", None)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False
+    return 400 <= status < 500 and status not in RETRYABLE_STATUSES
+
+class GoogleTasksBackend:
+    """Creates tasks through the Tasks API, several per HTTP request."""
+
+    def __init__(self, scopes=SCOPES):
+        self.scopes = scopes
+        self._service = None
+
+    @property
+    def service(self):
+        if self._service is None:
+            from common.google_client import get_service
+            self._service = get_service('tasks', 'v1', self.scopes, interactive=False)
+        return self._service
+
+    def warm(self):
+        return self.service
+
+    def insert_batch(self, items):
+        """Return ([(outbox id, task id)], [(item, error)]) for one batch."""
+        service = self.service
+        results = {}
+
+        def callback(request_id, response, exception):
+            results[request_id] = (response, exception)
+
+        batch = service.new_batch_http_request(callback=callback)
+        for item in items:
+            batch.add(service.tasks().insert(tasklist=item.tasklist, body=item.body), request_id=str(item.id))
+        with stage("task_agent", "insert_batch", tasks=len(items)):
+            batch.execute()
+
+        sent, failed = [], []
+        for item in items:
+            response, exception = results.get(str(item.id), (None, RuntimeError("No response in batch")))
+            if exception is None:
+                sent.append((item.id, response.get("id")))
+            else:
+                failed.append((item, exception))
+        return sent, failed
+
+class TaskAgent:
+    """Accepts captures into the queue and delivers them in the background."""
+
+    def __init__(self, queue, backend, batch_size=BATCH_SIZE, poll_interval=POLL_INTERVAL):
+        self.queue = queue
+        self.backend = backend
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.wake = threading.Event()
+        # Set while the API is unreachable, so new captures just queue up instead of each retrying
+        self.paused_until = 0
+        self._outages = 0
+
+    def add(self, body, tasklist="@default"):
+        queued_id = self.queue.enqueue(body, tasklist)
+        self.wake.set()
+        return queued_id
+
+    def flush_due(self):
+        """Deliver every task that is due now; returns how many were created."""
+        created = 0
+        while time.time() >= self.paused_until:
+            items = self.queue.due(self.batch_size)
+            if not items:
+                return created
+            try:
+                sent, failed = self.backend.insert_batch(items)
+                self._outages = 0
+            except Exception as e:
+                # API unreachable (network, missing token): pause and keep the batch
+                # pending without counting an attempt against its rows
+                self._outages += 1
+                self.paused_until = time.time() + backoff(self._outages)
+                self.queue.defer(items, e)
+                count("task_agent", "delivery_outages")
+                print(f"Tasks API unavailable, {len(items)} task(s) kept queued: {e}", flush=True)
+                return created
+            rejected = [(item, error) for item, error in failed if is_permanent(error)]
+            failed = [(item, error) for item, error in failed if not is_permanent(error)]
+            self.queue.record(sent, failed, rejected)
+            count("task_agent", "tasks_created", len(sent))
+            count("task_agent", "delivery_failures", len(failed))
+            count("task_agent", "tasks_rejected", len(rejected))
+            created += len(sent)
+            if rejected:
+                print(f"{len(rejected)} task(s) rejected by the API, marked failed (use requeue to retry): "
+                      f"{rejected[0][1]}", flush=True)
+            if failed:
+                print(f"{len(failed)} task(s) not delivered, will retry: {failed[0][1]}", flush=True)
+                if not sent:
+                    return created
+        return created
+
+    def run_flusher(self, stop_event):
+        try:
+            self.backend.warm()
+        except MissingTokenError as e:
+            print(f"{e}. Tasks stay queued until you sign in with 'agent.py --authorize'.", flush=True)
+        except Exception as e:
+            print(f"Could not prepare the Tasks service yet: {e}", flush=True)
+        while not stop_event.is_set():
+            created = self.flush_due()
+            if created:
+                print(f"Created {created} task(s)", flush=True)
+            next_due = self.queue.next_due()
+            if next_due is not None:
+                next_due = max(next_due, self.paused_until)
+            timeout = self.poll_interval if next_due is None else min(self.poll_interval, max(0, next_due - time.time()))
+            if self.wake.wait(timeout) and not stop_event.is_set():
+                time.sleep(LINGER)
+            self.wake.clear()
+
+    def handle(self, message):
+        op = message.get("op")
+        if op == "add":
+            body = message.get("body")
+            if not isinstance(body, dict) or not body.get("title"):
+                return {"ok": False, "error": "add needs a body with a title"}
+            return {"ok": True, "id": self.add(body, message.get("tasklist") or "@default")}
+        if op == "status":
+            return {"ok": True, **self.queue.counts()}
+        if op == "flush":
+            self.paused_until = 0
+            self.wake.set()
+            return {"ok": True}
+        if op == "requeue":
+            requeued = self.queue.requeue(message.get("ids"))
+            self.wake.set()
+            return {"ok": True, "requeued": requeued}
+        if op == "ping":
+            return {"ok": True}
+        return {"ok": False, "error": f"Unknown op {op!r}"}
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = self.server.agent.handle(json.loads(line))
+            except ValueError as e:
+                reply = {"ok": False, "error": f"Bad request: {e}"}
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+
+class AgentServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, agent):
+        self.agent = agent
+        super().__init__(path, _RequestHandler)
+        os.chmod(path, 0o600)
+
+def serve(agent, path, stop_event):
+    """Run the socket server and the flusher until stop_event is set."""
+    # Only one agent per socket: the lock also guards removing a stale socket file
+    lock_file = open(path + ".lock", "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        print(f"Another task agent is already serving {path}", flush=True)
+        return False
+    if os.path.exists(path):
+        os.unlink(path)
+
+    server = AgentServer(path, agent)
+    flusher = threading.Thread(target=agent.run_flusher, args=(stop_event,), daemon=True)
+    flusher.start()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Task agent listening on {path}", flush=True)
+    serve_metrics()
+    try:
+        stop_event.wait()
+    finally:
+        server.shutdown()
+        server.server_close()
+        os.unlink(path)
+        agent.wake.set()
+        flusher.join(timeout=10)
+        lock_file.close()
+    return True
+
+def setup_argparser():
+    argparser = argparse.ArgumentParser(description="Resident agent that creates Google Tasks from a durable queue.")
+    argparser.add_argument("--socket", type=str, help="Unix socket to listen on", default=None)
+    argparser.add_argument("--db-path", type=str, help="Path of the queue database", default=None)
+    argparser.add_argument("--batch-size", type=int, help="Tasks per batched API request", default=BATCH_SIZE)
+    argparser.add_argument("--poll-interval", type=float, help="Seconds between queue scans when idle", default=POLL_INTERVAL)
+    argparser.add_argument("--authorize", action="store_true", help="Run the Google sign-in flow in the foreground, store the token and exit")
+    argparser.add_argument("--requeue", action="store_true", help="Put tasks the API rejected back in the queue and exit")
+    return argparser
+
+def authorize(scopes=SCOPES):
+    from common.google_client import get_credentials
+
+    get_credentials(scopes, interactive=True)
+    print("Google Tasks token stored", flush=True)
+
+def requeue_failed(queue, path):
+    """Requeue failed rows, then ask a running agent to deliver them now."""
+    requeued = queue.requeue()
+    try:
+        request({"op": "flush"}, path)
+    except (OSError, ValueError):
+        pass
+    print(f"Requeued {requeued} failed task(s)", flush=True)
+
+def main(argv=None, backend=None):
+    args = setup_argparser().parse_args(argv)
+    if args.authorize:
+        authorize()
+        return
+    path = args.socket or socket_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    queue = TaskQueue(args.db_path or db_path())
+    if args.requeue:
+        try:
+            requeue_failed(queue, path)
+        finally:
+            queue.close()
+        return
+    agent = TaskAgent(queue, backend or GoogleTasksBackend(), args.batch_size, args.poll_interval)
+
+    stop_event = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop_event.set())
+    try:
+        serve(agent, path, stop_event)
+    finally:
+        queue.close()
+
+if __name__ == "__main__":
+    main()
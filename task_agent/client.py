@@ -0,0 +1,62 @@
+"""
+Client side of the task agent: talk to it over its Unix socket.
+
+Requests and replies are single JSON lines. If the agent is not running the
+capture is written straight into the durable queue and the agent is started in
+the background to deliver it, so a capture is never lost or kept waiting on
+the Google API. Standard library only, to keep the hotkey path fast.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+
+from task_agent.queue import TaskQueue
+
+_repo_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DEFAULT_SOCKET_PATH = os.path.join(_repo_root, "data", "task_agent.sock")
+DEFAULT_DB_PATH = os.path.join(_repo_root, "data", "task_agent.db")
+DEFAULT_LOG_PATH = os.path.join(_repo_root, "data", "task_agent.log")
+AGENT_SCRIPT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "agent.py")
+
+def socket_path():
+    return os.environ.get("TASKAGENT_SOCKET") or DEFAULT_SOCKET_PATH
+
+def db_path():
+    return os.environ.get("TASKAGENT_DB") or DEFAULT_DB_PATH
+
+def request(message, path=None, timeout=2.0):
+    """Send one request to the agent and return its reply; raises OSError if it is unreachable."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or socket_path())
+        sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        reply = sock.makefile("rb").readline()
+    if not reply:
+        raise ConnectionError("Task agent closed the connection without replying")
+    return json.loads(reply)
+
+def start_agent():
+    """Launch the agent detached from this process, logging to data/task_agent.log."""
+    os.makedirs(os.path.dirname(DEFAULT_LOG_PATH), exist_ok=True)
+    with open(DEFAULT_LOG_PATH, "ab") as log:
+        subprocess.Popen([sys.executable, AGENT_SCRIPT], stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                         start_new_session=True)
+
+def add_task(body, tasklist="@default", autostart=True):
+    """Queue a task resource for creation; returns (outbox id, True if the agent took it)."""
+    try:
+        reply = request({"op": "add", "tasklist": tasklist, "body": body})
+        if reply.get("ok"):
+            return reply["id"], True
+    except (OSError, ValueError):
+        pass
+    queue = TaskQueue(db_path())
+    try:
+        queued_id = queue.enqueue(body, tasklist)
+    finally:
+        queue.close()
+    if autostart:
+        start_agent()
+    return queued_id, False
@@ -0,0 +1,156 @@
+"""
+Durable outbox of tasks waiting to be created in Google Tasks.
+
+A capture is committed to SQLite before anyone is told it was accepted, so it
+survives an agent crash, a reboot or a long API outage. The agent sends due
+rows in batches; a send that fails for a transient reason (5xx, rate limit,
+network) is retried with exponential backoff capped at BACKOFF_MAX, for as long
+as it takes. While the API is unreachable altogether, rows are deferred without
+counting an attempt. Only a request the API rejects outright (a 4xx that would
+fail again unchanged) marks a row failed; failed rows are kept and can be put
+back with `requeue`, so nothing is ever dropped.
+
+Only the standard library is used here: the hotkey client writes to the queue
+directly when the agent is not running, and it must start fast.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+BACKOFF_BASE = 5
+BACKOFF_MAX = 3600
+
+def backoff(attempts):
+    """Seconds to wait before retry number `attempts` (1-based)."""
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+class QueuedTask:
+    def __init__(self, id, tasklist, body, attempts):
+        self.id = id
+        self.tasklist = tasklist
+        self.body = body
+        self.attempts = attempts
+
+class TaskQueue:
+    """The outbox table; safe to share between threads and processes."""
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = FULL")
+            self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY,
+                tasklist TEXT NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL,
+                last_error TEXT,
+                task_id TEXT,
+                sent_at REAL
+            );
+            ''')
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt)")
+            self.conn.commit()
+
+    def enqueue(self, body, tasklist="@default"):
+        """Durably queue one task resource; returns its outbox id."""
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO outbox (tasklist, body, created_at, next_attempt) VALUES (?, ?, ?, ?)",
+                (tasklist, json.dumps(body), now, now)
+            )
+            self.conn.commit()
+            return cursor.lastrowid
+
+    def due(self, limit, now=None):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, tasklist, body, attempts FROM outbox WHERE status = ? AND next_attempt <= ? "
+                "ORDER BY id LIMIT ?", (PENDING, now or time.time(), limit)
+            ).fetchall()
+        return [QueuedTask(id, tasklist, json.loads(body), attempts) for id, tasklist, body, attempts in rows]
+
+    def next_due(self):
+        """When the earliest pending row becomes due, or None if nothing is pending."""
+        with self.lock:
+            return self.conn.execute("SELECT MIN(next_attempt) FROM outbox WHERE status = ?", (PENDING,)).fetchone()[0]
+
+    def record(self, sent, failed, rejected=(), now=None):
+        """Store one batch's outcome.
+
+        `sent` is [(id, task_id)]. `failed` is [(QueuedTask, error)] for transient
+        errors: the row stays pending and backs off. `rejected` is [(QueuedTask, error)]
+        for errors the API would repeat: the row is marked failed.
+        """
+        now = now or time.time()
+        updates = []
+        for item, error in failed:
+            attempts = item.attempts + 1
+            updates.append((PENDING, attempts, now + backoff(attempts), str(error)[:500], item.id))
+        for item, error in rejected:
+            updates.append((FAILED, item.attempts + 1, now, str(error)[:500], item.id))
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE outbox SET status = 'sent', task_id = ?, sent_at = ?, last_error = NULL WHERE id = ?",
+                [(task_id, now, id) for id, task_id in sent]
+            )
+            self.conn.executemany(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                updates
+            )
+            self.conn.commit()
+
+    def defer(self, items, error):
+        """Note why rows could not be sent while the API was unreachable; no attempt is counted.
+
+        The agent pauses all delivery during an outage, so the rows stay due.
+        """
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE outbox SET last_error = ? WHERE id = ?",
+                [(str(error)[:500], item.id) for item in items]
+            )
+            self.conn.commit()
+
+    def requeue(self, ids=None, now=None):
+        """Put failed rows (all, or just `ids`) back in the queue; returns how many."""
+        now = now or time.time()
+        sql = "UPDATE outbox SET status = ?, attempts = 0, next_attempt = ? WHERE status = ?"
+        args = [PENDING, now, FAILED]
+        if ids:
+            sql += f" AND id IN ({', '.join('?' for _ in ids)})"
+            args.extend(ids)
+        with self.lock:
+            cursor = self.conn.execute(sql, args)
+            self.conn.commit()
+            return cursor.rowcount
+
+    def counts(self):
+        with self.lock:
+            counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status"))
+            last_error = self.conn.execute(
+                "SELECT last_error FROM outbox WHERE last_error IS NOT NULL ORDER BY next_attempt DESC LIMIT 1"
+            ).fetchone()
+        return {
+            PENDING: counts.get(PENDING, 0),
+            SENT: counts.get(SENT, 0),
+            FAILED: counts.get(FAILED, 0),
+            "last_error": last_error[0] if last_error else None,
+        }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
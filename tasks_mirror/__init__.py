@@ -0,0 +1 @@
+"""Local SQLite mirror of Google Tasks - helpers shared by list-all-tasks."""
@@ -0,0 +1,182 @@
+"""
+SQLite mirror of Google Tasks.
+
+Every task list and task is kept with its full API resource (`raw`), plus the
+columns we filter on. Titles and notes are indexed in an FTS5 table that is kept
+in step by triggers. Each list remembers the newest `updated` timestamp it has
+seen, which is the `updatedMin` of its next incremental sync.
+
+The schema version is kept in `PRAGMA user_version`, as for the feed mailer.
+"""
+import json
+import os
+import sqlite3
+
+def _initial_schema(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS tasklists (
+        id TEXT PRIMARY KEY,
+        title TEXT,
+        updated TEXT,
+        is_default INTEGER NOT NULL DEFAULT 0,
+        synced_until TEXT
+    );
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS tasks (
+        tasklist_id TEXT NOT NULL REFERENCES tasklists (id) ON DELETE CASCADE,
+        id TEXT NOT NULL,
+        title TEXT,
+        notes TEXT,
+        status TEXT,
+        due TEXT,
+        completed TEXT,
+        updated TEXT,
+        parent TEXT,
+        position TEXT,
+        hidden INTEGER NOT NULL DEFAULT 0,
+        raw TEXT NOT NULL,
+        UNIQUE (tasklist_id, id)
+    );
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status_due ON tasks (status, due)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_due ON tasks (due)")
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5 (
+        title, notes, content='tasks', content_rowid='rowid'
+    );
+    ''')
+    # External-content FTS: mirror every change to tasks into the index
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts (rowid, title, notes) VALUES (new.rowid, new.title, new.notes);
+    END;
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, title, notes) VALUES ('delete', old.rowid, old.title, old.notes);
+    END;
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, title, notes) VALUES ('delete', old.rowid, old.title, old.notes);
+        INSERT INTO tasks_fts (rowid, title, notes) VALUES (new.rowid, new.title, new.notes);
+    END;
+    ''')
+
+# Append new migrations to the end; never edit or reorder released ones
+MIGRATIONS = [
+    _initial_schema,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA busy_timeout = 5000",
+]
+
+def migrate(conn):
+    """Bring the database up to SCHEMA_VERSION, one transaction per migration."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Tasks mirror schema version {version} is newer than this script supports ({SCHEMA_VERSION})")
+
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {number}")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+
+def open_store(db_path):
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    migrate(conn)
+    return conn
+
+def get_tasklists(conn):
+    """{list id: synced_until} for every mirrored list."""
+    return dict(conn.execute("SELECT id, synced_until FROM tasklists"))
+
+def replace_tasklists(conn, tasklists, default_id=None):
+    """Upsert the current task lists and drop (with their tasks) any that are gone."""
+    conn.executemany(
+        "INSERT INTO tasklists (id, title, updated, is_default) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (id) DO UPDATE SET title = excluded.title, updated = excluded.updated, "
+        "is_default = excluded.is_default",
+        [(tl["id"], tl.get("title"), tl.get("updated"), tl["id"] == default_id) for tl in tasklists]
+    )
+    current = {tl["id"] for tl in tasklists}
+    gone = [(list_id,) for list_id in get_tasklists(conn) if list_id not in current]
+    conn.executemany("DELETE FROM tasklists WHERE id = ?", gone)
+
+def _task_row(tasklist_id, task):
+    return (tasklist_id, task["id"], task.get("title"), task.get("notes"), task.get("status"),
+            task.get("due"), task.get("completed"), task.get("updated"), task.get("parent"),
+            task.get("position"), bool(task.get("hidden")), json.dumps(task))
+
+def apply_changes(conn, tasklist_id, tasks, synced_until):
+    """Apply one list's changed tasks (deleted ones are removed) and advance its watermark."""
+    deleted = [(tasklist_id, task["id"]) for task in tasks if task.get("deleted")]
+    changed = [_task_row(tasklist_id, task) for task in tasks if not task.get("deleted")]
+    conn.executemany("DELETE FROM tasks WHERE tasklist_id = ? AND id = ?", deleted)
+    conn.executemany(
+        "INSERT INTO tasks (tasklist_id, id, title, notes, status, due, completed, updated, parent, "
+        "position, hidden, raw) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (tasklist_id, id) DO UPDATE SET title = excluded.title, notes = excluded.notes, "
+        "status = excluded.status, due = excluded.due, completed = excluded.completed, "
+        "updated = excluded.updated, parent = excluded.parent, position = excluded.position, "
+        "hidden = excluded.hidden, raw = excluded.raw",
+        changed
+    )
+    conn.execute("UPDATE tasklists SET synced_until = ? WHERE id = ?", (synced_until, tasklist_id))
+
+def query_tasks(conn, status=None, due_after=None, due_before=None, search=None, tasklists=None,
+                include_hidden=False):
+    """Yield the raw task resources matching the filters, list by list in task order."""
+    clauses = []
+    args = []
+    join = ""
+    if search:
+        join = "JOIN tasks_fts ON tasks_fts.rowid = tasks.rowid"
+        clauses.append("tasks_fts MATCH ?")
+        args.append(search)
+    if status:
+        clauses.append("tasks.status = ?")
+        args.append(status)
+    if due_after:
+        clauses.append("tasks.due >= ?")
+        args.append(due_after)
+    if due_before:
+        clauses.append("tasks.due < ?")
+        args.append(due_before)
+    if tasklists:
+        # Lists can be named by id, by title, or as @default
+        placeholders = ", ".join("?" for _ in tasklists)
+        clauses.append(f"(tasklists.id IN ({placeholders}) OR tasklists.title IN ({placeholders})"
+                       f"{' OR tasklists.is_default' if '@default' in tasklists else ''})")
+        args.extend(tasklists)
+        args.extend(tasklists)
+    if not include_hidden:
+        clauses.append("NOT tasks.hidden")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    cursor = conn.execute(
+        f"SELECT tasks.raw FROM tasks JOIN tasklists ON tasklists.id = tasks.tasklist_id {join} {where} "
+        "ORDER BY tasklists.is_default DESC, tasklists.title, tasks.position", args
+    )
+    while True:
+        rows = cursor.fetchmany(500)
+        if not rows:
+            return
+        for (raw,) in rows:
+            yield raw
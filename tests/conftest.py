@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The tools run as scripts rather than an installed package; make the repository root importable
+_repo_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
@@ -0,0 +1,79 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from uptime_watch.connectivity import ConnectivityOracle
+
+class ProbeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path == "/slow":
+            self.server.release.wait(10)
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ProbeHandler)
+    server.requests = []
+    server.release = threading.Event()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", server
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def unreachable():
+    # A port that was just free: connections to it are refused
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/"
+
+def test_probe_is_cached_within_ttl(stub, unreachable, tmp_path):
+    url, server = stub
+    oracle = ConnectivityOracle([unreachable, f"{url}/ok"], ttl=60, timeout=2,
+                                state_path=str(tmp_path / "state.json"))
+    assert oracle.is_online()
+    assert oracle.is_online()
+    assert server.requests == ["/ok"]
+
+def test_expired_result_is_probed_again(stub, tmp_path):
+    url, server = stub
+    oracle = ConnectivityOracle([f"{url}/ok"], ttl=0, timeout=2, state_path=str(tmp_path / "state.json"))
+    assert oracle.is_online()
+    assert oracle.is_online()
+    assert len(server.requests) == 2
+
+def test_fresh_oracle_reads_shared_state(stub, unreachable, tmp_path):
+    url, server = stub
+    state_path = str(tmp_path / "state.json")
+    assert ConnectivityOracle([f"{url}/ok"], state_path=state_path, timeout=2).is_online()
+    with open(state_path) as f:
+        assert json.load(f)["online"] is True
+
+    # Another process: its only target is down, but the shared answer is still fresh
+    assert ConnectivityOracle([unreachable], state_path=state_path, timeout=2).is_online()
+    assert server.requests == ["/ok"]
+
+def test_offline_when_no_target_answers(unreachable, tmp_path):
+    state_path = str(tmp_path / "state.json")
+    assert not ConnectivityOracle([unreachable], state_path=state_path, timeout=2).is_online()
+    with open(state_path) as f:
+        assert json.load(f)["online"] is False
+
+def test_first_answer_wins(stub, tmp_path):
+    url, server = stub
+    oracle = ConnectivityOracle([f"{url}/slow", f"{url}/ok"], timeout=8, state_path=None)
+    started = time.time()
+    assert oracle.is_online()
+    assert time.time() - started < 5
+    assert "/ok" in server.requests
@@ -0,0 +1,11 @@
+import pytest
+
+from feed_mailer.digest import Template
+
+@pytest.mark.parametrize("source", ["{date:%Y-%m-%d}", "{title!r}", "{title:>20}"])
+def test_format_specs_and_conversions_are_rejected(source):
+    with pytest.raises(ValueError, match="format spec or conversion"):
+        Template(source)
+
+def test_plain_fields_render():
+    assert Template("{title} <{link}>").render({"title": "Hi", "link": "https://example.com"}) == "Hi <https://example.com>"
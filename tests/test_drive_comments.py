@@ -0,0 +1,94 @@
+import importlib.util
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+pytest.importorskip("googleapiclient")
+pytest.importorskip("google_auth_httplib2")
+from google.oauth2.credentials import Credentials
+
+_repo_root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+def load_script():
+    # The script's file name is not a valid module name
+    spec = importlib.util.spec_from_file_location(
+        "read_comments", os.path.join(_repo_root, "drive-comments", "read-comments.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+read_comments = load_script()
+
+MODIFIED_TIME = "2024-05-01T12:00:00.000Z"
+# Three pages of comments per file, chained by nextPageToken
+PAGES = {
+    None: ([1, 2], "page-2"),
+    "page-2": ([3, 4], "page-3"),
+    "page-3": ([5], None),
+}
+
+class DriveHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        # DRIVE_API_ENDPOINT replaces the base URL, so paths are files/<id>[/comments]
+        parts = url.path.strip("/").split("/")
+        file_id = parts[1]
+        if parts[2:] == ["comments"]:
+            self.server.comment_requests.append(file_id)
+            numbers, next_token = PAGES[query.get("pageToken", [None])[0]]
+            body = {"comments": [{"id": str(n), "content": f"{file_id} comment {n}",
+                                  "author": {"displayName": "Reviewer"}} for n in numbers]}
+            if next_token:
+                body["nextPageToken"] = next_token
+        else:
+            self.server.metadata_requests.append(file_id)
+            body = {"name": f"Doc {file_id}", "modifiedTime": MODIFIED_TIME}
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def drive(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DriveHandler)
+    server.comment_requests = []
+    server.metadata_requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("DRIVE_API_ENDPOINT", f"http://127.0.0.1:{server.server_address[1]}/")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def run(cache_path, file_ids):
+    credentials = Credentials(token="test-token")
+    service = read_comments.build_service(credentials)
+    cache = read_comments.load_cache(cache_path)
+    results = read_comments.export_comments(service, credentials, file_ids, cache, workers=2)
+    read_comments.save_cache(cache_path, cache)
+    return results
+
+def test_pages_are_collected_and_unchanged_files_come_from_cache(drive, tmp_path):
+    cache_path = str(tmp_path / "comments.json")
+    file_ids = ["doc-a", "doc-b"]
+
+    first = run(cache_path, file_ids)
+    for file_id in file_ids:
+        assert [comment["content"] for comment in first[file_id]["comments"]] == \
+            [f"{file_id} comment {n}" for n in range(1, 6)]
+    assert sorted(drive.comment_requests) == ["doc-a"] * 3 + ["doc-b"] * 3
+
+    # Same modifiedTime: only the metadata is fetched again
+    second = run(cache_path, file_ids)
+    assert second == first
+    assert len(drive.comment_requests) == 6
+    assert sorted(drive.metadata_requests) == ["doc-a", "doc-a", "doc-b", "doc-b"]
@@ -0,0 +1,118 @@
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from feed_mailer import send_new_feeds_email
+from feed_mailer.backfill import backfill
+from feed_mailer.schema import DELIVERY_SENT, DELIVERY_PENDING, DELIVERY_SEEDED
+
+FEED = """<?xml version="1.0"?>
+<rss version="2.0"><channel><title>Test</title>
+<item><title>One</title><link>https://example.com{path}/1</link><description>first</description>
+<pubDate>Mon, 01 Jan 2024 10:00:00 GMT</pubDate></item>
+<item><title>Two</title><link>https://example.com{path}/2</link><description>second</description>
+<pubDate>Tue, 02 Jan 2024 10:00:00 GMT</pubDate></item>
+</channel></rss>"""
+
+def entry_urls(feed_url):
+    path = feed_url.split("/", 3)[3]
+    return [f"https://example.com/{path}/1", f"https://example.com/{path}/2"]
+
+class FeedHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # Each feed path has its own entries
+        body = FEED.format(path=self.path).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/rss+xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def feed_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FeedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def feed_url(feed_server):
+    return f"{feed_server}/feed.xml"
+
+@pytest.fixture
+def outbox(monkeypatch):
+    """Record digests instead of mailing them; addresses in .failing are refused."""
+    class Outbox(list):
+        failing = set()
+
+    sent = Outbox()
+
+    def send_digest_email(entries, receiver_email, part=None):
+        if receiver_email in sent.failing:
+            return False
+        sent.append((receiver_email, sorted(entry.url for entry in entries)))
+        return True
+
+    monkeypatch.setattr(send_new_feeds_email, "send_digest_email", send_digest_email)
+    monkeypatch.delenv("FEEDSEND_RECEIVER_EMAIL", raising=False)
+    return sent
+
+def test_failed_subscriber_is_retried_without_resending_to_others(tmp_path, feed_url, outbox):
+    db_path = str(tmp_path / "feeds.db")
+    subscribers = {feed_url: ["alice@example.com", "bob@example.com"]}
+    both = entry_urls(feed_url)
+
+    def run():
+        outbox.clear()
+        send_new_feeds_email.check_and_send_feeds(db_path, [feed_url], 0, force=True, subscribers=subscribers)
+        return list(outbox)
+
+    outbox.failing = {"bob@example.com"}
+    assert run() == [("alice@example.com", both)]
+
+    outbox.failing = set()
+    assert run() == [("bob@example.com", both)]
+
+    assert run() == []
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT DISTINCT delivery FROM rss_entries").fetchall() == [(DELIVERY_SENT,)]
+    assert conn.execute("SELECT COUNT(*) FROM entry_deliveries").fetchone()[0] == 0
+
+def test_entries_of_feeds_without_recipients_stay_pending(tmp_path, feed_server, outbox):
+    db_path = str(tmp_path / "feeds.db")
+    followed, orphan = f"{feed_server}/followed.xml", f"{feed_server}/orphan.xml"
+    subscribers = {followed: ["alice@example.com"]}
+
+    send_new_feeds_email.check_and_send_feeds(db_path, [followed, orphan], 0, force=True, subscribers=subscribers)
+    assert list(outbox) == [("alice@example.com", entry_urls(followed))]
+
+    conn = sqlite3.connect(db_path)
+    delivery = dict(conn.execute("SELECT url, delivery FROM rss_entries"))
+    assert {url: delivery[url] for url in entry_urls(orphan)} == dict.fromkeys(entry_urls(orphan), DELIVERY_PENDING)
+    conn.close()
+
+    # Once the feed has a subscriber, its pending entries go out
+    outbox.clear()
+    subscribers[orphan] = ["bob@example.com"]
+    send_new_feeds_email.check_and_send_feeds(db_path, [followed, orphan], 0, force=True, subscribers=subscribers)
+    assert list(outbox) == [("bob@example.com", entry_urls(orphan))]
+
+@pytest.mark.parametrize("deliver", [False, True])
+def test_backfill_is_only_emailed_when_asked(tmp_path, feed_url, outbox, deliver):
+    db_path = str(tmp_path / "feeds.db")
+    conn, _ = send_new_feeds_email.setup_database(db_path)
+    _, seen, inserted, _ = backfill(conn, [feed_url], deliver=deliver, rate=0)
+    assert (seen, inserted) == (2, 2)
+    assert conn.execute("SELECT DISTINCT delivery FROM rss_entries").fetchall() == \
+        [(DELIVERY_PENDING if deliver else DELIVERY_SEEDED,)]
+    conn.close()
+
+    subscribers = {feed_url: ["alice@example.com"]}
+    send_new_feeds_email.check_and_send_feeds(db_path, [feed_url], 0, force=True, subscribers=subscribers)
+    assert list(outbox) == ([("alice@example.com", entry_urls(feed_url))] if deliver else [])
@@ -0,0 +1,63 @@
+import sqlite3
+
+import pytest
+
+from feed_mailer import schema
+from feed_mailer.schema import migrate
+from feed_mailer.search import query_entries, make_cursor, parse_cursor
+
+def legacy_database(path, rows):
+    """A database at schema version 3, before entries had an explicit id."""
+    conn = sqlite3.connect(path)
+    for number, migration in enumerate(schema.MIGRATIONS[:3], start=1):
+        migration(conn.cursor())
+        conn.execute(f"PRAGMA user_version = {number}")
+    conn.executemany("INSERT INTO rss_entries (url, title, description, publication_date, feed_url) "
+                     "VALUES (?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    return conn
+
+@pytest.fixture
+def conn(tmp_path):
+    rows = [(f"https://example.com/{i}", f"Entry {i} {'python' if i % 3 == 0 else 'rust'}", f"<p>body {i}</p>",
+             None if i % 7 == 0 else f"2024-01-{1 + i % 28:02d}T{i % 24:02d}:00:00", f"https://feed/{i % 2}")
+            for i in range(100)]
+    conn = legacy_database(str(tmp_path / "feeds.db"), rows)
+    # Leave gaps, so VACUUM would renumber implicit rowids
+    conn.execute("DELETE FROM rss_entries WHERE CAST(substr(url, 21) AS INTEGER) % 5 = 1")
+    conn.commit()
+    migrate(conn)
+    yield conn
+    conn.close()
+
+def titles(rows):
+    return {row["title"] for row in rows}
+
+def test_search_survives_vacuum(conn):
+    # The FTS index is keyed on an explicit INTEGER PRIMARY KEY, which VACUUM never renumbers
+    columns = {name: pk for _, name, _, _, _, pk in conn.execute("PRAGMA table_info(rss_entries)")}
+    assert columns["id"] == 1 and columns["url"] == 0
+    before = titles(query_entries(conn, search="python"))
+    conn.execute("VACUUM")
+
+    assert titles(query_entries(conn, search="python")) == before
+    assert before and all("python" in title for title in before)
+
+def test_pages_cover_every_entry_once(conn):
+    seen, after = [], None
+    while True:
+        page = list(query_entries(conn, after=after, limit=7))
+        seen.extend(row["url"] for row in page)
+        if len(page) < 7:
+            break
+        after = parse_cursor(make_cursor(page[-1]))
+
+    assert len(seen) == len(set(seen)) == conn.execute("SELECT COUNT(*) FROM rss_entries").fetchone()[0]
+
+def test_filters_and_fts_follow_updates(conn):
+    rows = list(query_entries(conn, feeds=["https://feed/0"], since="2024-01-10", until="2024-01-20"))
+    assert rows and all(row["feed_url"] == "https://feed/0" and "2024-01-10" <= row["publication_date"] < "2024-01-20"
+                        for row in rows)
+
+    conn.execute("UPDATE rss_entries SET title = 'zebra crossing' WHERE url = 'https://example.com/2'")
+    assert [row["url"] for row in query_entries(conn, search="zebra")] == ["https://example.com/2"]
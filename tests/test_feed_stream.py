@@ -0,0 +1,22 @@
+from feed_mailer.digest import DigestRenderer
+from feed_mailer.stream import EntryParser
+
+FEED = b"""<?xml version="1.0"?>
+<rss version="2.0"><channel><title>Test</title>
+<item><title>Hostile</title><link>https://example.com/1</link>
+<description>&lt;p&gt;Hello &lt;b&gt;reader&lt;/b&gt;&lt;script&gt;alert(1)&lt;/script&gt;
+&lt;img src="x.png" onerror="alert(2)"&gt;&lt;a href="javascript:alert(3)"&gt;link&lt;/a&gt;&lt;/p&gt;</description>
+</item>
+</channel></rss>"""
+
+def parse(body):
+    parser = EntryParser()
+    return parser.feed(body) + parser.close()
+
+def test_streamed_summaries_are_sanitized():
+    entry, = parse(FEED)
+    html = DigestRenderer().render_entry(entry, "https://example.com/feed").html
+
+    assert "<b>reader</b>" in html
+    for payload in ("<script", "alert(1)", "onerror", "javascript:"):
+        assert payload not in html
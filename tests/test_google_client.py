@@ -0,0 +1,67 @@
+import importlib.util
+import json
+import os
+import pickle
+import sys
+from datetime import datetime, timedelta
+from importlib.machinery import SourceFileLoader
+
+import pytest
+
+pytest.importorskip("google.oauth2")
+from google.oauth2.credentials import Credentials
+
+from common import google_client
+from common.google_client import MissingTokenError, TokenStore, get_credentials
+
+SCOPES = ["https://www.googleapis.com/auth/tasks"]
+READONLY = ["https://www.googleapis.com/auth/tasks.readonly"]
+
+def test_old_token_pickle_is_imported_once(tmp_path, monkeypatch):
+    legacy = tmp_path / "token.pickle"
+    with open(legacy, "wb") as f:
+        pickle.dump(Credentials(token="old-token", refresh_token="refresh", client_id="id", client_secret="secret",
+                                token_uri="https://oauth2.googleapis.com/token", scopes=SCOPES,
+                                expiry=datetime.utcnow() + timedelta(hours=1)), f)
+    monkeypatch.setattr(google_client, "LEGACY_TOKEN_FILES", [str(legacy)])
+    store = TokenStore(str(tmp_path / "tokens.json"))
+
+    # No consent flow is needed: the old token is found and moved into the store
+    assert get_credentials(SCOPES, store=store, interactive=False).token == "old-token"
+    with open(store.path) as f:
+        assert list(json.load(f)) == SCOPES
+    assert not legacy.exists()
+    assert (tmp_path / "token.pickle.migrated").exists()
+
+    # Later runs read the store; a token for other scopes still needs consent
+    assert get_credentials(SCOPES, store=store, interactive=False).token == "old-token"
+    with pytest.raises(MissingTokenError):
+        get_credentials(READONLY, store=store, interactive=False)
+
+def test_missing_token_without_pickle(tmp_path, monkeypatch):
+    monkeypatch.setattr(google_client, "LEGACY_TOKEN_FILES", [str(tmp_path / "token.pickle")])
+    with pytest.raises(MissingTokenError):
+        get_credentials(SCOPES, store=TokenStore(str(tmp_path / "tokens.json")), interactive=False)
+
+def load_list_all_tasks():
+    # The script has no .py suffix
+    path = os.path.join(google_client._repo_root, "list-all-tasks")
+    loader = SourceFileLoader("list_all_tasks", path)
+    module = importlib.util.module_from_spec(importlib.util.spec_from_loader("list_all_tasks", loader))
+    loader.exec_module(module)
+    return module
+
+@pytest.mark.parametrize("argv", [["--help"], ["--offline"]])
+def test_list_all_tasks_needs_no_credentials_offline(tmp_path, monkeypatch, capsys, argv):
+    list_all_tasks = load_list_all_tasks()
+
+    def no_credentials(*args, **kwargs):
+        raise AssertionError("credentials were requested")
+
+    monkeypatch.setattr(list_all_tasks, "get_credentials", no_credentials)
+    monkeypatch.setattr(sys, "argv", ["list-all-tasks", *argv, "--db-path", str(tmp_path / "tasks.db")])
+    try:
+        list_all_tasks.main()
+    except SystemExit as e:
+        assert e.code == 0
+    assert capsys.readouterr().out
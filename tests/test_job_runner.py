@@ -0,0 +1,88 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from job_runner import runner
+from job_runner.capture import LogFile
+from job_runner.cron import CronSchedule, parse_field
+from job_runner.runner import Job, Runner
+
+def sleep_job(argv):
+    """Process-mode target: sleep for argv[0] seconds."""
+    time.sleep(float(argv[0]))
+
+def test_field_steps_ranges_and_lists():
+    assert parse_field("*/5", 0, 59) == set(range(0, 60, 5))
+    assert parse_field("1-5", 0, 6) == {1, 2, 3, 4, 5}
+    assert parse_field("0-30/10", 0, 59) == {0, 10, 20, 30}
+    assert parse_field("1,15,30", 1, 31) == {1, 15, 30}
+    assert parse_field("1-3,20", 0, 23) == {1, 2, 3, 20}
+    with pytest.raises(ValueError):
+        parse_field("60", 0, 59)
+    with pytest.raises(ValueError):
+        parse_field("5-1", 0, 59)
+
+def test_sunday_is_zero_and_seven():
+    assert CronSchedule("0 0 * * 7").weekdays == {0}
+    # 2024-01-07 was a Sunday
+    assert CronSchedule("0 0 * * 0").matches(datetime(2024, 1, 7))
+
+def test_next_after():
+    schedule = CronSchedule("*/5 * * * *")
+    assert schedule.next_after(datetime(2024, 1, 1, 10, 2, 30)) == datetime(2024, 1, 1, 10, 5)
+    assert schedule.next_after(datetime(2024, 1, 1, 10, 5)) == datetime(2024, 1, 1, 10, 10)
+    assert CronSchedule("@daily").next_after(datetime(2024, 1, 1, 10, 0)) == datetime(2024, 1, 2)
+    assert CronSchedule("0 0 29 2 *").next_after(datetime(2024, 3, 1)) == datetime(2028, 2, 29)
+
+def test_day_of_month_or_day_of_week():
+    start = datetime(2024, 1, 1)  # a Monday
+    # Both restricted: the 13th or any Friday, whichever comes first
+    assert CronSchedule("0 0 13 * 5").next_after(start) == datetime(2024, 1, 5)
+    assert CronSchedule("0 0 13 * 5").matches(datetime(2024, 1, 13))
+    # Only one restricted: the other field does not widen it
+    assert CronSchedule("0 0 13 * *").next_after(start) == datetime(2024, 1, 13)
+    assert CronSchedule("0 0 * * 5").next_after(start) == datetime(2024, 1, 5)
+    assert not CronSchedule("0 0 13 1 *").matches(datetime(2024, 2, 13))
+
+def test_job_lines():
+    job = Job.parse("*/5 * * * * name=ping uptime_watch/check_url_uptime.py https://example.com")
+    assert (job.name, job.mode, job.timeout, job.argv) == ("ping", "thread", None, ["https://example.com"])
+    assert job.module == "uptime_watch.check_url_uptime"
+    job = Job.parse("@hourly mode=process timeout=30 drama/absence_report.py")
+    assert (job.mode, job.timeout) == ("process", 30.0)
+    with pytest.raises(ValueError, match="mode=process"):
+        Job.parse("@hourly timeout=30 drama/absence_report.py")
+
+def test_overlapping_run_is_skipped(tmp_path, monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def blocking(argv):
+        calls.append(argv)
+        release.wait(10)
+
+    monkeypatch.setattr(runner, "load_function", lambda module, function: blocking)
+    log = LogFile(str(tmp_path / "cron.log"))
+    job_runner = Runner([Job("* * * * *", "tests.fake:blocking", name="slow")], log)
+    first = job_runner.start(0)
+    assert job_runner.start(0) is None
+    release.set()
+    assert first.result(10) == 0
+    # Once the run has finished the job may start again
+    assert job_runner.start(0).result(10) == 0
+    job_runner.shutdown()
+    assert len(calls) == 2
+    assert "Skipping slow: previous run still going" in (tmp_path / "cron.log").read_text()
+
+def test_process_job_killed_on_timeout(tmp_path):
+    log = LogFile(str(tmp_path / "cron.log"))
+    job = Job("* * * * *", f"{__name__}:sleep_job", ["30"], name="sleepy", timeout=0.5, mode="process")
+    job_runner = Runner([job], log)
+    started = time.time()
+    code = job_runner.start(0).result(30)
+    job_runner.shutdown()
+    assert code != 0
+    assert time.time() - started < 20
+    assert "sleepy exceeded its 0.5s timeout; terminating" in (tmp_path / "cron.log").read_text()
@@ -0,0 +1,88 @@
+import smtplib
+import socket
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller
+
+from common.mailer import SMTPConfig, MailSession, build_message
+
+REFUSED = "nobody@example.com"
+
+class RecordingHandler:
+    """Stores delivered messages with the client port they came in on; can drop a connection."""
+
+    def __init__(self):
+        self.messages = []
+        self.drop_next = False
+
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        if self.drop_next:
+            self.drop_next = False
+            server.transport.close()
+            return "421 Closing connection"
+        envelope.mail_from = address
+        envelope.mail_options.extend(mail_options)
+        return "250 OK"
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address == REFUSED:
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((session.peer[1], envelope.rcpt_tos))
+        return "250 Message accepted"
+
+    def connections(self):
+        return len({port for port, _ in self.messages})
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    handler.port = controller.port
+    yield handler
+    controller.stop()
+
+@pytest.fixture
+def session(smtp_server):
+    config = SMTPConfig("127.0.0.1", smtp_server.port, sender="mailer@example.com", starttls=False, timeout=5)
+    with MailSession(config) as session:
+        yield session
+
+def message(to="reader@example.com", subject="Hello"):
+    return build_message(subject, "body", "mailer@example.com", to)
+
+def test_sends_reuse_one_connection(smtp_server, session):
+    for number in range(5):
+        session.send(message(subject=f"Message {number}"))
+
+    assert len(smtp_server.messages) == 5
+    assert smtp_server.connections() == 1
+
+def test_server_disconnect_reconnects_once(smtp_server, session):
+    session.send(message())
+    smtp_server.drop_next = True
+    session.send(message())
+    session.send(message())
+
+    assert len(smtp_server.messages) == 3
+    assert smtp_server.connections() == 2
+
+def test_refused_recipient_is_not_resent(smtp_server, session):
+    session.send(message())
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        session.send(message(to=REFUSED))
+    session.send(message())
+
+    assert len(smtp_server.messages) == 2
+    assert smtp_server.connections() == 1
@@ -0,0 +1,115 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from drama import sheet_cache
+from drama.sheet_cache import fetch_index, lookup, CACHE_MISS, CACHE_HIT_NOT_MODIFIED, CACHE_HIT_UNCHANGED
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                       "drama", "fixtures", "attendance_sheet.html")
+
+class SheetHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.statuses.append(None)
+        etag = server.etag
+        if etag and self.headers.get("If-None-Match") == etag:
+            server.statuses[-1] = 304
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        server.statuses[-1] = 200
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(server.body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(server.body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def sheet_server():
+    """Serves the saved sheet; tests change .body and .etag (None: no validators)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SheetHandler)
+    with open(FIXTURE, "rb") as f:
+        server.body = f.read()
+    server.etag = '"v1"'
+    server.statuses = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/sheet"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Count how often the sheet HTML is parsed into an index."""
+    calls = []
+    build = sheet_cache.build_date_index
+
+    def counting_build(body, encoding="utf-8"):
+        calls.append(len(body))
+        return build(body, encoding)
+
+    monkeypatch.setattr(sheet_cache, "build_date_index", counting_build)
+    return calls
+
+def fetch(server, cache_dir):
+    with requests.Session() as session:
+        return fetch_index(session, server.url, str(cache_dir))
+
+def test_first_fetch_parses_the_fixture(sheet_server, tmp_path, parses):
+    index, status = fetch(sheet_server, tmp_path)
+
+    assert status == CACHE_MISS
+    assert len(parses) == 1
+    rows = lookup(index, "11 Jan")
+    assert rows and rows[0][0] == "Thu, 11 Jan"
+    assert rows[0][3] == "Ava M."
+
+def test_not_modified_reuses_the_cached_index(sheet_server, tmp_path, parses):
+    first, _ = fetch(sheet_server, tmp_path)
+    index, status = fetch(sheet_server, tmp_path)
+
+    assert status == CACHE_HIT_NOT_MODIFIED
+    assert sheet_server.statuses == [200, 304]
+    assert len(parses) == 1
+    assert index == first
+
+def test_same_body_without_validators_reuses_the_index(sheet_server, tmp_path, parses):
+    sheet_server.etag = None
+    first, _ = fetch(sheet_server, tmp_path)
+    index, status = fetch(sheet_server, tmp_path)
+
+    assert status == CACHE_HIT_UNCHANGED
+    assert sheet_server.statuses == [200, 200]
+    assert len(parses) == 1
+    assert index == first
+
+def test_changed_body_is_parsed_again(sheet_server, tmp_path, parses):
+    fetch(sheet_server, tmp_path)
+    sheet_server.body = sheet_server.body.replace(b"Ava M.", b"Noah K.")
+    sheet_server.etag = '"v2"'
+    index, status = fetch(sheet_server, tmp_path)
+
+    assert status == CACHE_MISS
+    assert len(parses) == 2
+    assert lookup(index, "11 Jan")[0][3] == "Noah K."
+
+def test_index_version_bump_rebuilds_from_the_cached_body(sheet_server, tmp_path, parses, monkeypatch):
+    first, _ = fetch(sheet_server, tmp_path)
+    monkeypatch.setattr(sheet_cache, "INDEX_VERSION", sheet_cache.INDEX_VERSION + 1)
+    index, status = fetch(sheet_server, tmp_path)
+
+    # The body is not refetched, only re-indexed
+    assert status == CACHE_HIT_NOT_MODIFIED
+    assert len(parses) == 2
+    assert index == first
+    assert sheet_cache.SheetCache(str(tmp_path), sheet_server.url).meta["index_version"] == sheet_cache.INDEX_VERSION
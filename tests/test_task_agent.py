@@ -0,0 +1,80 @@
+from task_agent.agent import TaskAgent
+from task_agent.queue import TaskQueue, PENDING, SENT, FAILED
+
+class HttpResponse:
+    def __init__(self, status):
+        self.status = status
+
+class ApiError(Exception):
+    """Shaped like googleapiclient's HttpError: the status is on .resp."""
+
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.resp = HttpResponse(status)
+
+class FakeBackend:
+    def __init__(self, offline=False, item_error=None):
+        self.offline = offline
+        self.item_error = item_error
+        self.created = []
+
+    def warm(self):
+        pass
+
+    def insert_batch(self, items):
+        if self.offline:
+            raise ConnectionError("offline")
+        if self.item_error:
+            return [], [(item, self.item_error) for item in items]
+        self.created.extend(item.body["title"] for item in items)
+        return [(item.id, f"task-{item.id}") for item in items], []
+
+def make_agent(tmp_path, backend):
+    queue = TaskQueue(str(tmp_path / "queue.db"))
+    return TaskAgent(queue, backend), queue
+
+def retry_now(agent, queue, rounds):
+    for _ in range(rounds):
+        agent.paused_until = 0
+        queue.conn.execute("UPDATE outbox SET next_attempt = 0")
+        agent.flush_due()
+
+def test_long_outage_keeps_tasks_pending(tmp_path):
+    backend = FakeBackend(offline=True)
+    agent, queue = make_agent(tmp_path, backend)
+    agent.add({"title": "buy milk"})
+
+    retry_now(agent, queue, 50)
+
+    counts = queue.counts()
+    assert counts[PENDING] == 1 and counts[FAILED] == 0
+    assert counts["last_error"] == "offline"
+    assert queue.conn.execute("SELECT attempts FROM outbox").fetchone()[0] == 0
+
+    backend.offline = False
+    retry_now(agent, queue, 1)
+    assert backend.created == ["buy milk"]
+    assert queue.counts()[SENT] == 1
+
+def test_server_errors_are_retried_indefinitely(tmp_path):
+    agent, queue = make_agent(tmp_path, FakeBackend(item_error=ApiError(503)))
+    agent.add({"title": "call back"})
+
+    retry_now(agent, queue, 50)
+
+    assert queue.counts()[PENDING] == 1
+    assert queue.conn.execute("SELECT attempts FROM outbox").fetchone()[0] == 50
+
+def test_rejected_task_fails_and_can_be_requeued(tmp_path):
+    backend = FakeBackend(item_error=ApiError(400))
+    agent, queue = make_agent(tmp_path, backend)
+    agent.add({"title": "bad request"})
+
+    agent.flush_due()
+    assert queue.counts()[FAILED] == 1
+
+    backend.item_error = None
+    assert agent.handle({"op": "requeue"}) == {"ok": True, "requeued": 1}
+    agent.flush_due()
+    assert backend.created == ["bad request"]
+    assert queue.counts()[SENT] == 1
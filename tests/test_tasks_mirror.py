@@ -0,0 +1,133 @@
+import json
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+import pytest
+
+pytest.importorskip("googleapiclient")
+pytest.importorskip("google_auth_httplib2")
+from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
+
+from common.google_client import build_service
+from tasks_mirror import sync as tasks_sync
+from tasks_mirror.store import get_tasklists, open_store, query_tasks
+
+T1 = "2024-05-01T10:00:00.000Z"
+T2 = "2024-05-02T10:00:00.000Z"
+T3 = "2024-05-03T10:00:00.000Z"
+
+class TasksHandler(BaseHTTPRequestHandler):
+    """Just enough of the Tasks API: list lists, get @default, and list tasks with paging."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        parts = [unquote(part) for part in url.path.strip("/").split("/")]
+        if parts[2:] == ["users", "@me", "lists", "@default"]:
+            self.reply({"id": "inbox", "title": "Inbox"})
+        elif parts[2:] == ["users", "@me", "lists"]:
+            self.reply({"items": [{"id": list_id, "title": list_id.title(), "updated": T1}
+                                  for list_id in self.server.tasks]})
+        elif parts[2] == "lists" and parts[4:] == ["tasks"]:
+            list_id = parts[3]
+            self.server.task_requests.append((list_id, query.get("updatedMin"), query.get("pageToken")))
+            if list_id in self.server.failing:
+                self.send_error(500)
+                return
+            tasks = [task for task in self.server.tasks[list_id]
+                     if task["updated"] >= query.get("updatedMin", "")
+                     and (query.get("showDeleted") == "true" or not task.get("deleted"))]
+            start = int(query.get("pageToken", 0))
+            size = int(query["maxResults"])
+            body = {"items": tasks[start:start + size]}
+            if start + size < len(tasks):
+                body["nextPageToken"] = str(start + size)
+            self.reply(body)
+        else:
+            self.send_error(404)
+
+    def reply(self, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def task(id, title, updated, position, **fields):
+    return {"id": id, "title": title, "status": "needsAction", "updated": updated,
+            "position": position, **fields}
+
+@pytest.fixture
+def tasks_api(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TasksHandler)
+    server.tasks = {
+        "inbox": [task("a", "Buy milk", T1, "1"), task("b", "Call Bob", T1, "2"), task("c", "Pay rent", T1, "3")],
+        "work": [task("d", "Write report", T1, "1")],
+    }
+    server.task_requests = []
+    server.failing = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # Two tasks per page, so the three-task list takes two requests
+    monkeypatch.setattr(tasks_sync, "PAGE_SIZE", 2)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def run_sync(tasks_api, conn):
+    credentials = Credentials(token="test-token")
+    service = build_service("tasks", "v1", credentials,
+                            client_options={"api_endpoint": f"http://127.0.0.1:{tasks_api.server_address[1]}/"})
+    return tasks_sync.sync(conn, service, credentials, workers=2)
+
+def titles(conn, **filters):
+    return sorted(json.loads(raw)["title"] for raw in query_tasks(conn, **filters))
+
+def test_full_then_incremental_sync(tasks_api, tmp_path):
+    conn = open_store(str(tmp_path / "tasks.db"))
+
+    assert run_sync(tasks_api, conn) == (2, 4, 0)
+    assert titles(conn) == ["Buy milk", "Call Bob", "Pay rent", "Write report"]
+    assert get_tasklists(conn) == {"inbox": T1, "work": T1}
+    # The first sync fetches everything, following the page token
+    assert set(tasks_api.task_requests) == {("inbox", None, None), ("inbox", None, "2"), ("work", None, None)}
+
+    tasks_api.task_requests.clear()
+    inbox = tasks_api.tasks["inbox"]
+    inbox[1].update(title="Call Bob back", updated=T2)
+    inbox[2].update(deleted=True, updated=T2)
+    inbox[0].update(hidden=True, status="completed", updated=T2)
+
+    assert run_sync(tasks_api, conn) == (2, 2, 1)
+    assert titles(conn) == ["Call Bob back", "Write report"]
+    assert titles(conn, include_hidden=True) == ["Buy milk", "Call Bob back", "Write report"]
+    assert get_tasklists(conn) == {"inbox": T2, "work": T1}
+    # Later syncs only ask for what changed since each list's watermark
+    assert set(tasks_api.task_requests) == {("inbox", T1, None), ("inbox", T1, "2"), ("work", T1, None)}
+
+def test_watermark_only_moves_after_commit(tasks_api, tmp_path):
+    db_path = str(tmp_path / "tasks.db")
+    conn = open_store(db_path)
+    run_sync(tasks_api, conn)
+
+    tasks_api.tasks["inbox"][1].update(title="Call Bob back", updated=T3)
+    tasks_api.failing.add("work")
+    with pytest.raises(HttpError):
+        run_sync(tasks_api, conn)
+    # The inbox changes were fetched, but nothing was committed, the watermark included
+    assert get_tasklists(conn) == {"inbox": T1, "work": T1}
+    assert get_tasklists(sqlite3.connect(db_path)) == {"inbox": T1, "work": T1}
+    assert "Call Bob back" not in titles(conn)
+
+    tasks_api.failing.clear()
+    tasks_api.task_requests.clear()
+    run_sync(tasks_api, conn)
+    assert ("inbox", T1, None) in tasks_api.task_requests
+    assert "Call Bob back" in titles(conn)
+    assert get_tasklists(conn) == {"inbox": T3, "work": T1}
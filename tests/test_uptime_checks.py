@@ -0,0 +1,53 @@
+import re
+
+from uptime_watch import checks
+from uptime_watch.checks import Target, BodyCheck
+
+CHUNK = 16 * 1024
+
+class CountingPattern:
+    """Wraps a compiled pattern and counts the bytes each search covers."""
+
+    def __init__(self, regex):
+        self.pattern = re.compile(regex.encode("utf-8"))
+        self.scanned = 0
+
+    def search(self, buffer, pos=0):
+        self.scanned += len(buffer) - pos
+        return self.pattern.search(buffer, pos)
+
+def check(body, **options):
+    body_check = BodyCheck(Target("https://example.com/", **options))
+    for i in range(0, len(body), CHUNK):
+        if body_check.decided:
+            break
+        body_check.feed(body[i:i + CHUNK])
+    return body_check
+
+def test_regex_scan_is_linear_in_body_size():
+    body = b"x" * checks.MAX_BODY_BYTES
+    target = Target("https://example.com/", regex="marker [0-9]+")
+    target.pattern = CountingPattern(target.regex)
+    body_check = BodyCheck(target)
+    for i in range(0, len(body), CHUNK):
+        body_check.feed(body[i:i + CHUNK])
+
+    assert body_check.result()[0] is False
+    # Each chunk plus its overlap while streaming, and one final pass
+    assert target.pattern.scanned <= 2 * len(body) + len(body) // CHUNK * checks.PATTERN_OVERLAP
+
+def test_regex_match_across_chunk_boundary_exits_early():
+    body = b"a" * (CHUNK - 3) + b"marker 42" + b"b" * (10 * CHUNK)
+    body_check = check(body, regex="marker [0-9]+")
+
+    assert body_check.decided
+    assert len(body_check.buffer) == 2 * CHUNK
+    assert body_check.result() == (True, None)
+
+def test_long_match_spanning_chunks_is_found_at_the_end():
+    body = b"<start>" + b"y" * (3 * CHUNK) + b"<end>"
+    assert check(body, regex="<start>y+<end>").result() == (True, None)
+
+def test_anchor_only_matches_at_body_start():
+    body = b"z" * (3 * CHUNK) + b"\nstatus"
+    assert check(body, regex="^status").result()[0] is False
@@ -0,0 +1,38 @@
+import pytest
+
+from uptime_watch import check_url_uptime
+
+@pytest.fixture(autouse=True)
+def isolated_connectivity(monkeypatch, tmp_path):
+    """Keep connectivity state out of the working tree and probes off the internet."""
+    monkeypatch.setenv("UPTIMEWATCH_CONNECTIVITY_STATE", str(tmp_path / "connectivity.json"))
+    monkeypatch.setenv("UPTIMEWATCH_CONNECTIVITY_TARGETS", "http://127.0.0.1:9/")
+    monkeypatch.setattr(check_url_uptime, "_connectivity", None)
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(check_url_uptime, "check_once", lambda target, db_path: calls.append(("check", target)))
+    monkeypatch.setattr(check_url_uptime, "print_report",
+                        lambda db_path, since, url=None: calls.append(("report", url)))
+    return calls
+
+@pytest.mark.parametrize("extra", [
+    ["--contains", "report"],
+    ["--contains", "watch"],
+    ["--regex", "report|watch"],
+])
+def test_option_values_do_not_select_a_subcommand(calls, tmp_path, extra):
+    check_url_uptime.main(["https://example.com", *extra, "--db-path", str(tmp_path / "u.db")])
+
+    (kind, target), = calls
+    assert kind == "check"
+    assert target.url == "https://example.com"
+
+def test_first_positional_selects_report(calls, tmp_path):
+    check_url_uptime.main(["report", "--url", "https://example.com", "--db-path", str(tmp_path / "u.db")])
+    assert calls == [("report", "https://example.com")]
+
+def test_report_after_profile_option(calls, tmp_path):
+    check_url_uptime.main(["--profile", str(tmp_path / "p.out"), "report", "--db-path", str(tmp_path / "u.db")])
+    assert calls == [("report", None)]
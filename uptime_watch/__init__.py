@@ -0,0 +1 @@
+"""Uptime Watch package - helpers shared by check_url_uptime.py."""
@@ -2,95 +2,389 @@ import os
 import sqlite3
 import requests
 from datetime import datetime
-import smtplib
-from email.mime.text import MIMEText
 import sys
+import argparse
+import heapq
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Determine the script's directory and set the database path
 script_dir = os.path.dirname(os.path.realpath(__file__))
-db_path = os.path.join(os.path.dirname(script_dir), "data", "uptime_watch.db")
+default_db_path = os.path.join(os.path.dirname(script_dir), "data", "uptime_watch.db")
+default_connectivity_state = os.path.join(os.path.dirname(script_dir), "data", "uptime_watch.connectivity.json")
 
-# Ensure the data directory exists
-os.makedirs(os.path.dirname(db_path), exist_ok=True)
+# Make the repository root importable for the shared helpers
+if os.path.dirname(script_dir) not in sys.path:
+    sys.path.insert(0, os.path.dirname(script_dir))
 
-# Connect to the SQLite database (creates it if it doesn't exist)
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
+from common.mailer import SMTPConfig, send_email as deliver_email
+from common.instrumentation import stage, record as record_stage, count, add_profile_argument, profiled, serve_metrics
+from uptime_watch.connectivity import ConnectivityOracle
+from uptime_watch import history
+from uptime_watch.checks import Target, BodyCheck, MAX_BODY_BYTES
 
-# Create the table if it doesn't exist
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS website_status (
-    url TEXT PRIMARY KEY,
-    status TEXT,
-    last_checked TEXT
-);
-''')
+DEFAULT_INTERVAL = 300
+DEFAULT_WORKERS = 16
+# Each run is shifted by up to this fraction of its interval so checks don't bunch up
+JITTER_FRACTION = 0.1
+# How often watch mode rolls up and prunes the response-time history
+MAINTENANCE_INTERVAL = 60
 
-# Website URL to check
-# Read the URL from the first command line argument
-website_url = sys.argv[1]
+def setup_database(db_path=default_db_path):
+    # Ensure the data directory exists
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+    # Connect to the SQLite database (creates it if it doesn't exist)
+    conn = sqlite3.connect(db_path)
+    # WAL keeps 'report' readers from blocking the watcher's frequent small writes
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    cursor = conn.cursor()
+
+    # Create the table if it doesn't exist
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS website_status (
+        url TEXT PRIMARY KEY,
+        status TEXT,
+        last_checked TEXT
+    );
+    ''')
+    history.ensure_schema(conn)
+    return conn
+
+# requests.Session is not guaranteed thread-safe, so each worker keeps its own;
+# the session holds keep-alive connections open between checks of the same host
+_thread_local = threading.local()
+
+def get_http_session():
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = _thread_local.session = requests.Session()
+    return session
+
+# One cached connectivity answer shared by every check in this process
+_connectivity = None
+
+def get_connectivity():
+    global _connectivity
+    if _connectivity is None:
+        _connectivity = ConnectivityOracle.from_env(default_connectivity_state)
+    return _connectivity
 
 def has_internet():
-    """Check if there's an internet connection by pinging Google."""
-    try:
-        response = requests.get("http://www.google.com", timeout=10)
-        return response.status_code == 200
-    except requests.ConnectionError:
-        return False
+    """Check if there's an internet connection, reusing a recent answer when there is one."""
+    return get_connectivity().is_online()
 
 # Function to send email
 def send_email(subject, body):
-    sender_email = os.environ.get("UPTIMEWATCH_SENDER_EMAIL")
     receiver_email = os.environ.get("UPTIMEWATCH_RECEIVER_EMAIL")
-    smtp_server = os.environ.get("UPTIMEWATCH_SMTP_SERVER")
-    smtp_port = int(os.environ.get("UPTIMEWATCH_SMTP_PORT"))
-    smtp_username = os.environ.get("UPTIMEWATCH_SMTP_USERNAME")
-    smtp_password = os.environ.get("UPTIMEWATCH_SMTP_PASSWORD")
+    deliver_email(SMTPConfig.from_env("UPTIMEWATCH"), subject, body, receiver_email)
 
-    message = MIMEText(body, "plain")
-    message["Subject"] = subject
-    message["From"] = sender_email
-    message["To"] = receiver_email
+CHUNK_SIZE = 16 * 1024
 
-    with smtplib.SMTP(smtp_server, smtp_port) as server:
-        server.starttls()
-        server.login(smtp_username, smtp_password)
-        server.sendmail(sender_email, receiver_email, message.as_string())
+class CheckResult:
+    """Status of one check plus the measurements kept in the history table."""
 
-# Function to check website status
-def check_website(url):
+    def __init__(self, status, status_code=None, response_ms=None, bytes=None, error_class=None, detail=None):
+        self.status = status
+        self.status_code = status_code
+        self.response_ms = response_ms
+        self.bytes = bytes
+        self.error_class = error_class
+        # Human-readable reason for a DOWN or DEGRADED status, used in alerts
+        self.detail = detail
+
+def measure_website(target):
+    """Fetch the target and return a CheckResult with timing, size and assertion outcome.
+
+    The body is streamed and reading stops as soon as the assertions are
+    decided. A 200 response slower than the target's max_ms is DEGRADED.
+    """
+    if isinstance(target, str):
+        target = Target(target)
+    start = time.monotonic()
     try:
-        response = requests.get(url, timeout=10)
-        return 'UP' if response.status_code == 200 else 'DOWN'
+        with get_http_session().get(target.url, timeout=10, stream=True) as response:
+            if response.status_code != 200:
+                return CheckResult('DOWN', response.status_code, (time.monotonic() - start) * 1000, 0,
+                                   detail=f"HTTP status {response.status_code}")
+
+            body_check = BodyCheck(target) if target.has_assertions else None
+            size = 0
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                size += len(chunk)
+                if body_check:
+                    body_check.feed(chunk)
+                    if body_check.decided:
+                        break
+                elif size >= MAX_BODY_BYTES:
+                    break
+            elapsed_ms = (time.monotonic() - start) * 1000
+
+        if body_check:
+            ok, detail = body_check.result()
+            if not ok:
+                return CheckResult('DOWN', response.status_code, elapsed_ms, size,
+                                   error_class="ContentCheckFailed", detail=detail)
+        if target.max_ms is not None and elapsed_ms > target.max_ms:
+            return CheckResult('DEGRADED', response.status_code, elapsed_ms, size,
+                               detail=f"Response took {elapsed_ms:.0f} ms (threshold {target.max_ms:.0f} ms)")
+        return CheckResult('UP', response.status_code, elapsed_ms, size)
     except Exception as e:  # Catching all exceptions to treat any error as 'DOWN'
         print(f"Error checking site status: {str(e)}")
-        return 'DOWN'
+        return CheckResult('DOWN', error_class=type(e).__name__, detail=str(e))
+
+# Function to check website status
+def check_website(url):
+    return measure_website(url).status
+
+def probe(target):
+    """Check a site; returns None when it looks DOWN only because we are offline."""
+    start = time.monotonic()
+    result = measure_website(target)
+    record_stage("uptime_watch", "http_check", time.monotonic() - start, ok=result.status != 'DOWN',
+                 url=getattr(target, "url", target), status=result.status)
+
+    # If it is DOWN, then check if there's an internet connection
+    if result.status == 'DOWN':
+        with stage("uptime_watch", "connectivity"):
+            online = has_internet()
+        if not online:
+            return None
+    return result
 
-# Check the current status of the website
-current_status = check_website(website_url)
+def record_status(conn, url, current_status, detail=None):
+    """Store the status and send an alert if it changed; returns True on a change."""
+    cursor = conn.cursor()
 
-# If it is DOWN, then check if there's an internet connection
-if current_status == 'DOWN' and not has_internet():
-    print("No internet connection. Skipping.")
-    sys.exit()
+    # Fetch the last status from the database
+    cursor.execute("SELECT status FROM website_status WHERE url = ?", (url,))
+    row = cursor.fetchone()
+    last_status = row[0] if row else None
 
-# Fetch the last status from the database
-cursor.execute("SELECT status FROM website_status WHERE url = ?", (website_url,))
-row = cursor.fetchone()
-last_status = row[0] if row else None
+    # If the status has changed, update the database and send an email
+    if current_status == last_status:
+        return False
 
-# If the status has changed, update the database and send an email
-if current_status != last_status:
     cursor.execute("REPLACE INTO website_status (url, status, last_checked) VALUES (?, ?, ?)",
-                   (website_url, current_status, datetime.now().isoformat()))
+                   (url, current_status, datetime.now().isoformat()))
     conn.commit()
 
-    subject = f"Uptime Watch Alert: {website_url} is now {current_status}"
-    body = f"The status of {website_url} has changed to {current_status}."
+    subject = f"Uptime Watch Alert: {url} is now {current_status}"
+    body = f"The status of {url} has changed to {current_status}."
+    if detail:
+        body += f"\n\n{detail}"
     send_email(subject, body)
+    return True
+
+def record_check(conn, url, result):
+    """Append the sample to the history and alert on a status change."""
+    with stage("uptime_watch", "db_write"):
+        history.record_sample(conn, url, result)
+        conn.commit()
+    changed = record_status(conn, url, result.status, result.detail)
+    if changed:
+        count("uptime_watch", "status_changes")
+    return changed
+
+def check_once(target, db_path=default_db_path):
+    """Check a single URL, as one cron invocation does."""
+    if isinstance(target, str):
+        target = Target(target)
+    url = target.url
+    result = probe(target)
+    if result is None:
+        print("No internet connection. Skipping.")
+        return
+
+    conn = setup_database(db_path)
+    try:
+        record_check(conn, url, result)
+        with stage("uptime_watch", "history_maintain"):
+            history.maintain(conn)
+    finally:
+        conn.close()
+
+    print(f"Checked {url}, status: {result.status}")
+
+def read_targets(path, default_interval=DEFAULT_INTERVAL):
+    """Read `URL [interval_seconds] [option=value ...]` lines; blank lines and # comments are ignored."""
+    targets = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            targets.append(Target.parse(line, default_interval))
+    return targets
+
+def jittered(interval):
+    return interval * (1 + random.uniform(-JITTER_FRACTION, JITTER_FRACTION))
+
+def watch(targets, db_path=default_db_path, workers=DEFAULT_WORKERS, stop_event=None):
+    """Check many URLs on their own intervals from one long-running process.
+
+    HTTP checks run on a thread pool; status changes are written and alerted
+    from this thread, so the SQLite connection is never shared across threads.
+    """
+    stop_event = stop_event or threading.Event()
+    conn = setup_database(db_path)
+
+    # Spread the first round over each target's interval instead of firing everything at once
+    now = time.monotonic()
+    # The index breaks ties so Target objects are never compared
+    schedule = [(now + random.uniform(0, min(target.interval, 30)), i, target) for i, target in enumerate(targets)]
+    heapq.heapify(schedule)
+    in_flight = {}
+    next_maintenance = now + MAINTENANCE_INTERVAL
+
+    print(f"Watching {len(targets)} target(s) with {workers} worker(s)")
+    # Exposes stage timings on METRICS_PORT, if set, for as long as we watch
+    serve_metrics()
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="uptime-check") as pool:
+            while not stop_event.is_set():
+                # Start every check that is due; a slow check is never run twice at once
+                now = time.monotonic()
+                while schedule and schedule[0][0] <= now:
+                    _, i, target = heapq.heappop(schedule)
+                    if target.url not in in_flight.values():
+                        in_flight[pool.submit(probe, target)] = target.url
+                    heapq.heappush(schedule, (now + jittered(target.interval), i, target))
+
+                timeout = max(0.0, schedule[0][0] - time.monotonic()) if schedule else 1.0
+                if in_flight:
+                    done, _ = wait(list(in_flight), timeout=min(timeout, 1.0), return_when=FIRST_COMPLETED)
+                else:
+                    done = ()
+                    stop_event.wait(min(timeout, 1.0))
+
+                for future in done:
+                    url = in_flight.pop(future)
+                    result = future.result()
+                    if result is None:
+                        print(f"No internet connection. Skipping {url}.")
+                        continue
+                    try:
+                        if record_check(conn, url, result):
+                            print(f"Checked {url}, status changed to: {result.status}")
+                    except Exception as e:
+                        print(f"Error recording status for {url}: {str(e)}")
+
+                if time.monotonic() >= next_maintenance:
+                    with stage("uptime_watch", "history_maintain"):
+                        history.maintain(conn)
+                    next_maintenance = time.monotonic() + MAINTENANCE_INTERVAL
+    finally:
+        conn.close()
+
+def parse_since(value):
+    """Turn '90m', '24h', '7d' or an ISO date/time into an epoch timestamp."""
+    units = {"m": history.MINUTE, "h": history.HOUR, "d": history.DAY}
+    if value[-1:] in units and value[:-1].replace(".", "", 1).isdigit():
+        return time.time() - float(value[:-1]) * units[value[-1]]
+    return datetime.fromisoformat(value).timestamp()
+
+def format_ms(value):
+    return "-" if value is None else f"{value:.0f}"
+
+def print_report(db_path, since, url=None):
+    """Print availability and latency percentiles per URL for the window since `since`."""
+    conn = setup_database(db_path)
+    try:
+        start = time.monotonic()
+        # Roll up first so the report reads as few raw samples as possible
+        history.maintain(conn)
+        aggregates = history.summarize(conn, since, url=url)
+        elapsed = time.monotonic() - start
+    finally:
+        conn.close()
+
+    if not aggregates:
+        print("No checks recorded in this window.")
+        return
+
+    print(f"Since {datetime.fromtimestamp(since).isoformat(timespec='seconds')}"
+          f" (latency percentiles are histogram estimates, in ms)")
+    print(f"{'URL':<50} {'checks':>7} {'avail%':>8} {'min':>6} {'avg':>6} {'p50':>6} {'p95':>6} {'p99':>6} {'max':>6}")
+    for row_url in sorted(aggregates):
+        agg = aggregates[row_url]
+        availability = 100.0 * agg.available / agg.samples if agg.samples else 0.0
+        p50, p95, p99 = (agg.percentile(f) for f in (0.5, 0.95, 0.99))
+        print(f"{row_url:<50} {agg.samples:>7} {availability:>8.3f} {format_ms(agg.min_ms):>6} {format_ms(agg.avg_ms):>6}"
+              f" {format_ms(p50):>6} {format_ms(p95):>6} {format_ms(p99):>6} {format_ms(agg.max_ms):>6}")
+    print(f"Computed in {elapsed * 1000:.1f} ms")
+
+def setup_argparser():
+    argparser = argparse.ArgumentParser(
+        description="Check website uptime and email an alert when the status changes.",
+        epilog="Run with a single URL for a one-off check, or 'watch' to monitor many URLs continuously."
+    )
+    add_profile_argument(argparser)
+    subparsers = argparser.add_subparsers(dest="command")
+
+    watch_parser = subparsers.add_parser("watch", help="Check many URLs on a schedule from one process")
+    watch_parser.add_argument("--targets", type=str, required=True, help="File with one 'URL [interval_seconds] [option=value ...]' per line")
+    watch_parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="Default check interval in seconds")
+    watch_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Maximum concurrent checks")
+    watch_parser.add_argument("--db-path", type=str, help="Path to the SQLite database", default=default_db_path)
+
+    report_parser = subparsers.add_parser("report", help="Show availability and response-time percentiles")
+    report_parser.add_argument("--since", type=str, default="24h", help="Window start: e.g. 90m, 24h, 7d or an ISO date (default: 24h)")
+    report_parser.add_argument("--url", type=str, help="Only report on this URL", default=None)
+    report_parser.add_argument("--db-path", type=str, help="Path to the SQLite database", default=default_db_path)
+    return argparser
+
+def setup_check_argparser():
+    # A bare URL keeps the original one-shot interface used by existing crontabs
+    argparser = argparse.ArgumentParser(description="Check one website and email an alert if its status changed.")
+    argparser.add_argument("url", help="URL of the website to check")
+    argparser.add_argument("--db-path", type=str, help="Path to the SQLite database", default=default_db_path)
+    argparser.add_argument("--max-ms", type=float, help="Report DEGRADED when the response takes longer than this", default=None)
+    argparser.add_argument("--contains", type=str, help="Body must contain this text", default=None)
+    argparser.add_argument("--regex", type=str, help="Body must match this regular expression", default=None)
+    argparser.add_argument("--json", type=str, help="JSON path that must be present (a.b) or equal a value (a.b==ok)", default=None)
+    add_profile_argument(argparser)
+    return argparser
+
+SUBCOMMANDS = ("watch", "report")
+
+def _subcommand(argv):
+    """The subcommand named by the first positional argument, or None for a one-shot check."""
+    rest = argv
+    # --profile is the only option the main parser accepts ahead of a subcommand
+    if rest[:1] == ["--profile"]:
+        rest = rest[2:]
+    elif rest[:1] and rest[0].startswith("--profile="):
+        rest = rest[1:]
+    return rest[0] if rest[:1] and rest[0] in SUBCOMMANDS else None
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+
+    # Only the first positional selects a subcommand; "watch" or "report" elsewhere
+    # is an option value of a one-shot check (e.g. --contains report)
+    if _subcommand(argv) is None:
+        args = setup_check_argparser().parse_args(argv)
+        target = Target(args.url, max_ms=args.max_ms, contains=args.contains, regex=args.regex, json_path=args.json)
+        with profiled(args.profile):
+            check_once(target, args.db_path)
+        return
+
+    args = setup_argparser().parse_args(argv)
+    if args.command == "report":
+        with profiled(args.profile):
+            print_report(args.db_path, parse_since(args.since), args.url)
+        return
 
-# Commit changes and close the connection
-conn.commit()
-conn.close()
+    stop_event = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop_event.set())
+    with profiled(args.profile):
+        watch(read_targets(args.targets, args.interval), args.db_path, args.workers, stop_event)
 
-print(f"Checked {website_url}, status: {current_status}")
+if __name__ == "__main__":
+    main()
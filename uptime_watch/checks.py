@@ -0,0 +1,133 @@
+"""
+Per-target check settings for Uptime Watch: latency thresholds and body assertions.
+
+A target can require the response body to contain a substring, match a regular
+expression, or have a value at a JSON path. The body is fed in as it streams
+in, and reading stops as soon as every assertion is decided, so a large page
+is not downloaded just to find a marker near its top. At most MAX_BODY_BYTES
+are read before deciding.
+
+Each chunk is searched together with only the tail of what came before it, so
+checking a body costs time linear in its size. A regular expression match
+longer than PATTERN_OVERLAP that straddles two chunks cannot be seen that way;
+if no match turned up while streaming, the whole body is searched once more at
+the end, so such a match is still found, just without the early exit.
+
+In a targets file, options follow the URL and optional interval:
+
+    https://example.com/ 60 max_ms=800 contains="Welcome back"
+    https://api.example.com/health json=status==ok
+"""
+import json
+import re
+import shlex
+
+MAX_BODY_BYTES = 1024 * 1024
+# Bytes of earlier body searched again with each chunk, for regex matches spanning chunks
+PATTERN_OVERLAP = 4096
+
+class Target:
+    """A URL to check, with its interval, latency threshold and body assertions."""
+
+    def __init__(self, url, interval=None, max_ms=None, contains=None, regex=None, json_path=None):
+        self.url = url
+        self.interval = interval
+        self.max_ms = max_ms
+        self.contains = contains
+        self.regex = regex
+        self.json_path = json_path
+        self.pattern = re.compile(regex.encode("utf-8")) if regex else None
+
+    @property
+    def has_assertions(self):
+        return bool(self.contains or self.pattern or self.json_path)
+
+    @classmethod
+    def parse(cls, line, default_interval=None):
+        """Parse `URL [interval] [key=value ...]`, with shell-style quoting for values."""
+        parts = shlex.split(line)
+        url, rest = parts[0], parts[1:]
+        interval = default_interval
+        if rest and "=" not in rest[0]:
+            interval = float(rest.pop(0))
+        options = {}
+        for part in rest:
+            key, sep, value = part.partition("=")
+            if not sep or key not in ("max_ms", "contains", "regex", "json"):
+                raise ValueError(f"Unknown target option '{part}' for {url}")
+            options[key] = value
+        return cls(url, interval,
+                   max_ms=float(options["max_ms"]) if "max_ms" in options else None,
+                   contains=options.get("contains"),
+                   regex=options.get("regex"),
+                   json_path=options.get("json"))
+
+def lookup_json_path(document, path):
+    """Evaluate `a.b.0.c` or `a.b==value`; returns (ok, detail)."""
+    path, sep, expected = path.partition("==")
+    value = document
+    for key in path.split(".") if path else []:
+        if isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        elif isinstance(value, dict) and key in value:
+            value = value[key]
+        else:
+            return False, f"JSON path '{path}' not found"
+    if not sep:
+        return (True, None) if value not in (None, False) else (False, f"JSON path '{path}' is {value!r}")
+    try:
+        matches = value == json.loads(expected)
+    except ValueError:
+        matches = str(value) == expected
+    return (True, None) if matches else (False, f"JSON path '{path}' is {value!r}, expected {expected}")
+
+class BodyCheck:
+    """Evaluates a target's body assertions incrementally as chunks arrive."""
+
+    def __init__(self, target):
+        self.target = target
+        self.buffer = bytearray()
+        self.needle = target.contains.encode("utf-8") if target.contains else None
+        self.found_substring = self.needle is None
+        self.found_pattern = target.pattern is None
+        self._scanned = 0
+        self._pattern_scanned = 0
+
+    @property
+    def decided(self):
+        """True once the remaining body cannot change the outcome."""
+        if len(self.buffer) >= MAX_BODY_BYTES:
+            return True
+        # JSON can only be judged on the complete document
+        return self.found_substring and self.found_pattern and not self.target.json_path
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        if not self.found_substring:
+            # Re-scan only the tail that could hold a match spanning the chunk boundary
+            start = max(0, self._scanned - len(self.needle) + 1)
+            self.found_substring = self.buffer.find(self.needle, start) != -1
+            self._scanned = len(self.buffer)
+        if not self.found_pattern:
+            # Searching from pos keeps ^ and lookbehinds anchored to the whole body
+            start = max(0, self._pattern_scanned - PATTERN_OVERLAP)
+            self.found_pattern = self.target.pattern.search(self.buffer, start) is not None
+            self._pattern_scanned = len(self.buffer)
+
+    def result(self):
+        """Return (ok, detail) for what has been read."""
+        truncated = " in the first 1MB" if len(self.buffer) >= MAX_BODY_BYTES else ""
+        if not self.found_pattern and self._pattern_scanned > PATTERN_OVERLAP:
+            # One full pass for long matches the windowed scans could not see
+            self.found_pattern = self.target.pattern.search(self.buffer) is not None
+        if not self.found_substring:
+            return False, f"Body does not contain '{self.target.contains}'{truncated}"
+        if not self.found_pattern:
+            return False, f"Body does not match /{self.target.regex}/{truncated}"
+        if self.target.json_path:
+            try:
+                document = json.loads(bytes(self.buffer))
+            except ValueError:
+                return False, f"Body is not valid JSON{truncated}"
+            return lookup_json_path(document, self.target.json_path)
+        return True, None
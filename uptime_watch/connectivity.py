@@ -0,0 +1,123 @@
+"""
+Cached internet connectivity check for Uptime Watch.
+
+When a site looks DOWN we first make sure it isn't our own connection that is
+down. Instead of one blocking probe per failed check, the answer is cached for
+a short TTL, shared by every check in the process and, through a small JSON
+state file, by other uptime_watch processes too. Probes hit several targets in
+parallel and stop at the first one that answers.
+
+Configuration (environment):
+- UPTIMEWATCH_CONNECTIVITY_TARGETS: space- or comma-separated probe URLs
+- UPTIMEWATCH_CONNECTIVITY_TTL: seconds a result stays valid (default 60)
+- UPTIMEWATCH_CONNECTIVITY_TIMEOUT: per-probe timeout in seconds (default 5)
+- UPTIMEWATCH_CONNECTIVITY_STATE: state file path, or empty to disable sharing
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+DEFAULT_TARGETS = [
+    "http://www.google.com",
+    "http://www.cloudflare.com",
+    "http://www.msftconnecttest.com/connecttest.txt",
+]
+DEFAULT_TTL = 60
+DEFAULT_TIMEOUT = 5
+
+def probe_target(url, timeout):
+    """Any HTTP response at all means the network path is working."""
+    try:
+        requests.get(url, timeout=timeout, allow_redirects=False)
+        return True
+    except requests.RequestException:
+        return False
+
+class ConnectivityOracle:
+    """Answers "are we online?" from a TTL cache, probing only when it expires."""
+
+    def __init__(self, targets=None, ttl=DEFAULT_TTL, timeout=DEFAULT_TIMEOUT, state_path=None):
+        self.targets = list(targets or DEFAULT_TARGETS)
+        self.ttl = ttl
+        self.timeout = timeout
+        self.state_path = state_path
+        self._online = None
+        self._checked_at = 0.0
+        # Held for the whole probe so concurrent callers wait for one result instead of probing too
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, default_state_path=None):
+        env = os.environ
+        targets = env.get("UPTIMEWATCH_CONNECTIVITY_TARGETS")
+        return cls(
+            targets=targets.replace(",", " ").split() if targets else None,
+            ttl=float(env.get("UPTIMEWATCH_CONNECTIVITY_TTL", DEFAULT_TTL)),
+            timeout=float(env.get("UPTIMEWATCH_CONNECTIVITY_TIMEOUT", DEFAULT_TIMEOUT)),
+            state_path=env.get("UPTIMEWATCH_CONNECTIVITY_STATE", default_state_path) or None,
+        )
+
+    def _fresh(self, checked_at):
+        return time.time() - checked_at < self.ttl
+
+    def _read_state(self):
+        if not self.state_path:
+            return None
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            return bool(state["online"]), float(state["checked_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_state(self):
+        if not self.state_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+            # Write then rename so other processes never read a half-written file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.state_path) or ".", suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"online": self._online, "checked_at": self._checked_at}, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            print(f"Could not save connectivity state: {str(e)}")
+
+    def probe(self):
+        """Probe all targets in parallel; True as soon as any answers."""
+        pool = ThreadPoolExecutor(max_workers=len(self.targets), thread_name_prefix="connectivity")
+        try:
+            futures = [pool.submit(probe_target, url, self.timeout) for url in self.targets]
+            for future in as_completed(futures):
+                if future.result():
+                    return True
+            return False
+        finally:
+            # Don't wait for slower targets once we have an answer
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def is_online(self):
+        if self._online is not None and self._fresh(self._checked_at):
+            return self._online
+        with self._lock:
+            # Another thread may have refreshed the cache while we waited
+            if self._online is not None and self._fresh(self._checked_at):
+                return self._online
+            state = self._read_state()
+            if state and self._fresh(state[1]):
+                self._online, self._checked_at = state
+                return self._online
+            self._online = self.probe()
+            self._checked_at = time.time()
+            self._write_state()
+            return self._online
+
+    def invalidate(self):
+        with self._lock:
+            self._online = None
+            self._checked_at = 0.0
@@ -0,0 +1,310 @@
+"""
+Response-time history for Uptime Watch.
+
+Every check appends a raw sample (response time, status code, bytes, error
+class) to check_samples. Completed minutes are rolled up into check_rollups
+with min/avg/p95/max and a fixed latency histogram, and completed hours are
+rolled up from the minute rows. Because histograms can be added together,
+reports over any window can estimate percentiles from a few hundred rollup
+rows instead of scanning millions of raw samples.
+
+Old rows are pruned by resolution, so the database stays bounded:
+raw samples after RAW_RETENTION, minute rollups after MINUTE_RETENTION and
+hour rollups after HOUR_RETENTION (all in seconds).
+"""
+import math
+import time
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+
+RAW_RETENTION = 2 * DAY
+MINUTE_RETENTION = 14 * DAY
+HOUR_RETENTION = 400 * DAY
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BOUNDS_MS = [10, 25, 50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 7500, 10000, math.inf]
+
+# Slow but serving still counts towards availability
+AVAILABLE_STATUSES = ("UP", "DEGRADED")
+
+def ensure_schema(conn):
+    cursor = conn.cursor()
+    # Append-only: no primary key beyond rowid, one index for time-range scans
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS check_samples (
+        url TEXT NOT NULL,
+        checked_at REAL NOT NULL,
+        status TEXT NOT NULL,
+        status_code INTEGER,
+        response_ms REAL,
+        bytes INTEGER,
+        error_class TEXT
+    );
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_check_samples_time ON check_samples (checked_at, url)")
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS check_rollups (
+        url TEXT NOT NULL,
+        resolution INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        samples INTEGER NOT NULL,
+        available INTEGER NOT NULL,
+        latency_samples INTEGER NOT NULL,
+        min_ms REAL,
+        avg_ms REAL,
+        p95_ms REAL,
+        max_ms REAL,
+        bytes INTEGER,
+        histogram TEXT,
+        PRIMARY KEY (resolution, bucket, url)
+    ) WITHOUT ROWID;
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS history_watermarks (
+        resolution INTEGER PRIMARY KEY,
+        rolled_until INTEGER NOT NULL
+    );
+    ''')
+    conn.commit()
+
+def record_sample(conn, url, result, checked_at=None):
+    """Append one check result; the caller commits."""
+    conn.execute(
+        "INSERT INTO check_samples (url, checked_at, status, status_code, response_ms, bytes, error_class) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (url, checked_at or time.time(), result.status, result.status_code,
+         result.response_ms, result.bytes, result.error_class)
+    )
+
+def bucket_index(ms):
+    for i, bound in enumerate(LATENCY_BOUNDS_MS):
+        if ms <= bound:
+            return i
+    return len(LATENCY_BOUNDS_MS) - 1
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+def histogram_percentile(histogram, fraction, max_ms=None, min_ms=None):
+    """Estimate a percentile by interpolating linearly inside the bucket that holds it."""
+    total = sum(histogram)
+    if not total:
+        return None
+    target = fraction * total
+    running = 0
+    lower = 0.0
+    for count, bound in zip(histogram, LATENCY_BOUNDS_MS):
+        if count and running + count >= target:
+            # Stay within the fastest and slowest responses actually seen
+            upper = bound if max_ms is None else min(bound, max_ms)
+            if min_ms is not None:
+                lower = max(lower, min(min_ms, upper))
+            if math.isinf(upper):
+                return lower
+            return lower + (upper - lower) * (target - running) / count
+        running += count
+        lower = bound
+    return max_ms
+
+class Aggregate:
+    """Running totals for one URL that can absorb raw samples or rollup rows."""
+
+    def __init__(self):
+        self.samples = 0
+        self.available = 0
+        self.latency_samples = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = None
+        self.bytes = 0
+        self.histogram = [0] * len(LATENCY_BOUNDS_MS)
+        self.values = []
+
+    def add_sample(self, status, response_ms, size, keep_values=False):
+        self.samples += 1
+        self.available += status in AVAILABLE_STATUSES
+        self.bytes += size or 0
+        if response_ms is not None:
+            self._add_latency(response_ms, response_ms, response_ms, 1)
+            self.histogram[bucket_index(response_ms)] += 1
+            if keep_values:
+                self.values.append(response_ms)
+
+    def add_rollup(self, samples, available, latency_samples, min_ms, avg_ms, max_ms, size, histogram):
+        self.samples += samples
+        self.available += available
+        self.bytes += size or 0
+        if latency_samples:
+            self._add_latency(min_ms, max_ms, avg_ms * latency_samples, latency_samples)
+            for i, count in enumerate(histogram.split(",")):
+                self.histogram[i] += int(count)
+
+    def _add_latency(self, min_ms, max_ms, total_ms, count):
+        self.latency_samples += count
+        self.total_ms += total_ms
+        self.min_ms = min_ms if self.min_ms is None else min(self.min_ms, min_ms)
+        self.max_ms = max_ms if self.max_ms is None else max(self.max_ms, max_ms)
+
+    @property
+    def avg_ms(self):
+        return self.total_ms / self.latency_samples if self.latency_samples else None
+
+    def p95_ms(self):
+        # Exact when built from raw samples, estimated from the histogram otherwise
+        if self.values:
+            return percentile(sorted(self.values), 0.95)
+        return self.percentile(0.95)
+
+    def percentile(self, fraction):
+        return histogram_percentile(self.histogram, fraction, self.max_ms, self.min_ms)
+
+    def rollup_row(self, url, resolution, bucket):
+        return (url, resolution, bucket, self.samples, self.available, self.latency_samples,
+                self.min_ms, self.avg_ms, self.p95_ms(), self.max_ms, self.bytes,
+                ",".join(str(count) for count in self.histogram))
+
+def _get_watermark(conn, resolution):
+    row = conn.execute("SELECT rolled_until FROM history_watermarks WHERE resolution = ?", (resolution,)).fetchone()
+    return row[0] if row else None
+
+def _set_watermark(conn, resolution, value):
+    conn.execute("REPLACE INTO history_watermarks (resolution, rolled_until) VALUES (?, ?)", (resolution, value))
+
+def _write_rollups(conn, aggregates, resolution):
+    conn.executemany(
+        "REPLACE INTO check_rollups (url, resolution, bucket, samples, available, latency_samples, "
+        "min_ms, avg_ms, p95_ms, max_ms, bytes, histogram) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [agg.rollup_row(url, resolution, bucket) for (url, bucket), agg in aggregates.items()]
+    )
+
+def rollup_minutes(conn, now):
+    """Roll raw samples of every completed minute into minute rollups."""
+    end = int(now // MINUTE * MINUTE)
+    start = _get_watermark(conn, MINUTE)
+    if start is None:
+        row = conn.execute("SELECT MIN(checked_at) FROM check_samples").fetchone()
+        if row[0] is None:
+            return
+        start = int(row[0] // MINUTE * MINUTE)
+    if start >= end:
+        return
+
+    aggregates = {}
+    rows = conn.execute(
+        "SELECT url, checked_at, status, response_ms, bytes FROM check_samples "
+        "WHERE checked_at >= ? AND checked_at < ?", (start, end)
+    )
+    for url, checked_at, status, response_ms, size in rows:
+        key = (url, int(checked_at // MINUTE * MINUTE))
+        if key not in aggregates:
+            aggregates[key] = Aggregate()
+        aggregates[key].add_sample(status, response_ms, size, keep_values=True)
+    _write_rollups(conn, aggregates, MINUTE)
+    _set_watermark(conn, MINUTE, end)
+
+def rollup_hours(conn):
+    """Roll minute rollups of every completed hour into hour rollups."""
+    minute_mark = _get_watermark(conn, MINUTE)
+    if minute_mark is None:
+        return
+    end = minute_mark // HOUR * HOUR
+    start = _get_watermark(conn, HOUR)
+    if start is None:
+        row = conn.execute("SELECT MIN(bucket) FROM check_rollups WHERE resolution = ?", (MINUTE,)).fetchone()
+        if row[0] is None:
+            return
+        start = row[0] // HOUR * HOUR
+    if start >= end:
+        return
+
+    aggregates = {}
+    rows = conn.execute(
+        "SELECT url, bucket, samples, available, latency_samples, min_ms, avg_ms, max_ms, bytes, histogram "
+        "FROM check_rollups WHERE resolution = ? AND bucket >= ? AND bucket < ?", (MINUTE, start, end)
+    )
+    for url, bucket, *values in rows:
+        key = (url, bucket // HOUR * HOUR)
+        if key not in aggregates:
+            aggregates[key] = Aggregate()
+        aggregates[key].add_rollup(*values)
+    _write_rollups(conn, aggregates, HOUR)
+    _set_watermark(conn, HOUR, end)
+
+def prune(conn, now):
+    """Drop rows past their retention; raw samples go only once they are rolled up."""
+    minute_mark = _get_watermark(conn, MINUTE) or 0
+    conn.execute("DELETE FROM check_samples WHERE checked_at < ?", (min(now - RAW_RETENTION, minute_mark),))
+    conn.execute("DELETE FROM check_rollups WHERE resolution = ? AND bucket < ?", (MINUTE, now - MINUTE_RETENTION))
+    conn.execute("DELETE FROM check_rollups WHERE resolution = ? AND bucket < ?", (HOUR, now - HOUR_RETENTION))
+
+def maintain(conn, now=None):
+    """Roll up completed periods and prune expired rows in one transaction."""
+    now = now or time.time()
+    rollup_minutes(conn, now)
+    rollup_hours(conn)
+    prune(conn, now)
+    conn.commit()
+
+def _ceil(value, step):
+    return int(-(-value // step) * step)
+
+def _floor(value, step):
+    return int(value // step * step)
+
+def plan_window(conn, since, until):
+    """Split [since, until) into consecutive (resolution, start, end) segments.
+
+    Resolution None means raw samples. Whole rolled-up hours come from hour
+    rollups, other rolled-up minutes from minute rollups, and the edges plus
+    anything newer than the minute watermark from raw samples.
+    """
+    minute_mark = _get_watermark(conn, MINUTE) or 0
+    hour_mark = _get_watermark(conn, HOUR) or 0
+    hours_start = _ceil(since, HOUR)
+    segments = []
+    pos = since
+
+    def take(resolution, end):
+        nonlocal pos
+        if end > pos:
+            segments.append((resolution, pos, end))
+            pos = end
+
+    take(None, min(_ceil(since, MINUTE), until))
+    take(MINUTE, min(hours_start, minute_mark, _floor(until, MINUTE)))
+    if pos == hours_start:
+        take(HOUR, min(hour_mark, _floor(until, HOUR)))
+        take(MINUTE, min(minute_mark, _floor(until, MINUTE)))
+    take(None, until)
+    return segments
+
+def summarize(conn, since, until=None, url=None):
+    """Aggregate per URL over [since, until) using the cheapest rows that cover it."""
+    until = until or time.time()
+    url_clause = " AND url = ?" if url else ""
+    url_args = (url,) if url else ()
+    rollup_sql = ("SELECT url, samples, available, latency_samples, min_ms, avg_ms, max_ms, bytes, histogram "
+                  "FROM check_rollups WHERE resolution = ? AND bucket >= ? AND bucket < ?" + url_clause)
+    raw_sql = ("SELECT url, status, response_ms, bytes FROM check_samples "
+               "WHERE checked_at >= ? AND checked_at < ?" + url_clause)
+
+    aggregates = {}
+    for resolution, start, end in plan_window(conn, since, until):
+        if resolution is None:
+            rows = conn.execute(raw_sql, (start, end) + url_args)
+        else:
+            rows = conn.execute(rollup_sql, (resolution, start, end) + url_args)
+        for row_url, *values in rows:
+            if row_url not in aggregates:
+                aggregates[row_url] = Aggregate()
+            if resolution is None:
+                aggregates[row_url].add_sample(*values)
+            else:
+                aggregates[row_url].add_rollup(*values)
+    return aggregates